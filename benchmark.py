@@ -0,0 +1,543 @@
+"""Замеры производительности на синтетическом каталоге рецептов
+
+Примеры:
+    python benchmark.py run --recipes 100000 --output results.json
+    python benchmark.py compare baseline.json results.json --threshold 20
+    python benchmark.py startup --db recipes.db --budget-ms 200
+    python benchmark.py stress --writers 4 --readers 4 --seconds 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import GeneratorType
+
+import bulk
+from db import READ_ONLY, close_all
+import metrics
+from repository import Ingredient, RecipeRepository
+import stats
+
+DISHES = ('суп', 'борщ', 'салат', 'пирог', 'омлет', 'каша', 'рагу', 'плов', 'запеканка',
+          'котлеты', 'блины', 'оладьи', 'паста', 'пицца', 'торт', 'кекс', 'соус', 'щи')
+ADJECTIVES = ('домашний', 'быстрый', 'летний', 'зимний', 'острый', 'сладкий', 'постный',
+              'праздничный', 'бабушкин', 'овощной', 'мясной', 'рыбный', 'грибной', 'сырный')
+PRODUCTS = ('мука', 'сахар', 'соль', 'яйца', 'молоко', 'масло', 'картофель', 'морковь',
+            'лук', 'чеснок', 'свекла', 'капуста', 'говядина', 'курица', 'рис', 'гречка',
+            'томаты', 'огурцы', 'сметана', 'творог', 'сыр', 'перец', 'укроп', 'петрушка',
+            'грибы', 'фасоль', 'горох', 'рыба', 'лимон', 'мед', 'корица', 'ваниль')
+UNITS = ('г', 'мл', 'шт', 'ст.л.', 'ч.л.', 'кг', 'л')
+DIFFICULTIES = ('легко', 'средне', 'сложно')
+VERBS = ('нарезать', 'смешать', 'обжарить', 'варить', 'запекать', 'посолить', 'остудить',
+         'взбить', 'добавить', 'перемешать', 'тушить', 'подать')
+
+DEFAULT_RECIPES = 10000
+DEFAULT_INGREDIENTS = 8
+DEFAULT_CATEGORIES = 40
+DEFAULT_INSTRUCTION_WORDS = 60
+DEFAULT_REPEAT = 30
+
+# Запуск просмотра: сколько раз и за сколько миллисекунд должен появиться первый экран
+DEFAULT_STARTUP_RUNS = 10
+DEFAULT_STARTUP_BUDGET_MS = 250
+VIEWER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user.py')
+# Первый экран нарисован, когда просмотр ждет Enter; затем выбирается пункт "Выйти"
+FIRST_SCREEN_PROMPT = 'Нажмите Enter'.encode('utf-8')
+EXIT_INPUT = '\n11\n'.encode('utf-8')
+
+# Нагрузка из нескольких процессов: писатели добавляют и меняют свои рецепты, читатели
+# листают, ищут и открывают рецепты
+DEFAULT_STRESS_RECIPES = 2000
+DEFAULT_STRESS_WRITERS = 4
+DEFAULT_STRESS_READERS = 4
+DEFAULT_STRESS_SECONDS = 10.0
+# Каждая UPDATE_EVERY-я запись писателя - изменение одного из уже добавленных им рецептов
+UPDATE_EVERY = 5
+STRESS_PREFIX = 'stress-w'
+
+
+def generate_catalog(recipes, ingredients_per_recipe, categories, instruction_words, seed=0):
+    """Синтетические рецепты в формате bulk.import_recipes"""
+    rng = random.Random(seed)
+    category_names = [f'{rng.choice(DISHES)} {number}' for number in range(categories)]
+    products = list(PRODUCTS) + [f'{rng.choice(PRODUCTS)} {number}' for number in range(ingredients_per_recipe * 20)]
+    for number in range(recipes):
+        name = f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(DISHES)} {number}'
+        instructions = ' '.join(rng.choice(VERBS + PRODUCTS) for _ in range(instruction_words))
+        recipe = (
+            name,
+            rng.choice(category_names),
+            rng.randint(5, 240),
+            rng.choice(DIFFICULTIES),
+            instructions,
+            None,
+        )
+        items = [
+            (product, str(rng.randint(1, 500)), rng.choice(UNITS))
+            for product in rng.sample(products, min(ingredients_per_recipe, len(products)))
+        ]
+        yield recipe, items
+
+
+def build_database(db_name, recipes, ingredients_per_recipe, categories, instruction_words, seed=0):
+    """Создание базы с синтетическим каталогом; возвращает время загрузки"""
+    repository = RecipeRepository(db_name)
+    repository.migrate()
+    catalog = generate_catalog(recipes, ingredients_per_recipe, categories, instruction_words, seed)
+    _, _, seconds = bulk.import_recipes(repository.connection(), catalog, defer_indexes=True)
+    return seconds
+
+
+def summarize(samples):
+    """Сводка по замерам в миллисекундах"""
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return {
+        'runs': len(samples),
+        'min_ms': samples[0] * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': p95 * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+    }
+
+
+def measure(operation, arguments):
+    """Время выполнения operation для каждого набора аргументов"""
+    samples = []
+    for args in arguments:
+        started = time.perf_counter()
+        result = operation(*args)
+        # Генераторы читаются до конца, чтобы замер включал выборку
+        if isinstance(result, GeneratorType):
+            for _ in result:
+                pass
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def full_listing(repository, page_size):
+    """Проход по всему списку рецептов постранично"""
+    pager = repository.pager(page_size)
+    pages = 1
+    pager.first()
+    while pager.has_next:
+        pager.next()
+        pages += 1
+    return pages
+
+
+def run_benchmarks(repository, repeat=DEFAULT_REPEAT, seed=0):
+    """Замеры всех операций чтения и записи"""
+    rng = random.Random(seed)
+    conn = repository.connection()
+    ids = [row[0] for row in conn.execute('SELECT id FROM recipes ORDER BY random() LIMIT ?', (repeat,))]
+    categories = repository.categories()
+    words = [(rng.choice(DISHES),) for _ in range(repeat)]
+    products = [(rng.choice(PRODUCTS),) for _ in range(repeat)]
+    category_terms = [(rng.choice(categories).split()[0],) for _ in range(repeat)] if categories else []
+
+    results = {}
+    results['search_by_name'] = measure(repository.search_by_name, words)
+    if category_terms:
+        results['search_by_category'] = measure(repository.search_by_category, category_terms)
+    results['search_by_ingredient'] = measure(repository.search_by_ingredient, products)
+    results['detail_uncached'] = measure(repository.load_recipe, [(recipe_id,) for recipe_id in ids])
+    repository.cache.invalidate()
+    for recipe_id in ids:
+        repository.get_recipe(recipe_id)
+    results['detail_cached'] = measure(repository.get_recipe, [(recipe_id,) for recipe_id in ids])
+    results['first_page'] = measure(lambda: repository.pager().first(), [()] * repeat)
+    results['full_listing'] = measure(full_listing, [(repository, 100)] * max(1, repeat // 10))
+    results['categories'] = measure(repository.categories, [()] * repeat)
+    results['category_overview'] = measure(
+        repository.categories_with_recipes, [(None,)] * max(1, repeat // 10))
+    results['category_overview_capped'] = measure(repository.categories_with_recipes, [(5,)] * repeat)
+    results['statistics'] = measure(repository.statistics, [()] * repeat)
+
+    new_recipes = [
+        (f'Тестовый рецепт {number}', 'тест', 10, 'легко', 'готовить',
+         [Ingredient(rng.choice(PRODUCTS), '1', 'шт') for _ in range(DEFAULT_INGREDIENTS)])
+        for number in range(repeat)
+    ]
+    added = []
+    results['insert'] = measure(lambda *args: added.append(repository.add_recipe(*args)), new_recipes)
+    results['delete'] = measure(repository.delete_recipe, [(recipe_id,) for recipe_id in added])
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def command_run(args):
+    db_name = args.db
+    temporary = None
+    if db_name is None:
+        temporary = tempfile.TemporaryDirectory(prefix='recipes-bench-')
+        db_name = os.path.join(temporary.name, 'recipes.db')
+
+    try:
+        config = {
+            'recipes': args.recipes,
+            'ingredients_per_recipe': args.ingredients,
+            'categories': args.categories,
+            'instruction_words': args.instruction_words,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        }
+        load_seconds = None
+        if not os.path.exists(db_name):
+            print(f"Генерация каталога: {args.recipes} рецептов...", file=sys.stderr)
+            load_seconds = build_database(db_name, args.recipes, args.ingredients,
+                                          args.categories, args.instruction_words, args.seed)
+
+        repository = RecipeRepository(db_name)
+        repository.migrate()
+        results = run_benchmarks(repository, args.repeat, args.seed)
+        report = {
+            'config': config,
+            'environment': environment(),
+            'load_seconds': load_seconds,
+            'database_bytes': os.path.getsize(db_name),
+            'results': results,
+        }
+    finally:
+        close_all()
+        if temporary is not None:
+            temporary.cleanup()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    for name, result in report['results'].items():
+        print(f"  {name:28} медиана {result['median_ms']:9.3f} мс   p95 {result['p95_ms']:9.3f} мс",
+              file=sys.stderr)
+
+
+def measure_startup(db_name, fast_start):
+    """(секунд до первого экрана, секунд всего сеанса) для user.py в новом процессе"""
+    command = [sys.executable, VIEWER, '--db', db_name] + (['--fast-start'] if fast_start else [])
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+    output = b''
+    while FIRST_SCREEN_PROMPT not in output:
+        chunk = os.read(process.stdout.fileno(), 65536)
+        if not chunk:
+            break
+        output += chunk
+    first_screen = time.perf_counter() - started
+    process.communicate(EXIT_INPUT)
+    if process.returncode:
+        raise RuntimeError(f"user.py завершился с кодом {process.returncode}")
+    return first_screen, time.perf_counter() - started
+
+
+def command_startup(args):
+    db_name = args.db
+    temporary = None
+    if db_name is None:
+        temporary = tempfile.TemporaryDirectory(prefix='recipes-bench-')
+        db_name = os.path.join(temporary.name, 'recipes.db')
+        print(f"Генерация каталога: {args.recipes} рецептов...", file=sys.stderr)
+        build_database(db_name, args.recipes, DEFAULT_INGREDIENTS, DEFAULT_CATEGORIES,
+                       DEFAULT_INSTRUCTION_WORDS, args.seed)
+        close_all()
+
+    try:
+        results = {}
+        for name, fast_start in (('startup', False), ('startup_fast', True)):
+            samples = [measure_startup(db_name, fast_start) for _ in range(args.runs)]
+            results[f'{name}_first_screen'] = summarize([first for first, _ in samples])
+            results[f'{name}_session'] = summarize([total for _, total in samples])
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    report = {
+        'config': {'runs': args.runs, 'budget_ms': args.budget_ms},
+        'environment': environment(),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    for name, result in results.items():
+        print(f"  {name:28} медиана {result['median_ms']:9.3f} мс   p95 {result['p95_ms']:9.3f} мс",
+              file=sys.stderr)
+
+    first_screen = results['startup_fast_first_screen']['median_ms']
+    if first_screen > args.budget_ms:
+        print(f"❌ Первый экран через {first_screen:.0f} мс, бюджет {args.budget_ms:.0f} мс", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Первый экран через {first_screen:.0f} мс (бюджет {args.budget_ms:.0f} мс)", file=sys.stderr)
+
+
+def stress_writer(db_name, number, seconds, start, results, seed):
+    """Процесс-писатель: добавляет и меняет свои рецепты, запоминая, что записал"""
+    rng = random.Random(seed * 1000 + number)
+    repository = RecipeRepository(db_name)
+    # id рецепта -> число ингредиентов после последней успешной записи
+    expected, samples, errors = {}, [], []
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        ingredients = [Ingredient(rng.choice(PRODUCTS), str(rng.randint(1, 500)), rng.choice(UNITS))
+                       for _ in range(rng.randint(1, DEFAULT_INGREDIENTS * 2))]
+        started = time.perf_counter()
+        try:
+            if expected and len(samples) % UPDATE_EVERY == UPDATE_EVERY - 1:
+                recipe = repository.load_recipe(rng.choice(list(expected)))
+                recipe.ingredients = ingredients
+                repository.update_recipe(recipe)
+                expected[recipe.id] = len(ingredients)
+            else:
+                recipe_id = repository.add_recipe(
+                    f'{STRESS_PREFIX}{number}-{len(samples)}', f'нагрузка {number}', rng.randint(5, 240),
+                    rng.choice(DIFFICULTIES), 'готовить', ingredients)
+                expected[recipe_id] = len(ingredients)
+        except Exception as e:
+            errors.append(str(e))
+        samples.append(time.perf_counter() - started)
+    results.put(('writer', samples, errors, metrics.snapshot()['write_retries'], expected))
+    close_all()
+
+
+def stress_reader(db_name, number, seconds, start, results, seed):
+    """Процесс-читатель: первая страница списка, поиск по названию и карточка рецепта"""
+    rng = random.Random(seed * 1000 + 500 + number)
+    repository = RecipeRepository(db_name, READ_ONLY)
+    ids = [row[0] for row in repository.connection().execute('SELECT id FROM recipes')]
+    samples, errors = [], []
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            operation = len(samples) % 3
+            if operation == 0:
+                repository.pager().first()
+            elif operation == 1:
+                repository.search_by_name(rng.choice(DISHES))
+            else:
+                repository.get_recipe(rng.choice(ids))
+        except Exception as e:
+            errors.append(str(e))
+        samples.append(time.perf_counter() - started)
+    results.put(('reader', samples, errors, 0, {}))
+    close_all()
+
+
+def verify_stress(db_name, expected):
+    """Расхождения после нагрузки: рецепты писателей, их ингредиенты, сводка, целостность"""
+    conn = RecipeRepository(db_name).connection()
+    problems = []
+    stored = dict(conn.execute('''
+        SELECT r.id, (SELECT count(*) FROM ingredients i WHERE i.recipe_id = r.id)
+        FROM recipes r WHERE r.name LIKE ?
+    ''', (STRESS_PREFIX + '%',)))
+    for recipe_id, count in expected.items():
+        if recipe_id not in stored:
+            problems.append(f"рецепт {recipe_id} потерян")
+        elif stored[recipe_id] != count:
+            problems.append(f"рецепт {recipe_id}: ингредиентов {stored[recipe_id]}, записано {count}")
+    extra = sorted(set(stored) - set(expected))
+    if extra:
+        problems.append(f"лишние рецепты ({len(extra)}): {extra[:10]}")
+    for key, (stored_value, actual) in stats.check_statistics(conn).items():
+        problems.append(f"сводка {key}: {stored_value}, на самом деле {actual}")
+    integrity = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    if integrity != 'ok':
+        problems.append(f"integrity_check: {integrity}")
+    return problems
+
+
+def run_stress(db_name, writers, readers, seconds, seed=0):
+    """Нагрузка из writers + readers процессов; (результаты, расхождения)"""
+    context = multiprocessing.get_context('spawn')
+    start, results = context.Event(), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(db_name, number, seconds, start, results, seed))
+        for worker, count in ((stress_writer, writers), (stress_reader, readers))
+        for number in range(count)
+    ]
+    for process in processes:
+        process.start()
+    start.set()
+    # Очередь читается до join: процесс не завершится, пока его результат не забран
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    failed = [process.exitcode for process in processes if process.exitcode]
+    if failed:
+        raise RuntimeError(f"процессы нагрузки завершились с кодами {failed}")
+
+    report, expected = {}, {}
+    for role in ('writer', 'reader'):
+        rows = [row for row in collected if row[0] == role]
+        samples = [sample for _, worker_samples, _, _, _ in rows for sample in worker_samples]
+        errors = [error for _, _, worker_errors, _, _ in rows for error in worker_errors]
+        report[role + 's'] = {
+            'processes': len(rows),
+            'operations': len(samples),
+            'per_second': len(samples) / seconds,
+            'errors': len(errors),
+            'error_examples': sorted(set(errors))[:5],
+            'retries': sum(row[3] for row in rows),
+            'latency': summarize(samples) if samples else None,
+        }
+        for row in rows:
+            expected.update(row[4])
+    report['recipes_written'] = len(expected)
+    return report, verify_stress(db_name, expected)
+
+
+def command_stress(args):
+    db_name = args.db
+    temporary = None
+    if db_name is None:
+        temporary = tempfile.TemporaryDirectory(prefix='recipes-bench-')
+        db_name = os.path.join(temporary.name, 'recipes.db')
+        print(f"Генерация каталога: {args.recipes} рецептов...", file=sys.stderr)
+        build_database(db_name, args.recipes, DEFAULT_INGREDIENTS, DEFAULT_CATEGORIES,
+                       DEFAULT_INSTRUCTION_WORDS, args.seed)
+    else:
+        RecipeRepository(db_name).migrate()
+    close_all()
+
+    try:
+        print(f"Нагрузка: писателей {args.writers}, читателей {args.readers}, {args.seconds:g} с...",
+              file=sys.stderr)
+        results, problems = run_stress(db_name, args.writers, args.readers, args.seconds, args.seed)
+    finally:
+        close_all()
+        if temporary is not None:
+            temporary.cleanup()
+
+    report = {
+        'config': {'writers': args.writers, 'readers': args.readers, 'seconds': args.seconds},
+        'environment': environment(),
+        'results': results,
+        'problems': problems,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    for role in ('writers', 'readers'):
+        result = results[role]
+        latency = result['latency'] or {'median_ms': 0.0, 'p95_ms': 0.0}
+        print(f"  {role:8} {result['per_second']:9.1f} оп/с   медиана {latency['median_ms']:8.3f} мс   "
+              f"p95 {latency['p95_ms']:8.3f} мс   повторов {result['retries']}   ошибок {result['errors']}",
+              file=sys.stderr)
+
+    errors = results['writers']['errors'] + results['readers']['errors']
+    for problem in problems:
+        print(f"❌ {problem}", file=sys.stderr)
+    if problems or errors:
+        print(f"❌ Ошибок {errors}, расхождений {len(problems)}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Записано рецептов: {results['recipes_written']}, потерь нет", file=sys.stderr)
+
+
+def compare_reports(baseline, current, threshold):
+    """Операции, медиана которых выросла больше чем на threshold процентов"""
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or before['median_ms'] <= 0:
+            continue
+        change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+        if change > threshold:
+            regressions.append((name, before['median_ms'], result['median_ms'], change))
+    return regressions
+
+
+def command_compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare_reports(baseline, current, args.threshold)
+    for name, before, after, change in regressions:
+        print(f"❌ {name}: {before:.3f} мс -> {after:.3f} мс (+{change:.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print("✅ Регрессий не найдено")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности базы рецептов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="сгенерировать каталог и выполнить замеры")
+    run_parser.add_argument('--db', help="готовая база (по умолчанию - временная)")
+    run_parser.add_argument('--recipes', type=int, default=DEFAULT_RECIPES)
+    run_parser.add_argument('--ingredients', type=int, default=DEFAULT_INGREDIENTS,
+                            help="ингредиентов на рецепт")
+    run_parser.add_argument('--categories', type=int, default=DEFAULT_CATEGORIES,
+                            help="число различных категорий")
+    run_parser.add_argument('--instruction-words', type=int, default=DEFAULT_INSTRUCTION_WORDS,
+                            help="длина инструкции в словах")
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help="файл для JSON-отчета (по умолчанию stdout)")
+    run_parser.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser('compare', help="сравнить два отчета")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=20.0,
+                                help="допустимый рост медианы, %%")
+    compare_parser.set_defaults(handler=command_compare)
+
+    startup_parser = commands.add_parser('startup', help="время запуска просмотра рецептов")
+    startup_parser.add_argument('--db', help="готовая база (по умолчанию - временная)")
+    startup_parser.add_argument('--recipes', type=int, default=DEFAULT_RECIPES,
+                                help="размер временной базы")
+    startup_parser.add_argument('--runs', type=int, default=DEFAULT_STARTUP_RUNS)
+    startup_parser.add_argument('--budget-ms', type=float, default=DEFAULT_STARTUP_BUDGET_MS,
+                                help="допустимая медиана времени до первого экрана с --fast-start")
+    startup_parser.add_argument('--seed', type=int, default=0)
+    startup_parser.add_argument('--output', help="файл для JSON-отчета (по умолчанию stdout)")
+    startup_parser.set_defaults(handler=command_startup)
+
+    stress_parser = commands.add_parser('stress', help="запись и чтение из нескольких процессов")
+    stress_parser.add_argument('--db', help="база, в которую пишет нагрузка (по умолчанию - временная)")
+    stress_parser.add_argument('--recipes', type=int, default=DEFAULT_STRESS_RECIPES,
+                               help="размер временной базы")
+    stress_parser.add_argument('--writers', type=int, default=DEFAULT_STRESS_WRITERS,
+                               help="процессов-писателей")
+    stress_parser.add_argument('--readers', type=int, default=DEFAULT_STRESS_READERS,
+                               help="процессов-читателей")
+    stress_parser.add_argument('--seconds', type=float, default=DEFAULT_STRESS_SECONDS)
+    stress_parser.add_argument('--seed', type=int, default=0)
+    stress_parser.add_argument('--output', help="файл для JSON-отчета (по умолчанию stdout)")
+    stress_parser.set_defaults(handler=command_stress)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""Массовый импорт и экспорт рецептов (JSON Lines / CSV)
+
+Примеры:
+    python bulk.py import catalog.jsonl --defer-indexes
+    python bulk.py export backup.csv --db recipes.db
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from db import get_manager, run_write
+import schema
+import texts
+from units import parse_quantity, stored_minutes
+
+RECIPE_FIELDS = ('name', 'category', 'cooking_time', 'difficulty', 'instructions', 'created_date')
+CSV_FIELDS = RECIPE_FIELDS + ('ingredients',)
+
+# Столбец ingredients CSV-файла - JSON-массив [название, количество, единица]:
+# разделители в названиях ("соль; перец") ему не мешают. Прежний формат без
+# экранирования, "мука|200|г;соль|1|щепотка", по-прежнему читается.
+CSV_INGREDIENT_SEPARATOR = ';'
+CSV_PART_SEPARATOR = '|'
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Инструкция хранится отдельно, в recipe_texts (см. texts.py)
+INSERT_RECIPE = '''
+    INSERT INTO recipes (id, name, category, cooking_time, difficulty, created_date)
+    VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+'''
+
+INSERT_INGREDIENT = '''
+    INSERT INTO ingredients (recipe_id, name, quantity, unit, amount, base_amount, base_unit)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+COOKING_TIME = RECIPE_FIELDS.index('cooking_time')
+INSTRUCTIONS = RECIPE_FIELDS.index('instructions')
+
+
+def detect_format(path, fmt=None):
+    """Формат файла: из аргумента или по расширению"""
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def open_file(path, mode):
+    """Открытие файла; '-' означает stdin/stdout"""
+    if path == '-':
+        stream = sys.stdin if 'r' in mode else sys.stdout
+        return open(stream.fileno(), mode, encoding='utf-8', newline='', closefd=False)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def normalize_ingredient(item):
+    """Ингредиент из словаря или списка [название, количество, единица]"""
+    if isinstance(item, dict):
+        return item.get('name'), item.get('quantity'), item.get('unit')
+    name, quantity, unit = (list(item) + [None, None])[:3]
+    return name, quantity, unit
+
+
+def read_jsonl(stream):
+    """Рецепты из JSON Lines: один объект на строку"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"строка {line_number}: {e}") from None
+        ingredients = [normalize_ingredient(item) for item in record.get('ingredients') or ()]
+        yield tuple(record.get(field) for field in RECIPE_FIELDS), ingredients
+
+
+def parse_csv_ingredients(value):
+    """Разбор столбца ingredients CSV-файла: JSON-массив или прежний формат с разделителями"""
+    if value and value.lstrip().startswith('['):
+        try:
+            items = json.loads(value)
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            # Строка вместо списка - только название ингредиента
+            return [normalize_ingredient([item] if isinstance(item, str) else item) for item in items]
+    ingredients = []
+    for item in (value or '').split(CSV_INGREDIENT_SEPARATOR):
+        if not item.strip():
+            continue
+        parts = item.split(CSV_PART_SEPARATOR)
+        ingredients.append(normalize_ingredient(part.strip() or None for part in parts))
+    return ingredients
+
+
+def read_csv(stream):
+    """Рецепты из CSV с заголовком; один рецепт на строку"""
+    csv.field_size_limit(sys.maxsize)
+    for row in csv.DictReader(stream):
+        recipe = tuple(row.get(field) or None for field in RECIPE_FIELDS)
+        yield recipe, parse_csv_ingredients(row.get('ingredients'))
+
+
+def ingredient_row(recipe_id, name, quantity=None, unit=None):
+    """Параметры INSERT_INGREDIENT: текст количества и его разобранное значение"""
+    return (recipe_id, name, quantity, unit) + parse_quantity(quantity, unit)
+
+
+def recipe_row(recipe_id, recipe):
+    """Параметры INSERT_RECIPE (без инструкции); время приготовления приводится к минутам"""
+    row = list(recipe)
+    row[COOKING_TIME] = stored_minutes(row[COOKING_TIME])
+    del row[INSTRUCTIONS]
+    return (recipe_id,) + tuple(row)
+
+
+def next_recipe_id(conn, stride=1, offset=0):
+    """Первый свободный id рецепта с учетом счетчика AUTOINCREMENT
+
+    При stride > 1 - первый свободный id, дающий остаток offset при делении на stride
+    (так id рецептов разных шардов не пересекаются).
+    """
+    cursor = conn.execute('''
+        SELECT MAX(
+            COALESCE((SELECT MAX(id) FROM recipes), 0),
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'recipes'), 0)
+        ) + 1
+    ''')
+    candidate = cursor.fetchone()[0]
+    return candidate + (offset - candidate) % stride
+
+
+def insert_records(conn, batch, stride=1, offset=0, index=True):
+    """Вставка пачки рецептов внутри уже начатой транзакции; возвращает (id рецептов, число ингредиентов)
+
+    id назначаются заранее: executemany не возвращает lastrowid каждой строки,
+    а блокировка записи уже взята, так что id ни с кем не пересекутся.
+    index=False - не обновлять индексы приложения (их перестроят после загрузки).
+    """
+    first_id = next_recipe_id(conn, stride, offset)
+    recipes = []
+    instructions = []
+    ingredients = []
+    for number, (recipe, recipe_ingredients) in enumerate(batch):
+        recipe_id = first_id + number * stride
+        recipes.append(recipe_row(recipe_id, recipe))
+        row = texts.text_row(recipe_id, recipe[INSTRUCTIONS])
+        if row:
+            instructions.append(row)
+        ingredients.extend(ingredient_row(recipe_id, *item) for item in recipe_ingredients)
+    conn.executemany(INSERT_RECIPE, recipes)
+    conn.executemany(texts.UPSERT_TEXT, instructions)
+    conn.executemany(INSERT_INGREDIENT, ingredients)
+    recipe_ids = [row[0] for row in recipes]
+    if index:
+        schema.index_recipes(conn, recipe_ids)
+    return recipe_ids, len(ingredients)
+
+
+def insert_batch(conn, batch, index=True):
+    """Вставка пачки рецептов одной транзакцией; возвращает число ингредиентов"""
+    _, ingredient_count = run_write(conn, lambda conn: insert_records(conn, batch, index=index))
+    return ingredient_count
+
+
+def import_recipes(conn, records, batch_size=DEFAULT_BATCH_SIZE, defer_indexes=False, progress=None):
+    """Загрузка рецептов пачками; возвращает (рецептов, ингредиентов, секунд)"""
+    started = time.perf_counter()
+    recipe_count = ingredient_count = 0
+
+    def load():
+        nonlocal recipe_count, ingredient_count
+        records_iter = iter(records)
+        while True:
+            batch = list(islice(records_iter, batch_size))
+            if not batch:
+                break
+            ingredient_count += insert_batch(conn, batch, index=not defer_indexes)
+            recipe_count += len(batch)
+            if progress:
+                progress(recipe_count, time.perf_counter() - started)
+
+    if defer_indexes:
+        with schema.deferred_maintenance(conn):
+            load()
+    else:
+        load()
+    return recipe_count, ingredient_count, time.perf_counter() - started
+
+
+def iter_recipes(conn):
+    """Все рецепты с ингредиентами в порядке id; в памяти только текущий рецепт"""
+    # Инструкция распаковывается здесь: выгрузка не требует от соединения функций SQL
+    columns = ', '.join('NULL' if field == 'instructions' else f'r.{field}' for field in RECIPE_FIELDS)
+    recipes = conn.execute(f'''
+        SELECT r.id, {columns}, t.codec, t.data
+        FROM recipes r
+        LEFT JOIN recipe_texts t ON t.recipe_id = r.id AND t.field = 'instructions'
+        ORDER BY r.id
+    ''')
+    ingredients = conn.cursor().execute('''
+        SELECT recipe_id, name, quantity, unit
+        FROM ingredients
+        WHERE recipe_id IS NOT NULL
+        ORDER BY recipe_id, id
+    ''')
+    # Оба курсора упорядочены по id рецепта: сливаем их за один проход
+    pending = ingredients.fetchone()
+    for recipe_id, *fields, codec, data in recipes:
+        fields[INSTRUCTIONS] = texts.unpack_text(codec, data)
+        while pending is not None and pending[0] < recipe_id:
+            pending = ingredients.fetchone()
+        items = []
+        while pending is not None and pending[0] == recipe_id:
+            items.append(pending[1:])
+            pending = ingredients.fetchone()
+        yield tuple(fields), items
+
+
+def write_jsonl(stream, recipes):
+    """Запись рецептов в JSON Lines"""
+    for recipe, ingredients in recipes:
+        record = dict(zip(RECIPE_FIELDS, recipe))
+        record['ingredients'] = [
+            {'name': name, 'quantity': quantity, 'unit': unit}
+            for name, quantity, unit in ingredients
+        ]
+        stream.write(json.dumps(record, ensure_ascii=False))
+        stream.write('\n')
+
+
+def write_csv(stream, recipes):
+    """Запись рецептов в CSV"""
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    for recipe, ingredients in recipes:
+        packed = json.dumps([list(item) for item in ingredients], ensure_ascii=False)
+        writer.writerow(recipe + (packed,))
+
+
+def export_recipes(conn, stream, fmt):
+    """Потоковая выгрузка базы; возвращает (рецептов, секунд)"""
+    started = time.perf_counter()
+    count = 0
+
+    def counted():
+        nonlocal count
+        for item in iter_recipes(conn):
+            count += 1
+            yield item
+
+    (write_csv if fmt == 'csv' else write_jsonl)(stream, counted())
+    return count, time.perf_counter() - started
+
+
+def rate(count, seconds):
+    """Строк в секунду"""
+    return count / seconds if seconds > 0 else float('inf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Массовый импорт и экспорт рецептов")
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="загрузить рецепты из файла")
+    import_parser.add_argument('path', help="JSONL или CSV файл ('-' для stdin)")
+    import_parser.add_argument('--format', choices=('jsonl', 'csv'))
+    import_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    import_parser.add_argument('--defer-indexes', action='store_true',
+                               help="перестроить индексы и поисковый индекс после загрузки")
+
+    export_parser = commands.add_parser('export', help="выгрузить рецепты в файл")
+    export_parser.add_argument('path', help="JSONL или CSV файл ('-' для stdout)")
+    export_parser.add_argument('--format', choices=('jsonl', 'csv'))
+
+    args = parser.parse_args(argv)
+    conn = get_manager(args.db).connection()
+    schema.migrate(conn)
+    fmt = detect_format(args.path, args.format)
+
+    if args.command == 'import':
+        def progress(count, seconds):
+            print(f"  {count} рецептов ({rate(count, seconds):.0f} рецептов/с)", file=sys.stderr)
+
+        with open_file(args.path, 'r') as stream:
+            records = read_csv(stream) if fmt == 'csv' else read_jsonl(stream)
+            recipes, ingredients, seconds = import_recipes(
+                conn, records, args.batch_size, args.defer_indexes, progress)
+        rows = recipes + ingredients
+        print(f"✅ Импортировано рецептов: {recipes}, ингредиентов: {ingredients} "
+              f"за {seconds:.2f} с ({rate(rows, seconds):.0f} строк/с)", file=sys.stderr)
+    else:
+        with open_file(args.path, 'w') as stream:
+            recipes, seconds = export_recipes(conn, stream, fmt)
+        print(f"✅ Экспортировано рецептов: {recipes} "
+              f"за {seconds:.2f} с ({rate(recipes, seconds):.0f} рецептов/с)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
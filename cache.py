@@ -0,0 +1,108 @@
+"""Кэш собранных рецептов для экрана подробного просмотра"""
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 512
+DEFAULT_TTL = 300.0
+
+
+class RecipeCache:
+    """LRU-кэш рецептов с ограничением размера и времени жизни записей"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # Растет при каждом изменении базы: по нему устаревают производные структуры (фасеты)
+        self.generation = 0
+        self._entries = OrderedDict()
+        # Соединение -> последний увиденный data_version; слабые ссылки, чтобы запись
+        # закрытого соединения не досталась новому
+        self._data_versions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, recipe_id):
+        """Рецепт из кэша или None"""
+        with self._lock:
+            entry = self._entries.get(recipe_id)
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(recipe_id)
+                    self.hits += 1
+                    return value
+                del self._entries[recipe_id]
+            self.misses += 1
+            return None
+
+    def put(self, recipe_id, value):
+        """Сохранение рецепта; самые давно использованные записи вытесняются"""
+        with self._lock:
+            self._entries[recipe_id] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(recipe_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, recipe_id=None):
+        """Удаление одной записи или (без аргумента) всего кэша"""
+        with self._lock:
+            self.generation += 1
+            if recipe_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(recipe_id, None)
+
+    def check_data_version(self, conn):
+        """Сброс кэша, если базу изменило другое соединение (PRAGMA data_version)
+
+        data_version сравним только в пределах одного соединения, поэтому при
+        первой встрече с соединением кэш тоже сбрасывается: неизвестно, что
+        изменилось с тех пор, как его заполняли другие соединения.
+        """
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        with self._lock:
+            previous = self._data_versions.get(conn)
+            self._data_versions[conn] = version
+        if previous != version:
+            self.invalidate()
+
+    def get_recipe(self, conn, recipe_id, loader):
+        """Рецепт через кэш: при промахе загружается loader(recipe_id)"""
+        self.check_data_version(conn)
+        recipe = self.get(recipe_id)
+        if recipe is None:
+            recipe = loader(recipe_id)
+            if recipe is not None:
+                self.put(recipe_id, recipe)
+        return recipe
+
+    def stats(self):
+        """Счетчики попаданий и промахов для подбора размера кэша"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_name):
+    """Общий кэш рецептов для файла базы данных"""
+    key = os.path.abspath(db_name)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = RecipeCache()
+        return cache
@@ -0,0 +1,284 @@
+"""Общий слой подключений к базе данных рецептов
+
+Режимы соединений:
+    READ_WRITE - обычные соединения приложения, которое изменяет базу;
+    READ_ONLY  - только чтение, видит изменения других процессов сразу;
+    SNAPSHOT   - неизменяемый снимок файла (immutable=1) с отображением в память:
+                 без блокировок и журнала, поэтому видит состояние на момент
+                 последней контрольной точки WAL; при изменении файла переоткрывается;
+    MEMORY     - копия базы в памяти каждого потока, обновляется при изменении файла.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+from ingredient_index import normalize_name
+import metrics
+
+# Сколько SQLite ждет освобождения блокировки другим процессом, прежде чем вернуть SQLITE_BUSY, мс
+BUSY_TIMEOUT_MS = 5000
+
+# Настройки, применяемые к каждому новому соединению
+# auto_vacuum действует только на новой базе (до создания таблиц); существующую
+# переводит в этот режим maintenance.py enable-incremental
+PRAGMAS = (
+    ('auto_vacuum', 'INCREMENTAL'),
+    ('foreign_keys', 'ON'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),
+    ('temp_store', 'MEMORY'),
+)
+
+# Настройки соединений только для чтения: журнал переключает пишущая сторона
+READ_ONLY_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('cache_size', -16000),
+    ('temp_store', 'MEMORY'),
+)
+
+# Снимок только для чтения: страницы читаются через общий с другими процессами mmap
+SNAPSHOT_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -2000),
+    ('temp_store', 'MEMORY'),
+)
+
+MEMORY_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('temp_store', 'MEMORY'),
+)
+
+READ_WRITE = 'rw'
+READ_ONLY = 'ro'
+SNAPSHOT = 'snapshot'
+MEMORY = 'memory'
+MODES = (READ_WRITE, READ_ONLY, SNAPSHOT, MEMORY)
+
+# Как часто снимок проверяет, не изменился ли файл базы, секунд
+REFRESH_INTERVAL = 1.0
+
+# Функции Python, доступные в SQL каждого соединения (только запросам приложения:
+# схема функций Python не использует и доступна обычному клиенту SQLite)
+SQL_FUNCTIONS = (
+    ('normalize_name', 1, normalize_name),
+)
+
+# Размер кэша подготовленных выражений на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Повторы транзакции записи, если база осталась занятой и после busy_timeout:
+# пауза перед повтором растет вдвое (со случайным разбросом, чтобы процессы не
+# просыпались одновременно), но не больше WRITE_RETRY_MAX_DELAY секунд
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_DELAY = 0.05
+WRITE_RETRY_MAX_DELAY = 2.0
+
+BUSY_ERRORS = ('SQLITE_BUSY', 'SQLITE_LOCKED')
+
+
+def file_signature(db_name):
+    """(размер, время изменения) файла базы и его WAL-журнала"""
+    signature = []
+    for path in (db_name, db_name + '-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def is_busy(error):
+    """Ошибка из-за блокировки базы другим соединением"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    name = getattr(error, 'sqlite_errorname', None)
+    if name:
+        # Расширенные коды тоже: SQLITE_BUSY_SNAPSHOT, SQLITE_LOCKED_SHAREDCACHE...
+        return name.startswith(BUSY_ERRORS)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def retry_delay(attempt):
+    """Пауза перед повтором номер attempt (с нуля), секунд"""
+    return min(WRITE_RETRY_MAX_DELAY, WRITE_RETRY_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def run_write(conn, operation, attempts=WRITE_ATTEMPTS):
+    """Результат operation(conn), выполненной в транзакции BEGIN IMMEDIATE
+
+    Блокировка записи берется в начале транзакции, поэтому занятая база дает
+    ошибку до первого изменения, а не при COMMIT. Если SQLITE_BUSY пришел и после
+    busy_timeout, транзакция откатывается и operation повторяется с начала;
+    последняя ошибка передается вызывающему.
+    """
+    for attempt in range(attempts):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = operation(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return result
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt + 1 >= attempts:
+                raise
+            metrics.record_write_retry()
+            time.sleep(retry_delay(attempt))
+
+
+class ConnectionManager:
+    """Долгоживущие соединения с базой: одно на поток"""
+
+    def __init__(self, db_name, mode=READ_WRITE):
+        if mode not in MODES:
+            raise ValueError(f"неизвестный режим соединений: {mode}")
+        self.db_name = db_name
+        self.mode = mode
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        # Снимки: поколение растет при каждом изменении файла
+        self._generation = 0
+        self._signature = None
+        self._next_check = 0.0
+        self._image = None
+        self._refresh_listeners = []
+
+    @property
+    def read_only(self):
+        return self.mode != READ_WRITE
+
+    def connection(self):
+        """Соединение текущего потока (создается при первом обращении)"""
+        if self.mode in (SNAPSHOT, MEMORY):
+            self._check_file()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.generation != self._generation:
+            self._discard(conn)
+            conn = None
+        if conn is None:
+            generation = self._generation
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.generation = generation
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def add_refresh_listener(self, callback):
+        """callback() вызывается, когда снимок устарел из-за изменения файла"""
+        with self._lock:
+            if callback not in self._refresh_listeners:
+                self._refresh_listeners.append(callback)
+
+    def _check_file(self):
+        """Переход к новому поколению снимка, если файл базы изменился"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + REFRESH_INTERVAL
+        signature = file_signature(self.db_name)
+        with self._lock:
+            if self._signature is None:
+                self._signature = signature
+                return
+            if signature == self._signature:
+                return
+            self._signature = signature
+            self._generation += 1
+            self._image = None
+            listeners = list(self._refresh_listeners)
+        for callback in listeners:
+            callback()
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def _memory_image(self):
+        """Сериализованная копия базы (одна на все потоки одного поколения)"""
+        with self._lock:
+            if self._image is None:
+                source = sqlite3.connect(self._uri('ro'), uri=True)
+                try:
+                    image = bytearray(source.serialize())
+                finally:
+                    source.close()
+                # В памяти нет WAL: помечаем образ как базу с обычным журналом
+                image[18:20] = b'\x01\x01'
+                self._image = bytes(image)
+            return self._image
+
+    def _uri(self, options):
+        return f'file:{quote(os.path.abspath(self.db_name))}?mode={options}'
+
+    def _connect(self):
+        """Открытие соединения и применение настроек"""
+        started = time.perf_counter()
+        target, uri, pragmas = self.db_name, False, PRAGMAS
+        if self.mode == READ_ONLY:
+            target, uri, pragmas = self._uri('ro'), True, READ_ONLY_PRAGMAS
+        elif self.mode == SNAPSHOT:
+            target, uri, pragmas = self._uri('ro&immutable=1'), True, SNAPSHOT_PRAGMAS
+        elif self.mode == MEMORY:
+            target, pragmas = ':memory:', MEMORY_PRAGMAS
+        conn = sqlite3.connect(
+            target,
+            uri=uri,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            # При выключенных замерах - соединение без переопределенных методов
+            factory=metrics.connection_class(),
+        )
+        if self.mode == MEMORY:
+            conn.deserialize(self._memory_image())
+        for name, value in pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        for name, arity, function in SQL_FUNCTIONS:
+            conn.create_function(name, arity, function, deterministic=True)
+        metrics.record_connect(time.perf_counter() - started)
+        return conn
+
+    def close(self):
+        """Закрытие всех соединений, открытых менеджером"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_name, mode=READ_WRITE):
+    """Общий менеджер соединений для файла базы данных в заданном режиме"""
+    key = (os.path.abspath(db_name), mode)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(db_name, mode)
+        return manager
+
+
+def close_all():
+    """Закрытие всех соединений всех менеджеров"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
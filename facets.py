@@ -0,0 +1,247 @@
+"""Фасетный поиск: битовые карты рецептов для каждого значения фасета
+
+Карта - целое число Python, в котором бит с номером id рецепта установлен,
+если рецепт имеет это значение. Фильтр - пересечение (&) и объединение (|)
+карт, число рецептов - int.bit_count(), поэтому счетчики всех значений всех
+фасетов считаются без запросов к базе. Карты строятся одним проходом по
+recipes, а после изменения данных обновляются только для рецептов из журнала
+изменений (см. sync.py).
+
+Карты плотные: каждая занимает до max(id) / 8 байт, все вместе - не больше
+(число значений всех фасетов + 1) * max(id) / 8 байт, например около 4 МБ
+для миллиона рецептов и 30 значений. Обновление на время создает по одной
+новой карте на значение.
+"""
+import json
+import re
+import threading
+from collections import Counter
+from itertools import islice
+
+import sync
+
+CATEGORY = 'category'
+DIFFICULTY = 'difficulty'
+TIME = 'time'
+FACETS = (CATEGORY, DIFFICULTY, TIME)
+
+FACET_TITLES = {CATEGORY: 'Категория', DIFFICULTY: 'Сложность', TIME: 'Время'}
+
+# Интервалы времени приготовления: (значение фасета, до скольких минут включительно)
+TIME_BUCKETS = (
+    ('0-15', 15),
+    ('16-30', 30),
+    ('31-60', 60),
+    ('61+', None),
+)
+
+TIME_ORDER = {bucket: number for number, (bucket, _) in enumerate(TIME_BUCKETS)}
+
+TIME_LABELS = {
+    '0-15': 'до 15 мин',
+    '16-30': '16-30 мин',
+    '31-60': '31-60 мин',
+    '61+': 'больше часа',
+}
+
+RECIPES_SQL = 'SELECT id, category, difficulty, cooking_time FROM recipes'
+
+# При большем числе изменений журнала на рецепт карты дешевле построить заново
+REBUILD_CHANGES_PER_RECIPE = 1
+
+# Страницу из стольких найденных рецептов дешевле выбрать по списку их id,
+# чем проходом по названиям (см. page)
+PAGE_ID_LIST_LIMIT = 1000
+
+NONZERO_BYTE = re.compile(b'[^\x00]')
+
+
+def time_bucket(cooking_time):
+    """Интервал для времени приготовления в минутах или None"""
+    if not isinstance(cooking_time, int):
+        return None
+    for bucket, limit in TIME_BUCKETS:
+        if limit is None or cooking_time <= limit:
+            return bucket
+    return None
+
+
+def bitmap(recipe_ids):
+    """Битовая карта из id рецептов"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    bits = bytearray(max(recipe_ids) // 8 + 1)
+    for recipe_id in recipe_ids:
+        bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def iter_recipe_ids(bits):
+    """id рецептов по возрастанию из битовой карты, без промежуточного списка"""
+    data = _bytes(bits)
+    for match in NONZERO_BYTE.finditer(data):
+        position = match.start()
+        byte = data[position]
+        for bit in range(8):
+            if byte >> bit & 1:
+                yield position << 3 | bit
+
+
+def recipe_ids(bits):
+    """id рецептов по возрастанию из битовой карты"""
+    return list(iter_recipe_ids(bits))
+
+
+def _scan(rows, size):
+    """({фасет: {значение: карта}}, карта всех рецептов) для строк RECIPES_SQL"""
+    arrays = {facet: {} for facet in FACETS}
+    everything = bytearray(size)
+    for recipe_id, category, difficulty, cooking_time in rows:
+        position, bit = recipe_id >> 3, 1 << (recipe_id & 7)
+        everything[position] |= bit
+        for facet, value in ((CATEGORY, category), (DIFFICULTY, difficulty),
+                             (TIME, time_bucket(cooking_time))):
+            if value is None:
+                continue
+            array = arrays[facet].get(value)
+            if array is None:
+                array = arrays[facet][value] = bytearray(size)
+            array[position] |= bit
+    bitmaps = {
+        facet: {value: int.from_bytes(array, 'little') for value, array in values.items()}
+        for facet, values in arrays.items()
+    }
+    return bitmaps, int.from_bytes(everything, 'little')
+
+
+class FacetIndex:
+    """Битовые карты всех значений фасетов одной базы"""
+
+    def __init__(self, bitmaps, everything, seq=None):
+        # {фасет: {значение: карта}} и карта всех рецептов
+        self.bitmaps = bitmaps
+        self.everything = everything
+        # Номер последнего учтенного изменения журнала (None - журнала нет)
+        self.seq = seq
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, conn):
+        """Карты по одному проходу по recipes (покрывающий индекс idx_recipes_category)"""
+        seq = sync.current_seq(conn) if sync.has_change_log(conn) else None
+        size = (conn.execute('SELECT MAX(id) FROM recipes').fetchone()[0] or 0) // 8 + 1
+        return cls(*_scan(conn.execute(RECIPES_SQL), size), seq)
+
+    def refresh(self, conn):
+        """Учет изменений рецептов из журнала; False - журнала нет или изменений много, нужна перестройка"""
+        if self.seq is None or not sync.has_change_log(conn):
+            return False
+        latest = sync.current_seq(conn)
+        if latest == self.seq:
+            return True
+        if latest - self.seq > REBUILD_CHANGES_PER_RECIPE * self.everything.bit_count():
+            return False
+        changed = sync.changes_since(conn, self.seq, latest)
+        if changed is None:
+            return False
+        # Значения фасетов - столбцы recipes: тексты и ингредиенты их не меняют
+        recipe_ids = changed.get('recipes', set())
+        # Данные читаются после номера журнала: более новые изменения учтутся еще раз
+        rows = conn.execute(RECIPES_SQL + ' WHERE id IN (SELECT value FROM json_each(?))',
+                            (json.dumps(sorted(recipe_ids)),)).fetchall()
+        fresh, present = _scan(rows, max(recipe_ids, default=0) // 8 + 1)
+        # Биты измененных рецептов снимаются во всех картах и ставятся заново по их строкам
+        stale = ~bitmap(recipe_ids)
+        with self._lock:
+            bitmaps = {}
+            for facet in FACETS:
+                current, added = self.bitmaps[facet], fresh[facet]
+                bitmaps[facet] = {}
+                for value in current.keys() | added.keys():
+                    bits = current.get(value, 0) & stale | added.get(value, 0)
+                    if bits:
+                        bitmaps[facet][value] = bits
+            self.bitmaps, self.everything = bitmaps, self.everything & stale | present
+            self.seq = latest
+        return True
+
+    @staticmethod
+    def _facet_filter(bitmaps, facet, values):
+        """Объединение карт выбранных значений фасета; None - фасет не ограничен"""
+        if not values:
+            return None
+        result = 0
+        for value in values:
+            result |= bitmaps[facet].get(value, 0)
+        return result
+
+    def search(self, filters, base=None):
+        """(карта найденных рецептов, {фасет: [(значение, число рецептов)]})
+
+        filters - {фасет: выбранные значения}: внутри фасета значения объединяются
+        (ИЛИ), фасеты пересекаются (И). Счетчик значения фасета учитывает фильтры
+        всех остальных фасетов, то есть показывает, сколько рецептов будет найдено,
+        если добавить это значение. base ограничивает все результаты (например,
+        картой рецептов с нужными ингредиентами).
+        """
+        with self._lock:
+            bitmaps, everything = self.bitmaps, self.everything
+        base = everything if base is None else base & everything
+        selected = {facet: self._facet_filter(bitmaps, facet, filters.get(facet)) for facet in FACETS}
+        matches = base
+        for bits in selected.values():
+            if bits is not None:
+                matches &= bits
+        counts = {}
+        for facet in FACETS:
+            others = base
+            for other, bits in selected.items():
+                if other != facet and bits is not None:
+                    others &= bits
+            counts[facet] = [(value, (others & bitmaps[facet][value]).bit_count())
+                             for value in ordered(facet, bitmaps[facet])]
+        return matches, counts
+
+
+def ordered(facet, values):
+    """Значения фасета в постоянном порядке: по алфавиту, интервалы времени - по возрастанию"""
+    if facet == TIME:
+        return sorted(values, key=TIME_ORDER.get)
+    return sorted(values, key=str)
+
+
+def merge_counts(results):
+    """Сумма счетчиков фасетов нескольких баз (шардов)"""
+    merged = {}
+    for facet in FACETS:
+        totals = Counter()
+        for counts in results:
+            totals.update(dict(counts[facet]))
+        merged[facet] = [(value, totals[value]) for value in ordered(facet, totals)]
+    return merged
+
+
+def page(conn, bits, limit):
+    """Строки списка (id, name, category, cooking_time, difficulty) для первых limit рецептов карты по названию
+
+    Если найдено немного рецептов, они выбираются по списку id. Иначе
+    idx_recipes_name читается в порядке названий, пока не наберется limit
+    рецептов карты: в памяти оказывается только одна страница.
+    """
+    if bits.bit_count() <= PAGE_ID_LIST_LIMIT:
+        cursor = conn.execute('''
+            SELECT id, name, category, cooking_time, difficulty FROM recipes
+            WHERE id IN (SELECT value FROM json_each(?))
+            ORDER BY name, id
+            LIMIT ?
+        ''', (json.dumps(recipe_ids(bits)), -1 if limit is None else limit))
+        return cursor.fetchall()
+    data = _bytes(bits)
+    cursor = conn.execute('SELECT id, name, category, cooking_time, difficulty FROM recipes ORDER BY name, id')
+    return list(islice((row for row in cursor
+                        if row[0] >> 3 < len(data) and data[row[0] >> 3] >> (row[0] & 7) & 1), limit))
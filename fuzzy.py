@@ -0,0 +1,166 @@
+"""Нечеткий поиск по названиям рецептов и ингредиентов (индекс триграмм)
+
+Кандидаты отбираются по числу общих с запросом триграмм прямо в SQLite,
+а точное сходство считается только для них, а не для всех строк таблицы.
+
+Триграммы считает приложение при записи (schema.index_recipes), а не триггеры:
+схема должна оставаться доступной обычному клиенту SQLite. Ингредиенты
+индексируются по словарю ingredient_names: одна запись на название.
+"""
+import json
+import math
+import time
+
+from ingredient_index import normalize_name
+
+TRIGRAM_TABLES = {
+    'recipe_trigrams': '''
+        CREATE TABLE IF NOT EXISTS recipe_trigrams (
+            trigram TEXT NOT NULL,
+            recipe_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, recipe_id)
+        ) WITHOUT ROWID
+    ''',
+    'ingredient_trigrams': '''
+        CREATE TABLE IF NOT EXISTS ingredient_trigrams (
+            trigram TEXT NOT NULL,
+            ingredient_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, ingredient_id)
+        ) WITHOUT ROWID
+    ''',
+}
+
+# Таблица индекса, столбец id и запрос названий кандидатов для каждого вида поиска
+TARGETS = {
+    'recipes': ('recipe_trigrams', 'recipe_id', 'SELECT id, name FROM recipes'),
+    'ingredients': ('ingredient_trigrams', 'ingredient_id', 'SELECT id, name FROM ingredient_names'),
+}
+
+DEFAULT_LIMIT = 10
+DEFAULT_MIN_SIMILARITY = 0.3
+DEFAULT_BUDGET_MS = 50
+
+# Сколько кандидатов проверять на каждый возвращаемый результат
+CANDIDATES_PER_RESULT = 20
+
+
+def trigram_set(text):
+    """Множество триграмм: каждое слово дополняется пробелами, как в pg_trgm"""
+    result = set()
+    for word in (normalize_name(text) or '').split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(query, candidate):
+    """(доля триграмм запроса, найденных в кандидате; коэффициент Жаккара)
+
+    Первое число не штрафует за слова названия, которых нет в запросе,
+    второе при равенстве первого ставит выше более близкие по длине названия.
+    """
+    if not query or not candidate:
+        return 0.0, 0.0
+    shared = len(query & candidate)
+    return shared / len(query), shared / (len(query) + len(candidate) - shared)
+
+
+def has_trigram_index(conn):
+    """Проверка наличия индекса триграмм"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        tuple(TRIGRAM_TABLES),
+    )
+    return cursor.fetchone()[0] == len(TRIGRAM_TABLES)
+
+
+def ensure_trigram_index(conn):
+    """Создание индекса триграмм и первичное заполнение"""
+    for ddl in TRIGRAM_TABLES.values():
+        conn.execute(ddl)
+    rebuild_trigram_index(conn)
+
+
+def _trigram_rows(items):
+    """Строки индекса (триграмма, id) для пар (id, название)"""
+    return [(trigram, item_id) for item_id, name in items for trigram in trigram_set(name)]
+
+
+def rebuild_trigram_index(conn):
+    """Полное перестроение индекса триграмм по названиям"""
+    conn.execute('DELETE FROM recipe_trigrams')
+    conn.execute('DELETE FROM ingredient_trigrams')
+    conn.executemany('INSERT INTO recipe_trigrams (trigram, recipe_id) VALUES (?, ?)',
+                     _trigram_rows(conn.execute('SELECT id, name FROM recipes')))
+    add_ingredient_names(conn, dict(conn.execute('SELECT id, name FROM ingredient_names')))
+
+
+def _recipe_names(conn, recipe_ids):
+    return conn.execute('SELECT id, name FROM recipes WHERE id IN (SELECT value FROM json_each(?))',
+                        (json.dumps(sorted(recipe_ids)),)).fetchall()
+
+
+def unindex_recipes(conn, recipe_ids):
+    """Удаление триграмм названий рецептов до их изменения"""
+    conn.executemany('DELETE FROM recipe_trigrams WHERE trigram = ? AND recipe_id = ?',
+                     _trigram_rows(_recipe_names(conn, recipe_ids)))
+
+
+def index_recipes(conn, recipe_ids):
+    """Триграммы текущих названий рецептов"""
+    conn.executemany('INSERT OR IGNORE INTO recipe_trigrams (trigram, recipe_id) VALUES (?, ?)',
+                     _trigram_rows(_recipe_names(conn, recipe_ids)))
+
+
+def add_ingredient_names(conn, names):
+    """Триграммы новых слов словаря ингредиентов ({id: название})"""
+    conn.executemany('INSERT OR IGNORE INTO ingredient_trigrams (trigram, ingredient_id) VALUES (?, ?)',
+                     _trigram_rows(names.items()))
+
+
+def remove_ingredient_names(conn, names):
+    """Удаление триграмм слов, исключенных из словаря ингредиентов ({id: название})"""
+    conn.executemany('DELETE FROM ingredient_trigrams WHERE trigram = ? AND ingredient_id = ?',
+                     _trigram_rows(names.items()))
+
+
+def fuzzy_search(conn, term, target='recipes', limit=DEFAULT_LIMIT,
+                 min_similarity=DEFAULT_MIN_SIMILARITY, budget_ms=DEFAULT_BUDGET_MS):
+    """[(id, название, сходство)] не больше limit, самые похожие первыми
+
+    Запрос, не уложившийся в budget_ms, возвращает лучшее из уже проверенного.
+    """
+    table, column, names_sql = TARGETS[target]
+    deadline = time.perf_counter() + budget_ms / 1000
+    query = trigram_set(term)
+    if not query:
+        return []
+
+    # Кандидаты с наибольшим числом общих триграмм считает сама SQLite по индексу;
+    # записи, у которых общих триграмм меньше порога, не читаются вовсе
+    needed = max(1, math.ceil(min_similarity * len(query)))
+    candidates = conn.execute(f'''
+        SELECT {column} FROM {table}
+        WHERE trigram IN (SELECT value FROM json_each(?))
+        GROUP BY {column}
+        HAVING COUNT(*) >= ?
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    ''', (json.dumps(sorted(query), ensure_ascii=False), needed, limit * CANDIDATES_PER_RESULT)).fetchall()
+
+    # Названия приходят в порядке таблицы, а проверяются в порядке кандидатов:
+    # если бюджет кончится, проверенными окажутся те, у кого больше общих триграмм
+    names = dict(conn.execute(f'{names_sql} WHERE id IN (SELECT value FROM json_each(?))',
+                              (json.dumps([row[0] for row in candidates]),)))
+    scored = []
+    for (item_id,) in candidates:
+        name = names.get(item_id)
+        if name is None:
+            continue
+        score = similarity(query, trigram_set(name))
+        if score[0] >= min_similarity:
+            scored.append((item_id, name, score))
+        if time.perf_counter() > deadline:
+            break
+    scored.sort(key=lambda item: (-item[2][0], -item[2][1], item[1]))
+    return [(item_id, name, score[0]) for item_id, name, score in scored[:limit]]
@@ -0,0 +1,202 @@
+"""Словарь нормализованных ингредиентов и обратный индекс ингредиент -> рецепты
+
+Запрос поиска по нескольким ингредиентам: группы через запятую объединяются
+по И, варианты внутри группы через '|' - по ИЛИ, '-' перед группой исключает ее:
+    "курица|индейка, рис, -грибы"
+Каждое слово запроса совпадает с названиями ингредиентов, начинающимися с него.
+
+Словарь и индекс обновляет приложение при записи (schema.index_recipes), а не
+триггеры: нормализация названия написана на Python, а схема должна оставаться
+доступной обычному клиенту SQLite. После изменения ингредиентов сторонней
+программой индекс перестраивает python maintenance.py reindex.
+"""
+import json
+
+# Словарь: одна строка на нормализованное название ингредиента
+INDEX_TABLES = {
+    'ingredient_names': '''
+        CREATE TABLE IF NOT EXISTS ingredient_names (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''',
+    'ingredient_postings': '''
+        CREATE TABLE IF NOT EXISTS ingredient_postings (
+            ingredient_id INTEGER NOT NULL,
+            recipe_id INTEGER NOT NULL,
+            PRIMARY KEY (ingredient_id, recipe_id)
+        ) WITHOUT ROWID
+    ''',
+}
+
+INDEX_INDEXES = {
+    'idx_ingredient_postings_recipe': '''
+        CREATE INDEX IF NOT EXISTS idx_ingredient_postings_recipe
+        ON ingredient_postings (recipe_id)
+    ''',
+}
+
+
+def normalize_name(name):
+    """Название ингредиента для словаря: нижний регистр, ё -> е, без лишних пробелов"""
+    if name is None:
+        return None
+    return ' '.join(name.casefold().replace('ё', 'е').split())
+
+
+def has_ingredient_index(conn):
+    """Проверка наличия словаря ингредиентов"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ingredient_postings'")
+    return cursor.fetchone()[0] == 1
+
+
+def ensure_ingredient_index(conn):
+    """Создание словаря и индекса и первичное заполнение"""
+    for ddl in INDEX_TABLES.values():
+        conn.execute(ddl)
+    for ddl in INDEX_INDEXES.values():
+        conn.execute(ddl)
+    rebuild_ingredient_index(conn)
+
+
+def _postings(rows):
+    """Пары (нормализованное название, id рецепта) для строк (id рецепта, название)"""
+    pairs = {(normalize_name(name), recipe_id) for recipe_id, name in rows}
+    return {(name, recipe_id) for name, recipe_id in pairs if name}
+
+
+def rebuild_ingredient_index(conn):
+    """Полное перестроение словаря и индекса по таблице ingredients"""
+    conn.execute('DELETE FROM ingredient_postings')
+    conn.execute('DELETE FROM ingredient_names')
+    pairs = _postings(conn.execute('SELECT recipe_id, name FROM ingredients WHERE recipe_id IS NOT NULL'))
+    codes = {name: code for code, name in enumerate(sorted({name for name, _ in pairs}), 1)}
+    conn.executemany('INSERT INTO ingredient_names (id, name) VALUES (?, ?)',
+                     [(code, name) for name, code in codes.items()])
+    conn.executemany('INSERT INTO ingredient_postings (ingredient_id, recipe_id) VALUES (?, ?)',
+                     [(codes[name], recipe_id) for name, recipe_id in pairs])
+
+
+def unindex_recipes(conn, recipe_ids):
+    """Исключение рецептов из индекса до изменения их ингредиентов
+
+    Названия, которые больше не встречаются ни в одном рецепте, удаляются из
+    словаря; возвращает {id: название} удаленных.
+    """
+    selection = json.dumps(sorted(recipe_ids))
+    touched = [row[0] for row in conn.execute('''
+        SELECT DISTINCT ingredient_id FROM ingredient_postings
+        WHERE recipe_id IN (SELECT value FROM json_each(?))
+    ''', (selection,))]
+    if not touched:
+        return {}
+    conn.execute('DELETE FROM ingredient_postings WHERE recipe_id IN (SELECT value FROM json_each(?))',
+                 (selection,))
+    removed = dict(conn.execute('''
+        SELECT id, name FROM ingredient_names
+        WHERE id IN (SELECT value FROM json_each(?))
+          AND NOT EXISTS (SELECT 1 FROM ingredient_postings WHERE ingredient_id = ingredient_names.id)
+    ''', (json.dumps(touched),)))
+    conn.executemany('DELETE FROM ingredient_names WHERE id = ?', [(code,) for code in removed])
+    return removed
+
+
+def index_recipes(conn, recipe_ids):
+    """Учет текущих ингредиентов рецептов; возвращает {id: название} новых слов словаря"""
+    pairs = _postings(conn.execute(
+        'SELECT recipe_id, name FROM ingredients WHERE recipe_id IN (SELECT value FROM json_each(?))',
+        (json.dumps(sorted(recipe_ids)),)))
+    names = {name for name, _ in pairs}
+    if not names:
+        return {}
+    codes = dict(conn.execute('SELECT name, id FROM ingredient_names WHERE name IN (SELECT value FROM json_each(?))',
+                              (json.dumps(sorted(names)),)))
+    added = {}
+    for name in sorted(names - codes.keys()):
+        code = codes[name] = conn.execute('INSERT INTO ingredient_names (name) VALUES (?)', (name,)).lastrowid
+        added[code] = name
+    conn.executemany('INSERT OR IGNORE INTO ingredient_postings (ingredient_id, recipe_id) VALUES (?, ?)',
+                     [(codes[name], recipe_id) for name, recipe_id in pairs])
+    return added
+
+
+def parse_query(query):
+    """Разбор запроса: ([группы И из вариантов ИЛИ], [исключаемые варианты])"""
+    required, excluded = [], []
+    for group in query.split(','):
+        group = group.strip()
+        negative = group.startswith('-')
+        if negative:
+            group = group[1:]
+        terms = [normalize_name(term) for term in group.split('|')]
+        terms = [term for term in terms if term]
+        if not terms:
+            continue
+        if negative:
+            excluded.extend(terms)
+        else:
+            required.append(terms)
+    return required, excluded
+
+
+def recipes_with(conn, term):
+    """Множество id рецептов с ингредиентом, название которого начинается с term"""
+    cursor = conn.execute('''
+        SELECT DISTINCT p.recipe_id
+        FROM ingredient_names n
+        JOIN ingredient_postings p ON p.ingredient_id = n.id
+        WHERE n.name >= ? AND n.name < ? || char(1114111)
+    ''', (term, term))
+    return {row[0] for row in cursor}
+
+
+def _any_of(conn, terms):
+    result = set()
+    for term in terms:
+        result |= recipes_with(conn, term)
+    return result
+
+
+def find_recipes(conn, required, excluded=()):
+    """id рецептов, подходящих под каждую группу required и ни под один из excluded"""
+    if not required:
+        return set()
+    groups = sorted((_any_of(conn, terms) for terms in required), key=len)
+    # Пересечение от самого короткого списка: дальше множество только уменьшается
+    result = groups[0]
+    for group in groups[1:]:
+        if not result:
+            break
+        result &= group
+    if result and excluded:
+        result -= _any_of(conn, excluded)
+    return result
+
+
+def ingredient_counts(conn, recipe_ids):
+    """{id рецепта: число различных ингредиентов}"""
+    cursor = conn.execute('''
+        SELECT recipe_id, COUNT(*) FROM ingredient_postings
+        WHERE recipe_id IN (SELECT value FROM json_each(?))
+        GROUP BY recipe_id
+    ''', (json.dumps(list(recipe_ids)),))
+    return dict(cursor.fetchall())
+
+
+def pantry_matches(conn, items, min_matches=1):
+    """Рецепты, в которых есть не меньше min_matches продуктов из items
+
+    Возвращает [(id, совпало продуктов, всего ингредиентов в рецепте)]: сначала
+    рецепты с большим числом совпадений, затем с меньшим числом недостающих.
+    """
+    items = [item for item in (normalize_name(item) for item in items) if item]
+    coverage = {}
+    for item in dict.fromkeys(items):
+        for recipe_id in recipes_with(conn, item):
+            coverage[recipe_id] = coverage.get(recipe_id, 0) + 1
+    matched = {recipe_id: count for recipe_id, count in coverage.items() if count >= min_matches}
+    totals = ingredient_counts(conn, matched)
+    result = [(recipe_id, count, totals.get(recipe_id, count)) for recipe_id, count in matched.items()]
+    result.sort(key=lambda item: (-item[1], item[2] - item[1], item[0]))
+    return result
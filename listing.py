@@ -0,0 +1,90 @@
+"""Постраничный просмотр рецептов (keyset-пагинация по (name, id))"""
+
+PAGE_FIRST = '''
+    SELECT id, name, category, cooking_time, difficulty
+    FROM recipes
+    ORDER BY name, id
+    LIMIT ?
+'''
+
+PAGE_AFTER = '''
+    SELECT id, name, category, cooking_time, difficulty
+    FROM recipes
+    WHERE (name, id) > (?, ?)
+    ORDER BY name, id
+    LIMIT ?
+'''
+
+PAGE_BEFORE = '''
+    SELECT id, name, category, cooking_time, difficulty
+    FROM recipes
+    WHERE (name, id) < (?, ?)
+    ORDER BY name DESC, id DESC
+    LIMIT ?
+'''
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class RecipePager:
+    """Страницы списка рецептов; в памяти хранится только текущая страница"""
+
+    def __init__(self, conn, page_size=DEFAULT_PAGE_SIZE, factory=None):
+        self.conn = conn
+        self.page_size = page_size
+        self.factory = factory
+        self.rows = []
+        self.page = []
+        self.page_number = 0
+        self.has_next = False
+        self.has_previous = False
+
+    def _fetch(self, sql, params):
+        """Чтение страницы плюс одной строки, чтобы узнать, есть ли продолжение"""
+        cursor = self.conn.execute(sql, params + (self.page_size + 1,))
+        rows = cursor.fetchmany(self.page_size + 1)
+        more = len(rows) > self.page_size
+        return rows[:self.page_size], more
+
+    def _set_rows(self, rows):
+        """Запоминание строк страницы; ключи пагинации берутся из них"""
+        self.rows = rows
+        self.page = [self.factory(row) for row in rows] if self.factory else rows
+        return self.page
+
+    def first(self):
+        """Первая страница"""
+        rows, self.has_next = self._fetch(PAGE_FIRST, ())
+        self.has_previous = False
+        self.page_number = 1
+        return self._set_rows(rows)
+
+    def next(self):
+        """Следующая страница (текущая, если дальше ничего нет)"""
+        if not self.has_next or not self.rows:
+            return self.page
+        last_id, last_name = self.rows[-1][0], self.rows[-1][1]
+        rows, self.has_next = self._fetch(PAGE_AFTER, (last_name, last_id))
+        if not rows:
+            # Следующие рецепты удалили другим соединением: текущая страница остается
+            # последней и ключом пагинации
+            return self.page
+        self.has_previous = True
+        self.page_number += 1
+        return self._set_rows(rows)
+
+    def previous(self):
+        """Предыдущая страница (текущая, если это первая)"""
+        if not self.has_previous:
+            return self.page
+        if not self.rows:
+            return self.first()
+        first_id, first_name = self.rows[0][0], self.rows[0][1]
+        rows, self.has_previous = self._fetch(PAGE_BEFORE, (first_name, first_id))
+        if not rows:
+            # Предыдущие рецепты удалили: список начинается заново
+            return self.first()
+        rows.reverse()
+        self.has_next = True
+        self.page_number -= 1
+        return self._set_rows(rows)
@@ -0,0 +1,301 @@
+"""Обслуживание базы рецептов без остановки просмотра
+
+Все команды работают короткими шагами: в режиме WAL читатели не ждут пишущую
+сторону, а блокировка записи держится только на время одного шага.
+
+    backup  - резервная копия через backup API небольшими порциями страниц;
+    vacuum  - возврат свободных страниц (auto_vacuum=INCREMENTAL) ограниченными
+              порциями, каждая в своей транзакции;
+    enable-incremental - однократный полный VACUUM для перевода старой базы
+              в режим auto_vacuum=INCREMENTAL (новые базы создаются в нем сразу);
+    optimize - PRAGMA optimize: ANALYZE только тех таблиц, статистика которых
+              устарела; удобно запускать по расписанию (cron) или командой auto;
+    analyze - полный ANALYZE (с --limit - по выборке строк);
+    auto    - optimize и vacuum, если свободных страниц больше порога;
+    reindex - перестроение индексов, которые обновляет приложение, а не триггеры
+              (нужно после изменения рецептов сторонней программой).
+
+Каждая команда сообщает длительность и число возвращенных страниц. Для базы,
+разделенной на шарды, команды выполняются для каждого шарда.
+
+Примеры:
+    python maintenance.py backup backups/recipes-2024-06-01.db
+    python maintenance.py vacuum --slice-pages 256 --max-seconds 5
+    python maintenance.py auto --db recipes.db
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from db import get_manager, READ_ONLY, run_write
+import schema
+import shards
+
+# Страниц за один шаг резервного копирования и пауза между шагами, секунд
+DEFAULT_BACKUP_PAGES = 256
+DEFAULT_BACKUP_PAUSE = 0.005
+
+# Страниц, освобождаемых одной транзакцией incremental_vacuum, и пауза между ними
+DEFAULT_SLICE_PAGES = 512
+DEFAULT_SLICE_PAUSE = 0.01
+
+# Строк на индекс при ANALYZE из PRAGMA optimize (ограничивает время блокировки)
+DEFAULT_ANALYSIS_LIMIT = 1000
+
+# Команда auto запускает vacuum, если свободные страницы составляют не меньше этой доли файла
+DEFAULT_FREE_RATIO = 0.1
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def database_files(db_name):
+    """Файлы SQLite каталога: шарды или сама база"""
+    if not shards.is_sharded(db_name):
+        return [db_name]
+    with open(shards.manifest_path(db_name), encoding='utf-8') as f:
+        count = json.load(f)['shards']
+    return [shards.shard_path(db_name, number) for number in range(count)]
+
+
+def page_usage(conn):
+    """(всего страниц, свободных страниц, размер страницы)"""
+    return tuple(conn.execute(f'PRAGMA {name}').fetchone()[0]
+                 for name in ('page_count', 'freelist_count', 'page_size'))
+
+
+def file_size(db_name):
+    """Размер файла базы вместе с WAL-журналом, байт"""
+    return sum(os.path.getsize(path) for path in (db_name, db_name + '-wal') if os.path.exists(path))
+
+
+def online_backup(conn, target, pages=DEFAULT_BACKUP_PAGES, pause=DEFAULT_BACKUP_PAUSE, progress=None):
+    """Копия базы в файл target порциями по pages страниц; возвращает (страниц, секунд)
+
+    Блокировка чтения источника держится только на время одной порции. Копия
+    пишется во временный файл и переименовывается после завершения, поэтому
+    незаконченная копия никогда не лежит под именем target.
+    """
+    started = time.perf_counter()
+    temporary = f'{target}.{os.getpid()}.tmp'
+    copied = 0
+
+    def step(status, remaining, total):
+        nonlocal copied
+        copied = total
+        if progress:
+            progress(total - remaining, total)
+        # Пауза между порциями дает место пишущей стороне (sleep в backup - только при SQLITE_BUSY)
+        if remaining:
+            time.sleep(pause)
+
+    destination = sqlite3.connect(temporary)
+    try:
+        conn.backup(destination, pages=pages, progress=step)
+    except BaseException:
+        destination.close()
+        os.remove(temporary)
+        raise
+    destination.close()
+    os.replace(temporary, target)
+    return copied, time.perf_counter() - started
+
+
+def incremental_vacuum(conn, slice_pages=DEFAULT_SLICE_PAGES, max_seconds=None, pause=DEFAULT_SLICE_PAUSE):
+    """Возврат свободных страниц порциями; возвращает (страниц, порций, секунд)
+
+    Каждая порция - отдельная короткая транзакция. max_seconds ограничивает
+    общее время: оставшиеся страницы вернет следующий запуск.
+    """
+    started = time.perf_counter()
+    _, free_before, _ = page_usage(conn)
+    slices = 0
+    while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+        if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+            break
+        try:
+            # incremental_vacuum освобождает по странице за шаг выполнения, а execute
+            # делает только первый шаг; executescript выполняет выражение до конца
+            conn.executescript(f'BEGIN IMMEDIATE; PRAGMA incremental_vacuum({int(slice_pages)}); COMMIT;')
+        except Exception:
+            conn.rollback()
+            raise
+        slices += 1
+        time.sleep(pause)
+    # Файл базы укорачивается при переносе страниц из WAL; PASSIVE не ждет читателей
+    conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+    _, free_after, _ = page_usage(conn)
+    return free_before - free_after, slices, time.perf_counter() - started
+
+
+def enable_incremental(conn):
+    """Перевод базы в auto_vacuum=INCREMENTAL полным VACUUM; возвращает (страниц, секунд)
+
+    VACUUM переписывает всю базу и держит блокировку записи до конца; читатели
+    WAL продолжают работать со своим снимком. Нужен один раз для старой базы.
+    """
+    started = time.perf_counter()
+    pages_before, _, _ = page_usage(conn)
+    conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+    pages_after, _, _ = page_usage(conn)
+    return pages_before - pages_after, time.perf_counter() - started
+
+
+def optimize(conn, analysis_limit=DEFAULT_ANALYSIS_LIMIT):
+    """PRAGMA optimize с ограниченной выборкой; возвращает секунд"""
+    started = time.perf_counter()
+    conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+    conn.execute('PRAGMA optimize').fetchall()
+    return time.perf_counter() - started
+
+
+def reindex(conn):
+    """Перестроение производных данных одной транзакцией; возвращает секунд"""
+    started = time.perf_counter()
+    run_write(conn, schema.rebuild_indexes)
+    return time.perf_counter() - started
+
+
+def analyze(conn, analysis_limit=None):
+    """Полный ANALYZE (или по выборке analysis_limit строк на индекс); возвращает секунд"""
+    started = time.perf_counter()
+    conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit or 0)}')
+    conn.execute('ANALYZE')
+    return time.perf_counter() - started
+
+
+def free_ratio(conn):
+    pages, free, _ = page_usage(conn)
+    return free / pages if pages else 0.0
+
+
+def _open(path):
+    conn = get_manager(path).connection()
+    schema.migrate(conn)
+    return conn
+
+
+def _pages(count, conn):
+    return f"{count} стр. ({count * page_usage(conn)[2] / 1024 / 1024:.1f} МБ)"
+
+
+def command_backup(args):
+    files = database_files(args.db)
+    targets = [args.target]
+    if shards.is_sharded(args.db):
+        targets = [shards.shard_path(args.target, number) for number in range(len(files))]
+        shutil.copyfile(shards.manifest_path(args.db), shards.manifest_path(args.target))
+    for path, target in zip(files, targets):
+        conn = get_manager(path, READ_ONLY).connection()
+        copied, seconds = online_backup(conn, target, args.pages, args.pause)
+        print(f"✅ {path} -> {target}: {copied} стр. за {seconds:.2f} с", file=sys.stderr)
+
+
+def command_vacuum(args):
+    for path in database_files(args.db):
+        conn = _open(path)
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            print(f"❌ {path}: auto_vacuum не INCREMENTAL, выполните enable-incremental", file=sys.stderr)
+            sys.exit(1)
+        size = file_size(path)
+        reclaimed, slices, seconds = incremental_vacuum(conn, args.slice_pages, args.max_seconds)
+        remaining = page_usage(conn)[1]
+        print(f"✅ {path}: возвращено {_pages(reclaimed, conn)} за {seconds:.2f} с ({slices} порций), "
+              f"осталось свободных {remaining}, файл {size / 1024 / 1024:.1f} -> "
+              f"{file_size(path) / 1024 / 1024:.1f} МБ", file=sys.stderr)
+
+
+def command_enable_incremental(args):
+    for path in database_files(args.db):
+        conn = _open(path)
+        reclaimed, seconds = enable_incremental(conn)
+        print(f"✅ {path}: auto_vacuum=INCREMENTAL, возвращено {_pages(reclaimed, conn)} за {seconds:.2f} с",
+              file=sys.stderr)
+
+
+def command_optimize(args):
+    for path in database_files(args.db):
+        seconds = optimize(_open(path), args.limit)
+        print(f"✅ {path}: PRAGMA optimize за {seconds:.2f} с", file=sys.stderr)
+
+
+def command_analyze(args):
+    for path in database_files(args.db):
+        seconds = analyze(_open(path), args.limit)
+        print(f"✅ {path}: ANALYZE за {seconds:.2f} с", file=sys.stderr)
+
+
+def command_reindex(args):
+    for path in database_files(args.db):
+        seconds = reindex(_open(path))
+        print(f"✅ {path}: индексы перестроены за {seconds:.2f} с", file=sys.stderr)
+
+
+def command_auto(args):
+    for path in database_files(args.db):
+        conn = _open(path)
+        seconds = optimize(conn, args.limit)
+        print(f"✅ {path}: PRAGMA optimize за {seconds:.2f} с", file=sys.stderr)
+        ratio = free_ratio(conn)
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            print(f"   {path}: свободно {ratio:.0%}, auto_vacuum не INCREMENTAL - пропуск vacuum", file=sys.stderr)
+        elif ratio < args.free_ratio:
+            print(f"   {path}: свободно {ratio:.0%} - vacuum не нужен", file=sys.stderr)
+        else:
+            reclaimed, slices, seconds = incremental_vacuum(conn, args.slice_pages, args.max_seconds)
+            print(f"✅ {path}: возвращено {_pages(reclaimed, conn)} за {seconds:.2f} с ({slices} порций)",
+                  file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание базы рецептов")
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup', help="резервная копия без остановки приложения")
+    backup_parser.add_argument('target', help="файл копии")
+    backup_parser.add_argument('--pages', type=int, default=DEFAULT_BACKUP_PAGES, help="страниц за шаг")
+    backup_parser.add_argument('--pause', type=float, default=DEFAULT_BACKUP_PAUSE,
+                               help="пауза между шагами, секунд")
+    backup_parser.set_defaults(handler=command_backup)
+
+    vacuum_parser = commands.add_parser('vacuum', help="вернуть свободные страницы порциями")
+    vacuum_parser.set_defaults(handler=command_vacuum)
+
+    enable_parser = commands.add_parser('enable-incremental', help="однократный VACUUM с auto_vacuum=INCREMENTAL")
+    enable_parser.set_defaults(handler=command_enable_incremental)
+
+    optimize_parser = commands.add_parser('optimize', help="PRAGMA optimize")
+    optimize_parser.set_defaults(handler=command_optimize)
+
+    analyze_parser = commands.add_parser('analyze', help="полный ANALYZE")
+    analyze_parser.add_argument('--limit', type=int, help="строк на индекс (по умолчанию - все)")
+    analyze_parser.set_defaults(handler=command_analyze)
+
+    auto_parser = commands.add_parser('auto', help="optimize и vacuum по необходимости (для cron)")
+    auto_parser.add_argument('--free-ratio', type=float, default=DEFAULT_FREE_RATIO,
+                             help="доля свободных страниц, с которой запускается vacuum")
+    auto_parser.set_defaults(handler=command_auto)
+
+    reindex_parser = commands.add_parser('reindex', help="перестроить индексы после сторонних изменений")
+    reindex_parser.set_defaults(handler=command_reindex)
+
+    for command in (vacuum_parser, auto_parser):
+        command.add_argument('--slice-pages', type=int, default=DEFAULT_SLICE_PAGES,
+                             help="страниц за одну транзакцию")
+        command.add_argument('--max-seconds', type=float, help="ограничение общего времени")
+    for command in (optimize_parser, auto_parser):
+        command.add_argument('--limit', type=int, default=DEFAULT_ANALYSIS_LIMIT,
+                             help="строк на индекс при анализе")
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""Замеры времени SQL-запросов и журнал медленных запросов
+
+Включение: переменные окружения RECIPES_METRICS=1 и RECIPES_SLOW_QUERY_MS=<порог>
+или вызов enable() до открытия соединений. Выключенные замеры не добавляют
+накладных расходов: соединения создаются обычным классом sqlite3.Connection.
+
+При включении через окружение:
+    RECIPES_SLOW_QUERY_LOG=<файл>   журнал медленных запросов (по умолчанию stderr)
+    RECIPES_METRICS_DUMP=<файл>     замеры в JSON при выходе из программы
+    kill -USR1 <pid> / kill -USR2 <pid>   вывести / сбросить замеры на ходу
+"""
+import atexit
+import json
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# Границы интервалов гистограммы задержек, мс
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+# Запросы, для которых имеет смысл EXPLAIN QUERY PLAN
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+slow_log = logging.getLogger('recipes.slow_queries')
+
+_lock = threading.Lock()
+_enabled = False
+_slow_query_ms = DEFAULT_SLOW_QUERY_MS
+_queries = {}
+_connections = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+_slow_count = 0
+# Повторы транзакций записи из-за занятой базы (см. db.run_write); считаются и при
+# выключенных замерах - это редкое событие
+_write_retries = 0
+
+
+class QueryStats:
+    """Накопленные замеры одного SQL-запроса"""
+    __slots__ = ('sql', 'count', 'total_ms', 'max_ms', 'rows', 'histogram')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms, rows):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.histogram[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self):
+        labels = [f'<={bound}' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}']
+        return {
+            'sql': self.sql,
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'rows': self.rows,
+            'histogram_ms': dict(zip(labels, self.histogram)),
+        }
+
+
+def normalize_sql(sql):
+    """SQL-текст без лишних пробелов: ключ для группировки замеров"""
+    return ' '.join(sql.split())
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(slow_query_ms=None):
+    """Включение замеров для соединений, открытых после вызова"""
+    global _enabled, _slow_query_ms
+    _enabled = True
+    if slow_query_ms is not None:
+        _slow_query_ms = slow_query_ms
+
+
+def disable():
+    """Выключение замеров для новых соединений"""
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Сброс накопленных замеров"""
+    global _slow_count, _write_retries
+    with _lock:
+        _queries.clear()
+        _connections.update(count=0, total_ms=0.0, max_ms=0.0)
+        _slow_count = 0
+        _write_retries = 0
+
+
+def connection_class():
+    """Класс соединения для sqlite3.connect(factory=...)"""
+    return InstrumentedConnection if _enabled else Connection
+
+
+def record_connect(elapsed):
+    """Учет времени открытия соединения (с применением настроек)"""
+    if not _enabled:
+        return
+    elapsed_ms = elapsed * 1000
+    with _lock:
+        _connections['count'] += 1
+        _connections['total_ms'] += elapsed_ms
+        _connections['max_ms'] = max(_connections['max_ms'], elapsed_ms)
+
+
+def record_write_retry():
+    """Учет повтора транзакции записи"""
+    global _write_retries
+    with _lock:
+        _write_retries += 1
+
+
+def _record_query(conn, sql, params, elapsed_ms, rows):
+    global _slow_count
+    key = normalize_sql(sql)
+    with _lock:
+        stats = _queries.get(key)
+        if stats is None:
+            stats = _queries[key] = QueryStats(key)
+        stats.add(elapsed_ms, rows)
+        slow = elapsed_ms >= _slow_query_ms
+        if slow:
+            _slow_count += 1
+    if slow:
+        _log_slow_query(conn, key, params, elapsed_ms, rows)
+
+
+def _log_slow_query(conn, sql, params, elapsed_ms, rows):
+    """Запись медленного запроса в журнал вместе с планом выполнения"""
+    plan = []
+    if sql.split(' ', 1)[0].upper() in EXPLAINABLE:
+        try:
+            cursor = sqlite3.Cursor(conn)
+            plan = [row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params or ())]
+        except sqlite3.Error as e:
+            plan = [f'план недоступен: {e}']
+    slow_log.warning(
+        'медленный запрос %.1f мс, строк %d: %s\n%s',
+        elapsed_ms, rows, sql, '\n'.join(f'    {line}' for line in plan),
+    )
+
+
+def snapshot():
+    """Текущие замеры: запросы (самые затратные первыми) и открытия соединений"""
+    with _lock:
+        queries = [stats.as_dict() for stats in _queries.values()]
+        connections = dict(_connections)
+        slow_count = _slow_count
+        write_retries = _write_retries
+    queries.sort(key=lambda item: item['total_ms'], reverse=True)
+    return {
+        'enabled': _enabled,
+        'slow_query_ms': _slow_query_ms,
+        'slow_queries': slow_count,
+        'write_retries': write_retries,
+        'connections': connections,
+        'queries': queries,
+    }
+
+
+def dump(stream=None):
+    """Вывод замеров в JSON (по умолчанию в stderr)"""
+    stream = stream or sys.stderr
+    json.dump(snapshot(), stream, ensure_ascii=False, indent=2)
+    stream.write('\n')
+    stream.flush()
+
+
+def install_signal_handlers():
+    """SIGUSR1 - вывести замеры, SIGUSR2 - сбросить (только POSIX)"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: dump())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: reset())
+    return True
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, учитывающий время выполнения и чтения строк каждого запроса"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._query = None
+
+    def _start(self, sql, params):
+        self._finish()
+        self._query = [sql, params, 0.0, 0]
+
+    def _finish(self):
+        """Запрос завершен: курсор дочитан, переиспользован или закрыт"""
+        query, self._query = self._query, None
+        if query is not None:
+            sql, params, elapsed, rows = query
+            _record_query(self.connection, sql, params, elapsed * 1000, rows)
+
+    def _track(self, started, rows, exhausted):
+        query = self._query
+        if query is not None:
+            query[2] += time.perf_counter() - started
+            query[3] += rows
+            if exhausted:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        no_rows = self.description is None
+        self._track(started, max(self.rowcount, 0) if no_rows else 0, no_rows)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._track(started, max(self.rowcount, 0), True)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._track(started, 0, True)
+            raise
+        self._track(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class Connection(sqlite3.Connection):
+    """Соединение без замеров; в отличие от sqlite3.Connection допускает слабые ссылки (см. cache.py)"""
+
+
+class InstrumentedConnection(Connection):
+    """Соединение, все запросы которого идут через InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def dump_to_file(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        dump(f)
+
+
+def configure_from_environment(environ=os.environ):
+    """Включение замеров по переменным окружения (для консольных приложений)"""
+    if environ.get('RECIPES_METRICS') != '1':
+        return False
+    enable(float(environ.get('RECIPES_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)))
+    log_path = environ.get('RECIPES_SLOW_QUERY_LOG')
+    handler = logging.FileHandler(log_path, encoding='utf-8') if log_path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_log.addHandler(handler)
+    slow_log.propagate = False
+    dump_path = environ.get('RECIPES_METRICS_DUMP')
+    if dump_path:
+        atexit.register(dump_to_file, dump_path)
+    if threading.current_thread() is threading.main_thread():
+        install_signal_handlers()
+    return True
+
+
+configure_from_environment()
@@ -1,48 +1,35 @@
-import sqlite3
-import os
+"""Консольное приложение для управления рецептами
+
+База доступна и обычному клиенту SQLite: названия, категории, несжатые
+инструкции и ингредиенты попадают в полнотекстовый поиск триггерами. Сжатые
+инструкции, словарь ингредиентов и индекс нечеткого поиска обновляет только
+это приложение, поэтому после записи в базу сторонней программой нужно
+выполнить python maintenance.py reindex.
+"""
 from datetime import datetime
 
+from db import is_busy
+from listing import DEFAULT_PAGE_SIZE
+from repository import Ingredient
+from shards import open_repository
+import startup
+from units import parse_minutes
+
 class RecipeApp:
-    def __init__(self, db_name='recipes.db'):
+    def __init__(self, db_name='recipes.db', page_size=DEFAULT_PAGE_SIZE):
         self.db_name = db_name
+        self.page_size = page_size
+        # Обычная база или несколько шардов (если рядом есть recipes.shards.json)
+        self.repository = open_repository(db_name)
         self.init_db()
     
     def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Таблица рецептов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS recipes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT,
-                cooking_time INTEGER,
-                difficulty TEXT,
-                instructions TEXT,
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица ингредиентов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ingredients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                recipe_id INTEGER,
-                name TEXT NOT NULL,
-                quantity TEXT,
-                unit TEXT,
-                FOREIGN KEY (recipe_id) REFERENCES recipes (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Инициализация базы данных: создание и обновление схемы"""
+        self.repository.migrate()
     
     def clear_screen(self):
         """Очистка экрана терминала"""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        startup.clear_screen()
     
     def display_menu(self):
         """Отображение главного меню"""
@@ -54,7 +41,8 @@ class RecipeApp:
         print("2. Просмотреть все рецепты")
         print("3. Поиск рецептов")
         print("4. Удалить рецепт")
-        print("5. Выйти из приложения")
+        print("5. Изменить рецепт")
+        print("6. Выйти из приложения")
         print("=" * 50)
     
     def add_recipe(self):
@@ -66,7 +54,7 @@ class RecipeApp:
         # Ввод основной информации о рецепте
         name = input("Название рецепта: ")
         category = input("Категория (например, суп, десерт, основное блюдо): ")
-        cooking_time = input("Время приготовления (в минутах): ")
+        cooking_time = self.input_minutes("Время приготовления (в минутах): ")
         difficulty = input("Сложность (легко/средне/сложно): ")
         
         print("\nВведите инструкции по приготовлению:")
@@ -81,6 +69,34 @@ class RecipeApp:
         instructions = '\n'.join(instructions_lines)
         
         # Ввод ингредиентов
+        ingredients = self.input_ingredients()
+        
+        # Сохранение в базу данных
+        try:
+            self.repository.add_recipe(name, category, cooking_time, difficulty, instructions, ingredients)
+            print(f"\n✅ Рецепт '{name}' успешно добавлен!")
+            
+        except Exception as e:
+            if is_busy(e):
+                print("\n❌ База занята другим процессом, рецепт не добавлен. Попробуйте еще раз.")
+            else:
+                print(f"\n❌ Ошибка при добавлении рецепта: {e}")
+        
+        input("\nНажмите Enter для продолжения...")
+    
+    def input_minutes(self, prompt, default=None):
+        """Ввод времени в минутах ("45", "1 час 30 мин"); пустой ввод - default"""
+        while True:
+            value = input(prompt).strip()
+            if not value:
+                return default
+            minutes = parse_minutes(value)
+            if minutes is not None:
+                return minutes
+            print("❌ Не удалось разобрать время, введите число минут.")
+    
+    def input_ingredients(self):
+        """Ввод списка ингредиентов"""
         print("\nДОБАВЛЕНИЕ ИНГРЕДИЕНТОВ")
         print("(введите 'готово' для завершения)")
         ingredients = []
@@ -94,77 +110,99 @@ class RecipeApp:
             quantity = input("  Количество: ")
             unit = input("  Единица измерения (г, мл, шт. и т.д.): ")
             
-            ingredients.append({
-                'name': ing_name,
-                'quantity': quantity,
-                'unit': unit
-            })
+            ingredients.append(Ingredient(ing_name, quantity, unit))
         
-        # Сохранение в базу данных
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        return ingredients
+    
+    def edit_recipe(self):
+        """Изменение существующего рецепта"""
+        self.clear_screen()
+        print("РЕДАКТИРОВАНИЕ РЕЦЕПТА")
+        print("-" * 30)
         
         try:
-            # Сохраняем рецепт
-            cursor.execute('''
-                INSERT INTO recipes (name, category, cooking_time, difficulty, instructions)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, category, cooking_time, difficulty, instructions))
-            
-            recipe_id = cursor.lastrowid
-            
-            # Сохраняем ингредиенты
-            for ingredient in ingredients:
-                cursor.execute('''
-                    INSERT INTO ingredients (recipe_id, name, quantity, unit)
-                    VALUES (?, ?, ?, ?)
-                ''', (recipe_id, ingredient['name'], ingredient['quantity'], ingredient['unit']))
-            
-            conn.commit()
-            print(f"\n✅ Рецепт '{name}' успешно добавлен!")
-            
-        except Exception as e:
-            conn.rollback()
-            print(f"\n❌ Ошибка при добавлении рецепта: {e}")
+            recipe_id = int(input("Введите ID рецепта для изменения: "))
+        except ValueError:
+            print("❌ Пожалуйста, введите корректный ID.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        recipe = self.repository.load_recipe(recipe_id)
+        if recipe is None:
+            print("Рецепт с таким ID не найден.")
+            input("\nНажмите Enter для продолжения...")
+            return
         
-        finally:
-            conn.close()
+        # Пустой ввод оставляет прежнее значение
+        print("(Enter - оставить без изменений)\n")
+        recipe.name = input(f"Название [{recipe.name}]: ") or recipe.name
+        recipe.category = input(f"Категория [{recipe.category}]: ") or recipe.category
+        recipe.cooking_time = self.input_minutes(f"Время приготовления [{recipe.cooking_time}]: ", recipe.cooking_time)
+        recipe.difficulty = input(f"Сложность [{recipe.difficulty}]: ") or recipe.difficulty
+        
+        if input("\nЗаменить инструкцию? (да/нет): ").lower() == 'да':
+            print("(введите 'конец' на отдельной строке для завершения)")
+            instructions_lines = []
+            while True:
+                line = input()
+                if line.lower() == 'конец':
+                    break
+                instructions_lines.append(line)
+            recipe.instructions = '\n'.join(instructions_lines)
+        
+        if input("Заменить ингредиенты? (да/нет): ").lower() == 'да':
+            recipe.ingredients = self.input_ingredients()
+        
+        try:
+            self.repository.update_recipe(recipe)
+            print(f"\n✅ Рецепт '{recipe.name}' успешно изменен!")
+        except Exception as e:
+            if is_busy(e):
+                print("\n❌ База занята другим процессом, изменения не сохранены. Попробуйте еще раз.")
+            else:
+                print(f"\n❌ Ошибка при изменении рецепта: {e}")
         
         input("\nНажмите Enter для продолжения...")
     
     def view_all_recipes(self):
-        """Просмотр всех рецептов"""
-        self.clear_screen()
-        print("ВСЕ РЕЦЕПТЫ")
-        print("-" * 50)
+        """Просмотр всех рецептов постранично"""
+        pager = self.repository.pager(self.page_size)
+        recipes = pager.first()
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            ORDER BY name
-        ''')
-        
-        recipes = cursor.fetchall()
-        
-        if not recipes:
-            print("Рецепты не найдены.")
-        else:
+        while True:
+            self.clear_screen()
+            print("ВСЕ РЕЦЕПТЫ")
+            print("-" * 50)
+            
+            if not recipes:
+                print("Рецепты не найдены.")
+                input("\nНажмите Enter для продолжения...")
+                return
+            
+            print(f"Страница {pager.page_number}\n")
             for recipe in recipes:
-                id, name, category, cooking_time, difficulty = recipe
-                print(f"{id}. {name}")
-                print(f"   Категория: {category} | Время: {cooking_time} мин | Сложность: {difficulty}")
+                print(f"{recipe.id}. {recipe.name}")
+                print(f"   Категория: {recipe.category} | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
                 print()
-        
-        conn.close()
-        
-        # Опция просмотра деталей рецепта
-        if recipes:
-            choice = input("Введите ID рецепта для подробного просмотра (или Enter для возврата): ")
-            if choice.isdigit():
+            
+            options = []
+            if pager.has_previous:
+                options.append("'п' - предыдущая страница")
+            if pager.has_next:
+                options.append("'с' - следующая страница")
+            if options:
+                print(", ".join(options))
+            
+            # Навигация по страницам или просмотр деталей рецепта
+            choice = input("Введите ID рецепта для подробного просмотра (или Enter для возврата): ").strip().lower()
+            if choice == 'с':
+                recipes = pager.next()
+            elif choice == 'п':
+                recipes = pager.previous()
+            elif choice.isdigit():
                 self.view_recipe_details(int(choice))
+            else:
+                return
     
     def search_recipes(self):
         """Поиск рецептов"""
@@ -174,7 +212,8 @@ class RecipeApp:
         print("1. По названию")
         print("2. По категории")
         print("3. По ингредиенту")
-        print("4. Назад")
+        print("4. По нескольким ингредиентам")
+        print("5. Назад")
         
         choice = input("\nВыберите вариант поиска: ")
         
@@ -184,32 +223,29 @@ class RecipeApp:
             self.search_by_category()
         elif choice == '3':
             self.search_by_ingredient()
+        elif choice == '4':
+            self.search_by_ingredients()
     
     def search_by_name(self):
         """Поиск по названию"""
         search_term = input("\nВведите название для поиска: ")
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        recipes = self.repository.search_by_name(search_term)
         
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            WHERE name LIKE ? 
-            ORDER BY name
-        ''', (f'%{search_term}%',))
+        # Ничего не нашлось - возможно, в названии опечатка
+        if not recipes:
+            similar = self.repository.fuzzy_search(search_term)
+            if similar:
+                recipes = [recipe for recipe, _ in similar]
+                self.display_search_results(recipes, f"похожие на '{search_term}'")
+                return
         
-        self.display_search_results(cursor.fetchall(), f"результаты поиска по '{search_term}'")
-        conn.close()
+        self.display_search_results(recipes, f"результаты поиска по '{search_term}'")
     
     def search_by_category(self):
         """Поиск по категории"""
         # Сначала покажем доступные категории
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT DISTINCT category FROM recipes WHERE category IS NOT NULL')
-        categories = [row[0] for row in cursor.fetchall()]
+        categories = self.repository.categories()
         
         if categories:
             print("\nДоступные категории:")
@@ -218,33 +254,25 @@ class RecipeApp:
         
         search_term = input("\nВведите категорию для поиска: ")
         
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            WHERE category LIKE ? 
-            ORDER BY name
-        ''', (f'%{search_term}%',))
+        recipes = self.repository.search_by_category(search_term)
         
-        self.display_search_results(cursor.fetchall(), f"рецепты в категории '{search_term}'")
-        conn.close()
+        self.display_search_results(recipes, f"рецепты в категории '{search_term}'")
     
     def search_by_ingredient(self):
         """Поиск по ингредиенту"""
         search_term = input("\nВведите ингредиент для поиска: ")
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        recipes = self.repository.search_by_ingredient(search_term)
         
-        cursor.execute('''
-            SELECT DISTINCT r.id, r.name, r.category, r.cooking_time, r.difficulty
-            FROM recipes r
-            JOIN ingredients i ON r.id = i.recipe_id
-            WHERE i.name LIKE ?
-            ORDER BY r.name
-        ''', (f'%{search_term}%',))
+        self.display_search_results(recipes, f"рецепты с ингредиентом '{search_term}'")
+    
+    def search_by_ingredients(self):
+        """Поиск по нескольким ингредиентам: 'а, б|в, -г' - а И (б ИЛИ в) БЕЗ г"""
+        search_term = input("\nВведите ингредиенты через запятую ('а|б' - любой, '-в' - без): ")
+        
+        recipes = self.repository.search_by_ingredients(search_term) or []
         
-        self.display_search_results(cursor.fetchall(), f"рецепты с ингредиентом '{search_term}'")
-        conn.close()
+        self.display_search_results(recipes, f"рецепты с ингредиентами '{search_term}'")
     
     def display_search_results(self, recipes, title):
         """Отображение результатов поиска"""
@@ -256,9 +284,8 @@ class RecipeApp:
             print("Рецепты не найдены.")
         else:
             for recipe in recipes:
-                id, name, category, cooking_time, difficulty = recipe
-                print(f"{id}. {name}")
-                print(f"   Категория: {category} | Время: {cooking_time} мин | Сложность: {difficulty}")
+                print(f"{recipe.id}. {recipe.name}")
+                print(f"   Категория: {recipe.category} | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
                 print()
         
         # Опция просмотра деталей рецепта
@@ -271,46 +298,33 @@ class RecipeApp:
         """Просмотр детальной информации о рецепте"""
         self.clear_screen()
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Получаем информацию о рецепте
-        cursor.execute('SELECT * FROM recipes WHERE id = ?', (recipe_id,))
-        recipe = cursor.fetchone()
+        # Рецепт вместе с ингредиентами (из кэша, если он уже открывался)
+        recipe = self.repository.get_recipe(recipe_id)
         
         if not recipe:
             print("Рецепт не найден.")
-            conn.close()
             input("\nНажмите Enter для продолжения...")
             return
         
-        # Получаем ингредиенты
-        cursor.execute('SELECT name, quantity, unit FROM ingredients WHERE recipe_id = ?', (recipe_id,))
-        ingredients = cursor.fetchall()
-        
-        conn.close()
-        
         # Отображаем информацию
-        id, name, category, cooking_time, difficulty, instructions, created_date = recipe
-        
-        print(f"РЕЦЕПТ: {name}")
+        print(f"РЕЦЕПТ: {recipe.name}")
         print("=" * 50)
-        print(f"Категория: {category}")
-        print(f"Время приготовления: {cooking_time} минут")
-        print(f"Сложность: {difficulty}")
-        print(f"Добавлен: {created_date}")
+        print(f"Категория: {recipe.category}")
+        print(f"Время приготовления: {recipe.cooking_time} минут")
+        print(f"Сложность: {recipe.difficulty}")
+        print(f"Добавлен: {recipe.created_date}")
         
         print("\nИНГРЕДИЕНТЫ:")
         print("-" * 30)
-        for i, (ing_name, quantity, unit) in enumerate(ingredients, 1):
-            if unit:
-                print(f"{i}. {ing_name} - {quantity} {unit}")
+        for i, ingredient in enumerate(recipe.ingredients, 1):
+            if ingredient.unit:
+                print(f"{i}. {ingredient.name} - {ingredient.quantity} {ingredient.unit}")
             else:
-                print(f"{i}. {ing_name} - {quantity}")
+                print(f"{i}. {ingredient.name} - {ingredient.quantity}")
         
         print("\nИНСТРУКЦИЯ ПРИГОТОВЛЕНИЯ:")
         print("-" * 40)
-        print(instructions)
+        print(recipe.instructions)
         
         print("\n" + "=" * 50)
         input("\nНажмите Enter для продолжения...")
@@ -322,11 +336,7 @@ class RecipeApp:
         print("-" * 30)
         
         # Сначала покажем все рецепты
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name FROM recipes ORDER BY name')
-        recipes = cursor.fetchall()
-        conn.close()
+        recipes = self.repository.recipe_names()
         
         if not recipes:
             print("Нет рецептов для удаления.")
@@ -341,28 +351,24 @@ class RecipeApp:
             recipe_id = int(input("\nВведите ID рецепта для удаления: "))
             
             # Подтверждение удаления
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('SELECT name FROM recipes WHERE id = ?', (recipe_id,))
-            recipe_name = cursor.fetchone()
+            recipe_name = self.repository.recipe_name(recipe_id)
             
             if not recipe_name:
                 print("Рецепт с таким ID не найден.")
             else:
-                confirm = input(f"Вы уверены, что хотите удалить рецепт '{recipe_name[0]}'? (да/нет): ")
+                confirm = input(f"Вы уверены, что хотите удалить рецепт '{recipe_name}'? (да/нет): ")
                 if confirm.lower() == 'да':
-                    # Удаляем ингредиенты сначала (из-за внешнего ключа)
-                    cursor.execute('DELETE FROM ingredients WHERE recipe_id = ?', (recipe_id,))
-                    cursor.execute('DELETE FROM recipes WHERE id = ?', (recipe_id,))
-                    conn.commit()
-                    print(f"✅ Рецепт '{recipe_name[0]}' успешно удален!")
+                    self.repository.delete_recipe(recipe_id)
+                    print(f"✅ Рецепт '{recipe_name}' успешно удален!")
                 else:
                     print("Удаление отменено.")
             
-            conn.close()
-            
         except ValueError:
             print("❌ Пожалуйста, введите корректный ID.")
+        except Exception as e:
+            if not is_busy(e):
+                raise
+            print("❌ База занята другим процессом, рецепт не удален. Попробуйте еще раз.")
         
         input("\nНажмите Enter для продолжения...")
     
@@ -370,7 +376,7 @@ class RecipeApp:
         """Запуск основного цикла приложения"""
         while True:
             self.display_menu()
-            choice = input("Выберите действие (1-5): ")
+            choice = input("Выберите действие (1-6): ")
             
             if choice == '1':
                 self.add_recipe()
@@ -381,10 +387,13 @@ class RecipeApp:
             elif choice == '4':
                 self.delete_recipe()
             elif choice == '5':
+                self.edit_recipe()
+            elif choice == '6':
                 print("\nДо свидания!")
+                self.repository.close()
                 break
             else:
-                print("\n❌ Неверный выбор. Пожалуйста, выберите от 1 до 5.")
+                print("\n❌ Неверный выбор. Пожалуйста, выберите от 1 до 6.")
                 input("Нажмите Enter для продолжения...")
 
 # Запуск приложения
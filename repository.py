@@ -0,0 +1,526 @@
+"""Доступ к данным рецептов без пользовательского интерфейса"""
+import json
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+
+import bulk
+from cache import get_cache
+from db import READ_WRITE, get_manager, run_write
+import facets
+import fuzzy
+import ingredient_index
+from listing import DEFAULT_PAGE_SIZE, PAGE_AFTER, PAGE_FIRST, RecipePager
+import schema
+import search
+import similarity
+import stats
+import texts
+from units import stored_minutes
+
+
+class Ingredient:
+    """Ингредиент рецепта"""
+    __slots__ = ('name', 'quantity', 'unit')
+
+    def __init__(self, name, quantity=None, unit=None):
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit
+
+    def __repr__(self):
+        return f'Ingredient({self.name!r}, {self.quantity!r}, {self.unit!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Ingredient):
+            return NotImplemented
+        return (self.name, self.quantity, self.unit) == (other.name, other.quantity, other.unit)
+
+    def as_dict(self):
+        return {'name': self.name, 'quantity': self.quantity, 'unit': self.unit}
+
+
+class RecipeSummary:
+    """Строка списка рецептов: без инструкции и ингредиентов"""
+    __slots__ = ('id', 'name', 'category', 'cooking_time', 'difficulty')
+
+    def __init__(self, id, name, category=None, cooking_time=None, difficulty=None):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.cooking_time = cooking_time
+        self.difficulty = difficulty
+
+    @classmethod
+    def from_row(cls, row):
+        """Из строки (id, name, category, cooking_time, difficulty)"""
+        return cls(*row)
+
+    def __repr__(self):
+        return f'RecipeSummary({self.id!r}, {self.name!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, RecipeSummary):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Recipe:
+    """Рецепт целиком: с инструкцией и упорядоченными ингредиентами"""
+    __slots__ = ('id', 'name', 'category', 'cooking_time', 'difficulty',
+                 'instructions', 'created_date', 'ingredients')
+
+    def __init__(self, id, name, category=None, cooking_time=None, difficulty=None,
+                 instructions=None, created_date=None, ingredients=()):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.cooking_time = cooking_time
+        self.difficulty = difficulty
+        self.instructions = instructions
+        self.created_date = created_date
+        self.ingredients = list(ingredients)
+
+    def __repr__(self):
+        return f'Recipe({self.id!r}, {self.name!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Recipe):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def as_dict(self):
+        data = {slot: getattr(self, slot) for slot in self.__slots__}
+        data['ingredients'] = [ingredient.as_dict() for ingredient in self.ingredients]
+        return data
+
+
+class RecipeBatch:
+    """Добавления, изменения и удаления многих рецептов для одной транзакции"""
+
+    def __init__(self):
+        self.added = []
+        self.updated = []
+        self.deleted = []
+        # Результаты после применения
+        self.added_ids = []
+        self.updated_count = 0
+        self.deleted_count = 0
+
+    def add(self, recipe):
+        """Новый рецепт (Recipe; id не используется)"""
+        self.added.append(recipe)
+
+    def update(self, recipe):
+        """Изменение рецепта recipe.id на месте; ингредиенты заменяются целиком"""
+        self.updated.append(recipe)
+
+    def delete(self, recipe_id):
+        """Удаление рецепта; ингредиенты удаляются каскадно"""
+        self.deleted.append(recipe_id)
+
+    def recipe_ids(self):
+        """id всех затронутых рецептов"""
+        return [recipe.id for recipe in self.updated] + self.deleted + self.added_ids
+
+    def __len__(self):
+        return len(self.added) + len(self.updated) + len(self.deleted)
+
+
+def _record(recipe):
+    """Рецепт в формате bulk.insert_records"""
+    row = (recipe.name, recipe.category, recipe.cooking_time, recipe.difficulty,
+           recipe.instructions, recipe.created_date)
+    return row, [(item.name, item.quantity, item.unit) for item in recipe.ingredients]
+
+
+def _summaries(rows):
+    return [RecipeSummary.from_row(row) for row in rows]
+
+
+class RecipeRepository:
+    """Все запросы к базе рецептов; возвращает записи Recipe/RecipeSummary"""
+
+    def __init__(self, db_name='recipes.db', mode=READ_WRITE, id_stride=1, id_offset=0):
+        self.db_name = db_name
+        # Новые рецепты получают id, дающие остаток id_offset при делении на id_stride
+        self.id_stride = id_stride
+        self.id_offset = id_offset
+        self.db = get_manager(db_name, mode)
+        self.cache = get_cache(db_name)
+        # Снимок не видит изменений через PRAGMA data_version: кэш сбрасывается при его обновлении
+        self.db.add_refresh_listener(self.cache.invalidate)
+        # Класс индекса в памяти (FacetIndex, SimilarityIndex) -> (поколение кэша, индекс);
+        # индекс строится при первом запросе, которому он нужен
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
+
+    def connection(self):
+        """Соединение текущего потока"""
+        return self.db.connection()
+
+    def close(self):
+        """Закрытие соединений с базой"""
+        self.db.close()
+
+    def files(self):
+        """Файлы, в которых хранится база"""
+        return [self.db_name]
+
+    def migrate(self):
+        """Создание и обновление схемы базы"""
+        return schema.migrate(self.connection())
+
+    # Чтение
+
+    def pager(self, page_size=DEFAULT_PAGE_SIZE):
+        """Постраничный список всех рецептов"""
+        return RecipePager(self.connection(), page_size, RecipeSummary.from_row)
+
+    def list_recipes(self, after=None, limit=DEFAULT_PAGE_SIZE):
+        """Страница списка без состояния: after - ключ (name, id) последней строки предыдущей"""
+        conn = self.connection()
+        if after is None:
+            cursor = conn.execute(PAGE_FIRST, (limit,))
+        else:
+            cursor = conn.execute(PAGE_AFTER, tuple(after) + (limit,))
+        return _summaries(cursor)
+
+    def search_by_name(self, search_term):
+        return _summaries(search.search_by_name(self.connection(), search_term))
+
+    def search_by_category(self, search_term):
+        return _summaries(search.search_by_category(self.connection(), search_term))
+
+    def search_by_ingredient(self, search_term):
+        return _summaries(search.search_by_ingredient(self.connection(), search_term))
+
+    def summaries(self, recipe_ids):
+        """Строки списка для id рецептов в том же порядке"""
+        recipe_ids = list(recipe_ids)
+        cursor = self.connection().execute('''
+            SELECT id, name, category, cooking_time, difficulty FROM recipes
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(recipe_ids),))
+        found = {row[0]: RecipeSummary.from_row(row) for row in cursor}
+        return [found[recipe_id] for recipe_id in recipe_ids if recipe_id in found]
+
+    def search_by_ingredients(self, query):
+        """Рецепты по выражению из нескольких ингредиентов (см. ingredient_index); None без индекса"""
+        conn = self.connection()
+        if not ingredient_index.has_ingredient_index(conn):
+            return None
+        required, excluded = ingredient_index.parse_query(query)
+        recipes = self.summaries(ingredient_index.find_recipes(conn, required, excluded))
+        recipes.sort(key=lambda recipe: (recipe.name, recipe.id))
+        return recipes
+
+    def search_by_pantry(self, items, min_matches=1):
+        """(рецепт, совпало продуктов, всего ингредиентов) по списку продуктов; None без индекса"""
+        conn = self.connection()
+        if not ingredient_index.has_ingredient_index(conn):
+            return None
+        matches = ingredient_index.pantry_matches(conn, items, min_matches)
+        recipes = {recipe.id: recipe for recipe in self.summaries(item[0] for item in matches)}
+        return [(recipes[recipe_id], matched, total)
+                for recipe_id, matched, total in matches if recipe_id in recipes]
+
+    def fuzzy_search(self, search_term, limit=fuzzy.DEFAULT_LIMIT):
+        """(рецепт, сходство) по названию с опечатками; None без индекса триграмм"""
+        conn = self.connection()
+        if not fuzzy.has_trigram_index(conn):
+            return None
+        matches = fuzzy.fuzzy_search(conn, search_term, 'recipes', limit)
+        recipes = {recipe.id: recipe for recipe in self.summaries(item[0] for item in matches)}
+        return [(recipes[recipe_id], score) for recipe_id, _, score in matches if recipe_id in recipes]
+
+    def similar_ingredients(self, search_term, limit=fuzzy.DEFAULT_LIMIT):
+        """(название ингредиента, сходство) для названия с опечатками; None без индекса"""
+        conn = self.connection()
+        if not fuzzy.has_trigram_index(conn):
+            return None
+        return [(name, score) for _, name, score in fuzzy.fuzzy_search(conn, search_term, 'ingredients', limit)]
+
+    def recipes_by_cooking_time(self, max_minutes, min_minutes=0, limit=None):
+        """Рецепты со временем приготовления от min_minutes до max_minutes, самые быстрые первыми"""
+        cursor = self.connection().execute('''
+            SELECT id, name, category, cooking_time, difficulty FROM recipes
+            WHERE cooking_time BETWEEN ? AND ?
+            ORDER BY cooking_time, name
+            LIMIT ?
+        ''', (min_minutes, max_minutes, -1 if limit is None else limit))
+        return _summaries(cursor)
+
+    def shopping_list(self, recipe_ids):
+        """Список покупок для рецептов: ([(название, базовая единица, сумма)], [(название, количество, единица)])
+
+        Количества одного ингредиента в одной базовой единице складывает SQLite;
+        ингредиенты без разобранного количества перечисляются вторым списком как есть.
+        None, если база не обновлена.
+        """
+        conn = self.connection()
+        if not schema.has_quantity_columns(conn):
+            return None
+        selection = json.dumps(list(recipe_ids))
+        totals = conn.execute('''
+            SELECT MIN(name), base_unit, SUM(base_amount) FROM ingredients
+            WHERE recipe_id IN (SELECT value FROM json_each(?)) AND base_unit IS NOT NULL
+            GROUP BY normalize_name(name), base_unit
+            ORDER BY normalize_name(name), base_unit
+        ''', (selection,)).fetchall()
+        unparsed = conn.execute('''
+            SELECT name, quantity, unit FROM ingredients
+            WHERE recipe_id IN (SELECT value FROM json_each(?)) AND base_unit IS NULL
+            ORDER BY normalize_name(name), id
+        ''', (selection,)).fetchall()
+        return totals, unparsed
+
+    def _memory_index(self, index_class):
+        """Индекс в памяти для текущего поколения кэша
+
+        После изменения базы индекс обновляется по журналу изменений (refresh),
+        а если это невозможно - строится заново. Потоки сервера обращаются к нему
+        одновременно: блокировка не дает двум из них обновить или построить
+        один индекс дважды.
+        """
+        conn = self.connection()
+        self.cache.check_data_version(conn)
+        with self._indexes_lock:
+            generation = self.cache.generation
+            current = self._indexes.get(index_class)
+            if current is None or (current[0] != generation and not current[1].refresh(conn)):
+                current = (generation, index_class.build(conn))
+            elif current[0] != generation:
+                current = (generation, current[1])
+            self._indexes[index_class] = current
+        return current[1]
+
+    def facet_index(self):
+        """Битовые карты фасетов; после изменения базы обновляются по журналу изменений"""
+        return self._memory_index(facets.FacetIndex)
+
+    def faceted_search(self, filters=None, ingredients=None, limit=DEFAULT_PAGE_SIZE):
+        """(рецепты, всего найдено, {фасет: [(значение, число рецептов)]})
+
+        filters - {фасет: значения} для фасетов из facets.FACETS, ingredients -
+        выражение для поиска по ингредиентам (см. ingredient_index). Возвращаются
+        первые limit рецептов по названию; None, если нет индекса ингредиентов.
+        """
+        conn = self.connection()
+        base = None
+        if ingredients:
+            if not ingredient_index.has_ingredient_index(conn):
+                return None
+            required, excluded = ingredient_index.parse_query(ingredients)
+            base = facets.bitmap(ingredient_index.find_recipes(conn, required, excluded))
+        matches, counts = self.facet_index().search(filters or {}, base)
+        return _summaries(facets.page(conn, matches, limit)), matches.bit_count(), counts
+
+    def similarity_index(self):
+        """Индекс похожих рецептов; после изменения базы обновляется по журналу изменений"""
+        return self._memory_index(similarity.SimilarityIndex)
+
+    def recipe_features(self, recipe_id):
+        """(категория, ингредиенты) рецепта для поиска похожих; None без индекса ингредиентов"""
+        if not ingredient_index.has_ingredient_index(self.connection()):
+            return None
+        return self.similarity_index().features(recipe_id)
+
+    def similar_to(self, features, limit=similarity.DEFAULT_LIMIT, exclude=()):
+        """(рецепт, сходство) для признаков recipe_features по убыванию сходства"""
+        matches = self.similarity_index().similar(*features, limit, exclude)
+        recipes = {recipe.id: recipe for recipe in self.summaries(recipe_id for _, recipe_id in matches)}
+        return [(recipes[recipe_id], score) for score, recipe_id in matches if recipe_id in recipes]
+
+    def similar_recipes(self, recipe_id, limit=similarity.DEFAULT_LIMIT):
+        """Рецепты с общими ингредиентами и категорией; None без индекса или рецепта"""
+        features = self.recipe_features(recipe_id)
+        if features is None:
+            return None
+        return self.similar_to(features, limit, (recipe_id,))
+
+    def similarity_memory(self):
+        """Память индекса похожих рецептов, байт (0, если он еще не строился)"""
+        current = self._indexes.get(similarity.SimilarityIndex)
+        return current[1].memory_usage() if current else 0
+
+    def categories(self):
+        """Названия всех категорий по алфавиту"""
+        cursor = self.connection().execute(
+            'SELECT DISTINCT category FROM recipes WHERE category IS NOT NULL ORDER BY category')
+        return [row[0] for row in cursor]
+
+    def categories_with_recipes(self, max_per_category=None):
+        """(категория, рецепты, всего рецептов в категории) одним запросом"""
+        conn = self.connection()
+
+        if max_per_category is None:
+            cursor = conn.execute('''
+                SELECT id, name, category, cooking_time, difficulty, NULL
+                FROM recipes
+                WHERE category IS NOT NULL
+                ORDER BY category, name, id
+            ''')
+        else:
+            # Не больше max_per_category рецептов на категорию плюс общее число рецептов в ней
+            cursor = conn.execute('''
+                SELECT id, name, category, cooking_time, difficulty, category_total
+                FROM (
+                    SELECT id, name, category, cooking_time, difficulty,
+                           ROW_NUMBER() OVER (PARTITION BY category ORDER BY name, id) AS position,
+                           COUNT(*) OVER (PARTITION BY category) AS category_total
+                    FROM recipes
+                    WHERE category IS NOT NULL
+                )
+                WHERE position <= ?
+                ORDER BY category, name, id
+            ''', (max_per_category,))
+
+        # Строки приходят упорядоченными по категории, группируем по мере чтения
+        for category, rows in groupby(cursor, key=itemgetter(2)):
+            rows = list(rows)
+            total = rows[0][5] if max_per_category is not None else len(rows)
+            yield category, [RecipeSummary.from_row(row[:5]) for row in rows], total
+
+    def recipe_names(self):
+        """(id, название) всех рецептов по алфавиту"""
+        return self.connection().execute('SELECT id, name FROM recipes ORDER BY name').fetchall()
+
+    def recipe_name(self, recipe_id):
+        """Название рецепта или None"""
+        row = self.connection().execute(
+            'SELECT name FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+        return row[0] if row else None
+
+    def instructions(self, recipe_id):
+        """Инструкция рецепта (хранится отдельно и читается только по запросу)"""
+        return texts.read_text(self.connection(), recipe_id)
+
+    def load_recipe(self, recipe_id):
+        """Рецепт из базы в обход кэша; None, если рецепта нет"""
+        conn = self.connection()
+        row = conn.execute('''
+            SELECT id, name, category, cooking_time, difficulty, created_date
+            FROM recipes WHERE id = ?
+        ''', (recipe_id,)).fetchone()
+        if row is None:
+            return None
+        recipe_id, name, category, cooking_time, difficulty, created_date = row
+        ingredients = conn.execute(
+            'SELECT name, quantity, unit FROM ingredients WHERE recipe_id = ? ORDER BY id',
+            (recipe_id,),
+        )
+        return Recipe(recipe_id, name, category, cooking_time, difficulty, self.instructions(recipe_id),
+                      created_date, ingredients=[Ingredient(*item) for item in ingredients])
+
+    def get_recipe(self, recipe_id):
+        """Рецепт через кэш"""
+        return self.cache.get_recipe(self.connection(), recipe_id, self.load_recipe)
+
+    def statistics(self):
+        """Сводка: рецептов, категорий, самый быстрый рецепт"""
+        conn = self.connection()
+        # Одна предрассчитанная строка; для старых баз без нее - прямые запросы
+        if stats.has_statistics(conn):
+            return stats.read_summary(conn)
+        return stats.compute_summary(conn)
+
+    def statistics_details(self):
+        """Подробная статистика или None, если база не обновлена"""
+        conn = self.connection()
+        if not stats.has_statistics(conn):
+            return None
+        return stats.read_details(conn)
+
+    # Запись
+
+    def apply(self, batch):
+        """Применение RecipeBatch одной транзакцией (executemany для каждого вида изменений)
+
+        Если база занята другими процессами, транзакция повторяется (db.run_write).
+        """
+        run_write(self.connection(), lambda conn: self._write(conn, batch))
+        for recipe_id in batch.recipe_ids():
+            self.cache.invalidate(recipe_id)
+        return batch
+
+    def _write(self, conn, batch):
+        """Изменения RecipeBatch внутри начатой транзакции"""
+        # Индексы приложения читают прежнее состояние рецептов, поэтому - до записи
+        schema.unindex_recipes(conn, batch.deleted + [recipe.id for recipe in batch.updated])
+        if batch.deleted:
+            cursor = conn.executemany('DELETE FROM recipes WHERE id = ?',
+                                      [(recipe_id,) for recipe_id in batch.deleted])
+            batch.deleted_count = cursor.rowcount
+        if batch.updated:
+            # Ингредиенты несуществующих рецептов нарушили бы внешний ключ
+            existing = {row[0] for row in conn.execute(
+                'SELECT id FROM recipes WHERE id IN (SELECT value FROM json_each(?))',
+                (json.dumps([recipe.id for recipe in batch.updated]),))}
+            batch.updated = [recipe for recipe in batch.updated if recipe.id in existing]
+        if batch.updated:
+            cursor = conn.executemany('''
+                UPDATE recipes
+                SET name = ?, category = ?, cooking_time = ?, difficulty = ?
+                WHERE id = ?
+            ''', [(recipe.name, recipe.category, stored_minutes(recipe.cooking_time), recipe.difficulty,
+                   recipe.id) for recipe in batch.updated])
+            batch.updated_count = cursor.rowcount
+            texts.write_texts(conn, [(recipe.id, recipe.instructions) for recipe in batch.updated])
+            conn.executemany('DELETE FROM ingredients WHERE recipe_id = ?',
+                             [(recipe.id,) for recipe in batch.updated])
+            conn.executemany(bulk.INSERT_INGREDIENT, [
+                bulk.ingredient_row(recipe.id, item.name, item.quantity, item.unit)
+                for recipe in batch.updated for item in recipe.ingredients
+            ])
+            schema.index_recipes(conn, [recipe.id for recipe in batch.updated])
+        if batch.added:
+            batch.added_ids, _ = bulk.insert_records(
+                conn, [_record(recipe) for recipe in batch.added], self.id_stride, self.id_offset)
+
+    @contextmanager
+    def batch(self):
+        """with repository.batch() as batch: ... - изменения применяются при выходе из блока"""
+        batch = RecipeBatch()
+        yield batch
+        if batch:
+            self.apply(batch)
+
+    def add_recipes(self, recipes):
+        """Добавление рецептов одной транзакцией; возвращает их id"""
+        batch = RecipeBatch()
+        for recipe in recipes:
+            batch.add(recipe)
+        return self.apply(batch).added_ids
+
+    def update_recipes(self, recipes):
+        """Изменение рецептов на месте одной транзакцией; возвращает число измененных"""
+        batch = RecipeBatch()
+        for recipe in recipes:
+            batch.update(recipe)
+        return self.apply(batch).updated_count
+
+    def delete_recipes(self, recipe_ids):
+        """Удаление рецептов одной транзакцией; возвращает число удаленных"""
+        batch = RecipeBatch()
+        for recipe_id in recipe_ids:
+            batch.delete(recipe_id)
+        return self.apply(batch).deleted_count
+
+    def add_recipe(self, name, category=None, cooking_time=None, difficulty=None,
+                   instructions=None, ingredients=()):
+        """Добавление рецепта с ингредиентами одной транзакцией; возвращает id"""
+        recipe = Recipe(None, name, category, cooking_time, difficulty, instructions, ingredients=ingredients)
+        return self.add_recipes([recipe])[0]
+
+    def update_recipe(self, recipe):
+        """Изменение рецепта на месте; False, если рецепта нет"""
+        return self.update_recipes([recipe]) > 0
+
+    def delete_recipe(self, recipe_id):
+        """Удаление рецепта и его ингредиентов; False, если рецепта не было"""
+        return self.delete_recipes([recipe_id]) > 0
@@ -0,0 +1,405 @@
+"""Схема базы данных рецептов и ее версионные миграции"""
+import sys
+from contextlib import contextmanager
+
+from db import run_write
+import fuzzy
+import ingredient_index
+import search
+import stats
+import sync
+import texts
+from units import parse_minutes, parse_quantity
+
+# Исходные таблицы (миграция 1); инструкция переносится в recipe_texts миграцией 9
+TABLES = {
+    'recipes': '''
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT,
+            cooking_time INTEGER,
+            difficulty TEXT,
+            instructions TEXT,
+            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'ingredients': '''
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipe_id INTEGER,
+            name TEXT NOT NULL,
+            quantity TEXT,
+            unit TEXT,
+            FOREIGN KEY (recipe_id) REFERENCES recipes (id)
+        )
+    ''',
+}
+
+# Таблица ингредиентов после миграции 7: удаление рецепта удаляет его ингредиенты
+INGREDIENTS_WITH_CASCADE = '''
+    CREATE TABLE ingredients_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipe_id INTEGER REFERENCES recipes (id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        quantity TEXT,
+        unit TEXT
+    )
+'''
+
+# Индекс рецептов миграций 2-8, когда инструкция хранилась в самой таблице recipes
+INLINE_RECIPES_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+        name, category, instructions,
+        content='recipes', content_rowid='id'
+    )
+'''
+
+INLINE_RECIPE_TRIGGERS = {
+    'recipes_fts_ai': '''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN
+            INSERT INTO recipes_fts (rowid, name, category, instructions)
+            VALUES (new.id, new.name, new.category, new.instructions);
+        END
+    ''',
+    'recipes_fts_ad': '''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN
+            INSERT INTO recipes_fts (recipes_fts, rowid, name, category, instructions)
+            VALUES ('delete', old.id, old.name, old.category, old.instructions);
+        END
+    ''',
+    'recipes_fts_au': '''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_au
+        AFTER UPDATE OF name, category, instructions ON recipes BEGIN
+            INSERT INTO recipes_fts (recipes_fts, rowid, name, category, instructions)
+            VALUES ('delete', old.id, old.name, old.category, old.instructions);
+            INSERT INTO recipes_fts (rowid, name, category, instructions)
+            VALUES (new.id, new.name, new.category, new.instructions);
+        END
+    ''',
+}
+
+INGREDIENT_SEARCH_TRIGGERS = ('ingredients_fts_ai', 'ingredients_fts_ad', 'ingredients_fts_au')
+
+# Разобранное количество ингредиента (миграция 8): число из quantity и оно же
+# в базовой единице g/ml/pcs; NULL, если количество или единицу не удалось разобрать
+QUANTITY_COLUMNS = {
+    'amount': 'REAL',
+    'base_amount': 'REAL',
+    'base_unit': 'TEXT',
+}
+
+# Покрывающие индексы для частых запросов
+INDEXES = {
+    'idx_recipes_name': '''
+        CREATE INDEX IF NOT EXISTS idx_recipes_name
+        ON recipes (name, id, category, cooking_time, difficulty)
+    ''',
+    'idx_recipes_category': '''
+        CREATE INDEX IF NOT EXISTS idx_recipes_category
+        ON recipes (category, name, id, cooking_time, difficulty)
+    ''',
+    'idx_recipes_cooking_time': '''
+        CREATE INDEX IF NOT EXISTS idx_recipes_cooking_time
+        ON recipes (cooking_time, name)
+    ''',
+    'idx_ingredients_recipe': '''
+        CREATE INDEX IF NOT EXISTS idx_ingredients_recipe
+        ON ingredients (recipe_id)
+    ''',
+}
+
+# Частые запросы приложений и индекс, которым каждый из них должен пользоваться
+HOT_QUERIES = (
+    ('idx_recipes_name', '''
+        SELECT id, name, category, cooking_time, difficulty
+        FROM recipes
+        ORDER BY name
+    '''),
+    ('idx_recipes_category', '''
+        SELECT id, name, cooking_time, difficulty
+        FROM recipes
+        WHERE category = ?
+        ORDER BY name
+    '''),
+    ('idx_recipes_category', '''
+        SELECT DISTINCT category FROM recipes WHERE category IS NOT NULL ORDER BY category
+    '''),
+    ('idx_recipes_cooking_time', '''
+        SELECT name, cooking_time FROM recipes
+        WHERE cooking_time IS NOT NULL ORDER BY cooking_time LIMIT 1
+    '''),
+    ('idx_recipes_cooking_time', '''
+        SELECT id FROM recipes WHERE cooking_time BETWEEN ? AND ? ORDER BY cooking_time, name
+    '''),
+    ('idx_ingredients_recipe', '''
+        SELECT name, quantity, unit FROM ingredients WHERE recipe_id = ? ORDER BY id
+    '''),
+    ('idx_ingredients_recipe', '''
+        SELECT base_unit, SUM(base_amount) FROM ingredients
+        WHERE recipe_id IN (SELECT value FROM json_each(?)) GROUP BY base_unit
+    '''),
+    ('idx_ingredients_recipe', '''
+        DELETE FROM ingredients WHERE recipe_id = ?
+    '''),
+    ('sqlite_autoindex_ingredient_names_1', '''
+        SELECT id FROM ingredient_names WHERE name >= ? AND name < ?
+    '''),
+    ('idx_ingredient_postings_recipe', '''
+        SELECT recipe_id, COUNT(*) FROM ingredient_postings WHERE recipe_id = ? GROUP BY recipe_id
+    '''),
+)
+
+
+def rebuild_inline_search_index(conn):
+    """Перестроение индексов миграций 2-8 (инструкция еще в таблице recipes)"""
+    for table in ('recipes_fts', 'ingredients_fts'):
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+def create_tables(conn):
+    """Миграция 1: основные таблицы"""
+    for ddl in TABLES.values():
+        conn.execute(ddl)
+
+
+def create_search_index(conn):
+    """Миграция 2: полнотекстовый индекс"""
+    existed = search.has_search_index(conn)
+    conn.execute(INLINE_RECIPES_FTS)
+    conn.execute(search.SEARCH_TABLES['ingredients_fts'])
+    for ddl in INLINE_RECIPE_TRIGGERS.values():
+        conn.execute(ddl)
+    for name in INGREDIENT_SEARCH_TRIGGERS:
+        conn.execute(search.SEARCH_TRIGGERS[name])
+    if not existed:
+        rebuild_inline_search_index(conn)
+
+
+def create_indexes(conn):
+    """Миграция 3: индексы для списков, категорий и ингредиентов"""
+    for ddl in INDEXES.values():
+        conn.execute(ddl)
+    conn.execute('ANALYZE')
+
+
+def create_statistics(conn):
+    """Миграция 4: предрассчитанная статистика"""
+    stats.ensure_statistics(conn)
+
+
+def create_ingredient_index(conn):
+    """Миграция 5: словарь ингредиентов и обратный индекс"""
+    ingredient_index.ensure_ingredient_index(conn)
+
+
+def create_trigram_index(conn):
+    """Миграция 6: индекс триграмм для нечеткого поиска"""
+    fuzzy.ensure_trigram_index(conn)
+
+
+def cascade_ingredients(conn):
+    """Миграция 7: ON DELETE CASCADE для ингредиентов (таблица пересоздается)"""
+    conn.execute(INGREDIENTS_WITH_CASCADE)
+    # Строки без рецепта не переносятся: с внешними ключами их нельзя вставить
+    conn.execute('''
+        INSERT INTO ingredients_new (id, recipe_id, name, quantity, unit)
+        SELECT id, recipe_id, name, quantity, unit FROM ingredients
+        WHERE recipe_id IS NULL OR recipe_id IN (SELECT id FROM recipes)
+    ''')
+    orphans = conn.execute('''
+        SELECT (SELECT COUNT(*) FROM ingredients) - (SELECT COUNT(*) FROM ingredients_new)
+    ''').fetchone()[0]
+    # Вместе с таблицей удаляются ее индексы и триггеры; они создаются заново в том же виде
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'ingredients' AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL")]
+    conn.execute('DROP TABLE ingredients')
+    conn.execute('ALTER TABLE ingredients_new RENAME TO ingredients')
+    for ddl in dependents:
+        conn.execute(ddl)
+    if orphans:
+        rebuild_inline_search_index(conn)
+        ingredient_index.rebuild_ingredient_index(conn)
+
+
+def has_quantity_columns(conn):
+    """Есть ли в базе разобранные количества (миграция 8)"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(ingredients)')}
+    return set(QUANTITY_COLUMNS) <= columns
+
+
+def structured_quantities(conn):
+    """Миграция 8: числовые количества в базовых единицах и время в минутах"""
+    for column, column_type in QUANTITY_COLUMNS.items():
+        conn.execute(f'ALTER TABLE ingredients ADD COLUMN {column} {column_type}')
+    # Прежние триггеры изменения переиндексировали бы FTS при каждом UPDATE ниже
+    for name, ddl in (('recipes_fts_au', INLINE_RECIPE_TRIGGERS['recipes_fts_au']),
+                      ('ingredients_fts_au', search.SEARCH_TRIGGERS['ingredients_fts_au'])):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(ddl)
+    conn.executemany(
+        'UPDATE ingredients SET amount = ?, base_amount = ?, base_unit = ? WHERE id = ?',
+        [parse_quantity(quantity, unit) + (ingredient_id,) for ingredient_id, quantity, unit in conn.execute(
+            'SELECT id, quantity, unit FROM ingredients WHERE quantity IS NOT NULL').fetchall()],
+    )
+    # Время, сохраненное текстом ("30 мин"), приводится к минутам; статистику обновляют триггеры.
+    # Текст, который не разобрать, остается как есть (см. units.stored_minutes)
+    rows = conn.execute(
+        "SELECT id, cooking_time FROM recipes WHERE typeof(cooking_time) NOT IN ('integer', 'null')").fetchall()
+    parsed = [(parse_minutes(cooking_time), recipe_id) for recipe_id, cooking_time in rows]
+    conn.executemany('UPDATE recipes SET cooking_time = ? WHERE id = ?',
+                     [(minutes, recipe_id) for minutes, recipe_id in parsed if minutes is not None])
+
+
+def separate_texts(conn):
+    """Миграция 9: инструкции переносятся в recipe_texts (со сжатием)
+
+    Освободившееся в страницах recipes место возвращает maintenance.py enable-incremental.
+    """
+    for ddl in texts.TEXT_TABLES.values():
+        conn.execute(ddl)
+    conn.executemany(texts.UPSERT_TEXT, [
+        texts.text_row(recipe_id, instructions) for recipe_id, instructions in conn.execute(
+            "SELECT id, instructions FROM recipes WHERE instructions IS NOT NULL AND instructions != ''").fetchall()
+    ])
+    # Индекс рецептов создается заново в нынешнем виде (см. search.py)
+    for name in INLINE_RECIPE_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.execute('DROP TABLE IF EXISTS recipes_fts')
+    search.ensure_search_index(conn)
+    conn.execute('ALTER TABLE recipes DROP COLUMN instructions')
+
+
+def create_change_log(conn):
+    """Миграция 10: журнал изменений для синхронизации реплик"""
+    sync.ensure_change_log(conn)
+
+
+# Шаги миграции по порядку; номер версии схемы = номер шага
+MIGRATIONS = (
+    create_tables,
+    create_search_index,
+    create_indexes,
+    create_statistics,
+    create_ingredient_index,
+    create_trigram_index,
+    cascade_ingredients,
+    structured_quantities,
+    separate_texts,
+    create_change_log,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# Индексы и триггеры, обслуживание которых можно отложить на время массовой
+# загрузки, и функции, восстанавливающие их данные после нее (кроме триггеров
+# журнала изменений: их записи нельзя восстановить задним числом). Индексы,
+# которые обновляет приложение (index_recipes), загрузка просто не обновляет.
+DEFERRABLE = (
+    ('INDEX', INDEXES, None),
+    ('TRIGGER', search.SEARCH_TRIGGERS, search.rebuild_search_index),
+    ('TRIGGER', stats.STATS_TRIGGERS, stats.rebuild_statistics),
+    ('TRIGGER', {}, ingredient_index.rebuild_ingredient_index),
+    ('TRIGGER', {}, fuzzy.rebuild_trigram_index),
+)
+
+
+def unindex_recipes(conn, recipe_ids):
+    """Исключение рецептов из индексов, которые обновляет приложение, - до изменения их строк"""
+    fuzzy.unindex_recipes(conn, recipe_ids)
+    fuzzy.remove_ingredient_names(conn, ingredient_index.unindex_recipes(conn, recipe_ids))
+
+
+def index_recipes(conn, recipe_ids):
+    """Учет текущего состояния рецептов в индексах, которые обновляет приложение
+
+    Вызывается в той же транзакции, что и запись рецептов. Сжатые инструкции,
+    словарь ингредиентов и триграммы триггеры обновлять не могут, не требуя
+    от каждого клиента SQLite функций Python; после записи сторонней программой
+    их восстанавливает maintenance.py reindex.
+    """
+    search.index_recipes(conn, recipe_ids)
+    fuzzy.index_recipes(conn, recipe_ids)
+    fuzzy.add_ingredient_names(conn, ingredient_index.index_recipes(conn, recipe_ids))
+
+
+def rebuild_indexes(conn):
+    """Полное перестроение всех производных данных внутри начатой транзакции"""
+    for _, _, rebuild in DEFERRABLE:
+        if rebuild is not None:
+            rebuild(conn)
+
+
+@contextmanager
+def deferred_maintenance(conn):
+    """Удаление вторичных индексов и триггеров на время загрузки с восстановлением после"""
+    for kind, objects, _ in DEFERRABLE:
+        for name in objects:
+            conn.execute(f'DROP {kind} IF EXISTS {name}')
+    conn.commit()
+    try:
+        yield
+    finally:
+        conn.rollback()
+        conn.execute('BEGIN IMMEDIATE')
+        for _, objects, rebuild in DEFERRABLE:
+            for ddl in objects.values():
+                conn.execute(ddl)
+            if rebuild is not None:
+                rebuild(conn)
+        conn.commit()
+
+
+def get_version(conn):
+    """Текущая версия схемы (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Применение недостающих миграций; каждая выполняется в своей транзакции"""
+    def step(conn, number):
+        # Другой процесс мог обновить схему, пока мы ждали блокировку
+        if get_version(conn) >= number:
+            return
+        MIGRATIONS[number - 1](conn)
+        conn.execute(f'PRAGMA user_version = {number}')
+
+    version = get_version(conn)
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        run_write(conn, lambda conn: step(conn, number))
+    return get_version(conn)
+
+
+def query_plan(conn, sql):
+    """Строки EXPLAIN QUERY PLAN для запроса"""
+    params = (None,) * sql.count('?')
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def check_query_plans(conn):
+    """Частые запросы, которые не используют ожидаемый индекс"""
+    problems = []
+    for index, sql in HOT_QUERIES:
+        plan = query_plan(conn, sql)
+        if not any(index in line for line in plan):
+            problems.append((' '.join(sql.split()), plan))
+    return problems
+
+
+if __name__ == '__main__':
+    from db import get_manager
+
+    db_name = sys.argv[1] if len(sys.argv) > 1 else 'recipes.db'
+    conn = get_manager(db_name).connection()
+    print(f"Версия схемы: {migrate(conn)}")
+
+    problems = check_query_plans(conn)
+    for sql, plan in problems:
+        print(f"❌ {sql}")
+        for line in plan:
+            print(f"   {line}")
+    if problems:
+        sys.exit(1)
+    print("✅ Все частые запросы используют индексы")
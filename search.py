@@ -0,0 +1,234 @@
+"""Полнотекстовый поиск рецептов (FTS5)"""
+import json
+import re
+
+import texts
+
+# Индекс рецептов хранит собственную копию текста. Название, категорию и несжатую
+# инструкцию в него записывают триггеры, так что индекс не отстает и от записи
+# обычным клиентом SQLite. Сжатую инструкцию (см. texts.py) распаковать в SQL
+# могла бы только функция Python, поэтому ее записывает приложение
+# (schema.index_recipes), а после сторонней записи - maintenance.py reindex.
+SEARCH_TABLES = {
+    'recipes_fts': '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+            name, category, instructions
+        )
+    ''',
+    'ingredients_fts': '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS ingredients_fts USING fts5(
+            name,
+            content='ingredients', content_rowid='id'
+        )
+    ''',
+}
+
+# Триггеры, поддерживающие индексы; триггеры изменения срабатывают только
+# на индексируемые столбцы. Сжатая инструкция заменяется в индексе на NULL,
+# пока приложение не запишет ее текст.
+SEARCH_TRIGGERS = {
+    'recipes_fts_ai': f'''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN
+            INSERT INTO recipes_fts (rowid, name, category, instructions)
+            VALUES (new.id, new.name, new.category, (
+                SELECT data FROM recipe_texts
+                WHERE recipe_id = new.id AND field = '{texts.INSTRUCTIONS}' AND codec = '{texts.PLAIN}'
+            ));
+        END
+    ''',
+    'recipes_fts_ad': '''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN
+            DELETE FROM recipes_fts WHERE rowid = old.id;
+        END
+    ''',
+    'recipes_fts_au': '''
+        CREATE TRIGGER IF NOT EXISTS recipes_fts_au AFTER UPDATE OF name, category ON recipes BEGIN
+            UPDATE recipes_fts SET name = new.name, category = new.category WHERE rowid = new.id;
+        END
+    ''',
+    'recipe_texts_fts_ai': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_texts_fts_ai AFTER INSERT ON recipe_texts
+        WHEN new.field = '{texts.INSTRUCTIONS}' BEGIN
+            UPDATE recipes_fts SET instructions = CASE WHEN new.codec = '{texts.PLAIN}' THEN new.data END
+            WHERE rowid = new.recipe_id;
+        END
+    ''',
+    'recipe_texts_fts_au': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_texts_fts_au AFTER UPDATE OF codec, data ON recipe_texts
+        WHEN new.field = '{texts.INSTRUCTIONS}' BEGIN
+            UPDATE recipes_fts SET instructions = CASE WHEN new.codec = '{texts.PLAIN}' THEN new.data END
+            WHERE rowid = new.recipe_id;
+        END
+    ''',
+    'recipe_texts_fts_ad': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_texts_fts_ad AFTER DELETE ON recipe_texts
+        WHEN old.field = '{texts.INSTRUCTIONS}' BEGIN
+            UPDATE recipes_fts SET instructions = NULL WHERE rowid = old.recipe_id;
+        END
+    ''',
+    'ingredients_fts_ai': '''
+        CREATE TRIGGER IF NOT EXISTS ingredients_fts_ai AFTER INSERT ON ingredients BEGIN
+            INSERT INTO ingredients_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''',
+    'ingredients_fts_ad': '''
+        CREATE TRIGGER IF NOT EXISTS ingredients_fts_ad AFTER DELETE ON ingredients BEGIN
+            INSERT INTO ingredients_fts (ingredients_fts, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END
+    ''',
+    'ingredients_fts_au': '''
+        CREATE TRIGGER IF NOT EXISTS ingredients_fts_au AFTER UPDATE OF name ON ingredients BEGIN
+            INSERT INTO ingredients_fts (ingredients_fts, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO ingredients_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    ''',
+}
+
+RECIPE_ROWS = '''
+    SELECT r.id, r.name, r.category, t.codec, t.data
+    FROM recipes r
+    LEFT JOIN recipe_texts t ON t.recipe_id = r.id AND t.field = 'instructions'
+'''
+
+INSERT_RECIPE_ROW = 'INSERT INTO recipes_fts (rowid, name, category, instructions) VALUES (?, ?, ?, ?)'
+
+# Веса столбцов recipes_fts для bm25: name, category, instructions
+NAME_WEIGHTS = (10.0, 2.0, 1.0)
+
+SEARCH_BY_NAME_FTS = '''
+    SELECT r.id, r.name, r.category, r.cooking_time, r.difficulty
+    FROM recipes_fts f
+    JOIN recipes r ON r.id = f.rowid
+    WHERE recipes_fts MATCH ?
+    ORDER BY bm25(recipes_fts, ?, ?, ?), r.name
+'''
+
+SEARCH_BY_CATEGORY_FTS = '''
+    SELECT r.id, r.name, r.category, r.cooking_time, r.difficulty
+    FROM recipes_fts f
+    JOIN recipes r ON r.id = f.rowid
+    WHERE recipes_fts MATCH ?
+    ORDER BY f.rank, r.name
+'''
+
+SEARCH_BY_INGREDIENT_FTS = '''
+    SELECT r.id, r.name, r.category, r.cooking_time, r.difficulty
+    FROM (
+        SELECT i.recipe_id, MIN(f.rank) AS rank
+        FROM ingredients_fts f
+        JOIN ingredients i ON i.id = f.rowid
+        WHERE ingredients_fts MATCH ?
+        GROUP BY i.recipe_id
+    ) m
+    JOIN recipes r ON r.id = m.recipe_id
+    ORDER BY m.rank, r.name
+'''
+
+# Запросы без индекса: для баз, созданных до появления FTS5
+SEARCH_BY_NAME_LIKE = '''
+    SELECT id, name, category, cooking_time, difficulty
+    FROM recipes
+    WHERE name LIKE ?
+    ORDER BY name
+'''
+
+SEARCH_BY_CATEGORY_LIKE = '''
+    SELECT id, name, category, cooking_time, difficulty
+    FROM recipes
+    WHERE category LIKE ?
+    ORDER BY name
+'''
+
+SEARCH_BY_INGREDIENT_LIKE = '''
+    SELECT DISTINCT r.id, r.name, r.category, r.cooking_time, r.difficulty
+    FROM recipes r
+    JOIN ingredients i ON r.id = i.recipe_id
+    WHERE i.name LIKE ?
+    ORDER BY r.name
+'''
+
+
+def has_search_index(conn):
+    """Проверка наличия таблиц полнотекстового индекса"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        tuple(SEARCH_TABLES),
+    )
+    return cursor.fetchone()[0] == len(SEARCH_TABLES)
+
+
+def ensure_search_index(conn):
+    """Создание индекса и триггеров; заполнение индекса для существующих данных"""
+    existed = has_search_index(conn)
+    for ddl in SEARCH_TABLES.values():
+        conn.execute(ddl)
+    for ddl in SEARCH_TRIGGERS.values():
+        conn.execute(ddl)
+    if not existed:
+        rebuild_search_index(conn)
+
+
+def _recipe_rows(cursor):
+    """Строки индекса рецептов; инструкция распаковывается здесь, а не в SQL"""
+    for recipe_id, name, category, codec, data in cursor:
+        yield recipe_id, name, category, texts.unpack_text(codec, data)
+
+
+def rebuild_recipes_fts(conn):
+    """Полное перестроение индекса рецептов"""
+    conn.execute('DELETE FROM recipes_fts')
+    conn.executemany(INSERT_RECIPE_ROW, _recipe_rows(conn.execute(RECIPE_ROWS)))
+
+
+def rebuild_search_index(conn):
+    """Полное перестроение индекса по содержимому таблиц"""
+    rebuild_recipes_fts(conn)
+    conn.execute("INSERT INTO ingredients_fts (ingredients_fts) VALUES ('rebuild')")
+
+
+def index_recipes(conn, recipe_ids):
+    """Запись в индекс сжатых инструкций рецептов (остальное записывают триггеры)"""
+    cursor = conn.execute(f'''
+        SELECT recipe_id, codec, data FROM recipe_texts
+        WHERE field = '{texts.INSTRUCTIONS}' AND codec != '{texts.PLAIN}'
+          AND recipe_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(sorted(recipe_ids)),))
+    conn.executemany('UPDATE recipes_fts SET instructions = ? WHERE rowid = ?',
+                     [(texts.unpack_text(codec, data), recipe_id) for recipe_id, codec, data in cursor.fetchall()])
+
+
+def match_query(search_term, column=None):
+    """Построение выражения MATCH: все слова запроса как префиксы"""
+    words = re.findall(r'\w+', search_term)
+    if not words:
+        return None
+    query = ' '.join(f'"{word}"*' for word in words)
+    if column:
+        query = f'{column} : ({query})'
+    return query
+
+
+def search_by_name(conn, search_term):
+    """Рецепты по названию (и тексту инструкции), сначала самые релевантные"""
+    query = match_query(search_term, '{name instructions}')
+    if query is None or not has_search_index(conn):
+        return conn.execute(SEARCH_BY_NAME_LIKE, (f'%{search_term}%',)).fetchall()
+    return conn.execute(SEARCH_BY_NAME_FTS, (query,) + NAME_WEIGHTS).fetchall()
+
+
+def search_by_category(conn, search_term):
+    """Рецепты по категории"""
+    query = match_query(search_term, 'category')
+    if query is None or not has_search_index(conn):
+        return conn.execute(SEARCH_BY_CATEGORY_LIKE, (f'%{search_term}%',)).fetchall()
+    return conn.execute(SEARCH_BY_CATEGORY_FTS, (query,)).fetchall()
+
+
+def search_by_ingredient(conn, search_term):
+    """Рецепты, содержащие ингредиент"""
+    query = match_query(search_term)
+    if query is None or not has_search_index(conn):
+        return conn.execute(SEARCH_BY_INGREDIENT_LIKE, (f'%{search_term}%',)).fetchall()
+    return conn.execute(SEARCH_BY_INGREDIENT_FTS, (query,)).fetchall()
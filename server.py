@@ -0,0 +1,367 @@
+"""HTTP/JSON API только для чтения поверх базы рецептов
+
+Запуск:
+    python server.py --db recipes.db --port 8080
+
+Маршруты:
+    GET /recipes?limit=20&after_name=...&after_id=...
+    GET /recipes/<id>
+    GET /search?name=... | ?category=... | ?ingredient=... | ?ingredients=а,б|в,-г | ?fuzzy=...
+    GET /search?max_time=30[&min_time=10&limit=...]
+    GET /shopping-list?ids=2,3
+    GET /similar?id=42[&limit=10]
+    GET /facets?category=...&category=...&difficulty=...&time=0-15&ingredients=...&limit=...
+    GET /categories
+    GET /statistics
+    GET /metrics[?reset=1]  (замеры запросов, если включены, см. metrics.py)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import db
+import facets
+from listing import DEFAULT_PAGE_SIZE
+import metrics
+from shards import open_repository
+
+DEFAULT_WORKERS = 8
+MAX_PAGE_SIZE = 500
+MAX_HEADER_LINES = 100
+
+
+class HTTPError(Exception):
+    """Ошибка запроса с HTTP-статусом"""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+
+
+def _single(query, name, default=None):
+    """Одиночный параметр строки запроса"""
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def _int_param(query, name, default=None, minimum=None, maximum=None):
+    """Целочисленный параметр строки запроса с проверкой границ"""
+    value = _single(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"параметр {name} должен быть целым числом") from None
+    if minimum is not None and number < minimum or maximum is not None and number > maximum:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"параметр {name} вне допустимого диапазона")
+    return number
+
+
+class RecipeAPI:
+    """Маршрутизация запросов к методам RecipeRepository"""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def route(self, path, query):
+        """Обработчик (вызывается в потоке пула) для пути запроса"""
+        parts = [part for part in path.split('/') if part]
+        if parts == ['recipes']:
+            return lambda: self.list_recipes(query)
+        if len(parts) == 2 and parts[0] == 'recipes':
+            if not parts[1].isdigit():
+                raise HTTPError(HTTPStatus.NOT_FOUND)
+            return lambda: self.recipe(int(parts[1]))
+        if parts == ['search']:
+            return lambda: self.search(query)
+        if parts == ['facets']:
+            return lambda: self.faceted_search(query)
+        if parts == ['shopping-list']:
+            return lambda: self.shopping_list(query)
+        if parts == ['similar']:
+            return lambda: self.similar(query)
+        if parts == ['categories']:
+            return lambda: {'categories': self.repository.categories()}
+        if parts == ['statistics']:
+            return self.statistics
+        if parts == ['metrics']:
+            return lambda: self.metrics(query)
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    def list_recipes(self, query):
+        limit = _int_param(query, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        after_name = _single(query, 'after_name')
+        after_id = _int_param(query, 'after_id')
+        after = None
+        if after_name is not None and after_id is not None:
+            after = (after_name, after_id)
+        recipes = self.repository.list_recipes(after, limit)
+        result = {'recipes': [recipe.as_dict() for recipe in recipes], 'next': None}
+        if len(recipes) == limit:
+            last = recipes[-1]
+            result['next'] = {'after_name': last.name, 'after_id': last.id}
+        return result
+
+    def recipe(self, recipe_id):
+        recipe = self.repository.get_recipe(recipe_id)
+        if recipe is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "рецепт не найден")
+        return recipe.as_dict()
+
+    def search(self, query):
+        for field in ('name', 'category', 'ingredient'):
+            term = _single(query, field)
+            if term is not None:
+                if not term.strip():
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "пустой поисковый запрос")
+                recipes = getattr(self.repository, f'search_by_{field}')(term)
+                return {'recipes': [recipe.as_dict() for recipe in recipes]}
+        term = _single(query, 'ingredients')
+        if term is not None:
+            recipes = self.repository.search_by_ingredients(term)
+            if recipes is None:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "индекс ингредиентов не создан")
+            return {'recipes': [recipe.as_dict() for recipe in recipes]}
+        term = _single(query, 'fuzzy')
+        if term is not None:
+            matches = self.repository.fuzzy_search(term, _int_param(query, 'limit', 10, 1, 100))
+            if matches is None:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "индекс триграмм не создан")
+            return {'recipes': [dict(recipe.as_dict(), similarity=score) for recipe, score in matches]}
+        max_time = _int_param(query, 'max_time', minimum=0)
+        if max_time is not None:
+            recipes = self.repository.recipes_by_cooking_time(
+                max_time, _int_param(query, 'min_time', 0, 0), _int_param(query, 'limit', None, 1, MAX_PAGE_SIZE))
+            return {'recipes': [recipe.as_dict() for recipe in recipes]}
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "укажите name, category, ingredient, ingredients, fuzzy или max_time")
+
+    def faceted_search(self, query):
+        filters = {facet: query.get(facet, []) for facet in facets.FACETS}
+        result = self.repository.faceted_search(
+            filters, _single(query, 'ingredients'), _int_param(query, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE))
+        if result is None:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "индекс ингредиентов не создан")
+        recipes, total, counts = result
+        return {
+            'recipes': [recipe.as_dict() for recipe in recipes],
+            'total': total,
+            'facets': {facet: [{'value': value, 'count': count} for value, count in values]
+                       for facet, values in counts.items()},
+        }
+
+    def shopping_list(self, query):
+        ids = [item for item in (_single(query, 'ids') or '').split(',') if item.strip()]
+        if not ids or not all(item.strip().isdigit() for item in ids):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "параметр ids - список id рецептов через запятую")
+        shopping_list = self.repository.shopping_list(int(item) for item in ids)
+        if shopping_list is None:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "база данных не обновлена")
+        totals, unparsed = shopping_list
+        return {
+            'items': [{'name': name, 'unit': base_unit, 'amount': amount} for name, base_unit, amount in totals],
+            'other': [{'name': name, 'quantity': quantity, 'unit': unit} for name, quantity, unit in unparsed],
+        }
+
+    def similar(self, query):
+        recipe_id = _int_param(query, 'id')
+        if recipe_id is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "параметр id - id рецепта")
+        matches = self.repository.similar_recipes(recipe_id, _int_param(query, 'limit', 10, 1, 100))
+        if matches is None:
+            if self.repository.get_recipe(recipe_id) is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "рецепт не найден")
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "индекс ингредиентов не создан")
+        return {'recipes': [dict(recipe.as_dict(), similarity=score) for recipe, score in matches]}
+
+    def statistics(self):
+        summary = dict(self.repository.statistics())
+        if summary['fastest_recipe']:
+            name, time = summary['fastest_recipe']
+            summary['fastest_recipe'] = {'name': name, 'cooking_time': time}
+        details = self.repository.statistics_details()
+        if details is not None:
+            summary['categories'] = dict(details['categories'])
+            summary['difficulties'] = dict(details['difficulties'])
+            summary['cooking_time_percentiles'] = details['cooking_time_percentiles']
+        return summary
+
+    def metrics(self, query):
+        snapshot = metrics.snapshot()
+        if _single(query, 'reset') == '1':
+            metrics.reset()
+        return snapshot
+
+
+class RecipeServer:
+    """Асинхронный HTTP-сервер; запросы к базе выполняются в ограниченном пуле потоков"""
+
+    def __init__(self, db_name='recipes.db', host='127.0.0.1', port=8080, workers=DEFAULT_WORKERS,
+                 mode=db.READ_ONLY):
+        self.host = host
+        self.port = port
+        # Каждый поток пула получает свое соединение только для чтения (или снимок)
+        self.repository = open_repository(db_name, mode)
+        self.api = RecipeAPI(self.repository)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recipes-db')
+        self.server = None
+
+    async def start(self):
+        """Запуск прослушивания; port=0 выбирает свободный порт"""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        """Остановка пула и закрытие соединений с базой"""
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=True)
+        self.repository.close()
+
+    async def handle_connection(self, reader, writer):
+        """Обработка запросов одного клиента (с поддержкой keep-alive)"""
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers = request
+                status, body = await self.dispatch(method, target)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.write_response(writer, status, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """Строка запроса и заголовки; None, если клиент закрыл соединение"""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise ConnectionError("некорректная строка запроса") from None
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        # Тело запросов не используется, но его нужно вычитать
+        length = int(headers.get('content-length') or 0)
+        if length:
+            await reader.readexactly(length)
+        return method, target, headers
+
+    async def dispatch(self, method, target):
+        """Выполнение запроса; возвращает (статус, объект для JSON)"""
+        try:
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            url = urlsplit(target)
+            handler = self.api.route(url.path, parse_qs(url.query))
+            loop = asyncio.get_running_loop()
+            return HTTPStatus.OK, await loop.run_in_executor(self.executor, handler)
+        except HTTPError as e:
+            return e.status, {'error': e.message}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    def write_response(self, writer, status, body, keep_alive):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        head = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            f'\r\n'
+        )
+        writer.write(head.encode('latin-1') + payload)
+
+
+class BackgroundServer:
+    """Сервер в отдельном потоке: для локальной проверки обычным HTTP-клиентом"""
+
+    def __init__(self, db_name='recipes.db', host='127.0.0.1', port=0, workers=DEFAULT_WORKERS,
+                 mode=db.READ_ONLY):
+        self.server = RecipeServer(db_name, host, port, workers, mode)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://{self.server.host}:{self.server.port}'
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API для просмотра рецептов")
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="размер пула потоков с соединениями к базе")
+    parser.add_argument('--mode', choices=(db.READ_ONLY, db.SNAPSHOT, db.MEMORY), default=db.READ_ONLY,
+                        help="ro - обычное чтение, snapshot - неизменяемый снимок с mmap, "
+                             "memory - копия базы в памяти")
+    parser.add_argument('--slow-query-ms', type=float,
+                        help="включить замеры запросов и журнал запросов медленнее порога")
+    args = parser.parse_args(argv)
+
+    if args.slow_query_ms is not None and not metrics.is_enabled():
+        metrics.enable(args.slow_query_ms)
+        logging.basicConfig(format='%(asctime)s %(message)s')
+        metrics.install_signal_handlers()
+
+    server = RecipeServer(args.db, args.host, args.port, args.workers, args.mode)
+
+    async def run():
+        await server.start()
+        print(f"Сервер запущен: http://{server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nСервер остановлен")
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+"""Каталог рецептов, разделенный на несколько файлов SQLite (шардов)
+
+Рецепт с id хранится в шарде id % N, поэтому чтение одного рецепта обращается
+ровно к одному файлу. Новые рецепты распределяются по id (по кругу) или по
+категории; запросы списков, поиска и статистики выполняются во всех шардах
+параллельно, а результаты сливаются в общем порядке.
+
+Примеры:
+    python shards.py init --db recipes.db --shards 4 --partition category --source old.db
+    python shards.py show --db recipes.db
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import bulk
+from db import READ_WRITE
+import facets
+from ingredient_index import normalize_name
+from listing import DEFAULT_PAGE_SIZE, PAGE_BEFORE, RecipePager
+from repository import Ingredient, Recipe, RecipeBatch, RecipeRepository, RecipeSummary
+import stats
+
+PARTITIONS = ('id', 'category')
+DEFAULT_SHARDS = 4
+
+
+def _summary_key(recipe):
+    """Порядок записей в списках: как ORDER BY name, id"""
+    return recipe.name, recipe.id
+
+
+def _row_key(row):
+    """Тот же порядок для строк (id, name, ...)"""
+    return row[1], row[0]
+
+
+def manifest_path(db_name):
+    """Файл описания шардов: recipes.db -> recipes.shards.json"""
+    return os.path.splitext(db_name)[0] + '.shards.json'
+
+
+def shard_path(db_name, number):
+    """Файл шарда: recipes.db -> recipes.shard0.db"""
+    root, ext = os.path.splitext(db_name)
+    return f'{root}.shard{number}{ext or ".db"}'
+
+
+def is_sharded(db_name):
+    return os.path.exists(manifest_path(db_name))
+
+
+def create_layout(db_name, count=DEFAULT_SHARDS, partition='id'):
+    """Создание описания и пустых шардов с актуальной схемой"""
+    if partition not in PARTITIONS:
+        raise ValueError(f"неизвестный способ разделения: {partition}")
+    if is_sharded(db_name):
+        raise FileExistsError(manifest_path(db_name))
+    with open(manifest_path(db_name), 'w', encoding='utf-8') as f:
+        json.dump({'shards': count, 'partition': partition}, f)
+    repository = ShardedRepository(db_name)
+    repository.migrate()
+    return repository
+
+
+def open_repository(db_name='recipes.db', mode=READ_WRITE):
+    """Репозиторий базы: разделенной на шарды, если для нее есть описание, иначе обычный"""
+    if is_sharded(db_name):
+        return ShardedRepository(db_name, mode)
+    return RecipeRepository(db_name, mode)
+
+
+class ShardedPager(RecipePager):
+    """Постраничный список по всем шардам: каждая страница сливается из страниц шардов"""
+
+    def __init__(self, repository, page_size=DEFAULT_PAGE_SIZE):
+        super().__init__(None, page_size, RecipeSummary.from_row)
+        self.repository = repository
+
+    def _fetch(self, sql, params):
+        limit = self.page_size + 1
+        pages = self.repository.gather(
+            lambda shard: shard.connection().execute(sql, params + (limit,)).fetchall())
+        # Запрос предыдущей страницы возвращает строки в обратном порядке
+        merged = heapq.merge(*pages, key=_row_key, reverse=sql is PAGE_BEFORE)
+        rows = list(islice(merged, limit))
+        return rows[:self.page_size], len(rows) > self.page_size
+
+
+class ShardedRepository:
+    """Тот же интерфейс, что у RecipeRepository, поверх N файлов-шардов"""
+
+    def __init__(self, db_name='recipes.db', mode=READ_WRITE, workers=None):
+        with open(manifest_path(db_name), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.db_name = db_name
+        self.partition = manifest['partition']
+        count = manifest['shards']
+        self.shards = [
+            RecipeRepository(shard_path(db_name, number), mode, id_stride=count, id_offset=number)
+            for number in range(count)
+        ]
+        # SQLite отпускает GIL на время запроса, поэтому шарды читаются параллельно в потоках
+        self.executor = ThreadPoolExecutor(max_workers=workers or count,
+                                           thread_name_prefix='recipes-shard')
+
+    def gather(self, operation):
+        """Результаты operation(шард) для всех шардов по порядку"""
+        return list(self.executor.map(operation, self.shards))
+
+    def shard_for(self, recipe_id):
+        """Шард, в котором хранится рецепт"""
+        return self.shards[recipe_id % len(self.shards)]
+
+    def files(self):
+        return [manifest_path(self.db_name)] + [path for shard in self.shards for path in shard.files()]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self.executor.shutdown(wait=True)
+
+    def migrate(self):
+        return min(self.gather(lambda shard: shard.migrate()))
+
+    # Чтение
+
+    def _merged(self, operation, key=_summary_key, limit=None, reverse=False):
+        """Слияние упорядоченных по key результатов всех шардов"""
+        merged = heapq.merge(*self.gather(operation), key=key, reverse=reverse)
+        return list(islice(merged, limit))
+
+    def pager(self, page_size=DEFAULT_PAGE_SIZE):
+        return ShardedPager(self, page_size)
+
+    def list_recipes(self, after=None, limit=DEFAULT_PAGE_SIZE):
+        return self._merged(lambda shard: shard.list_recipes(after, limit), limit=limit)
+
+    # Оценки релевантности разных шардов несравнимы: результаты поиска упорядочены по названию
+
+    def search_by_name(self, search_term):
+        return self._merged(lambda shard: sorted(shard.search_by_name(search_term), key=_summary_key))
+
+    def search_by_category(self, search_term):
+        return self._merged(lambda shard: sorted(shard.search_by_category(search_term), key=_summary_key))
+
+    def search_by_ingredient(self, search_term):
+        return self._merged(lambda shard: sorted(shard.search_by_ingredient(search_term), key=_summary_key))
+
+    def search_by_ingredients(self, query):
+        results = self.gather(lambda shard: shard.search_by_ingredients(query))
+        if None in results:
+            return None
+        return list(heapq.merge(*results, key=_summary_key))
+
+    def search_by_pantry(self, items, min_matches=1):
+        results = self.gather(lambda shard: shard.search_by_pantry(items, min_matches))
+        if None in results:
+            return None
+        return list(heapq.merge(*results, key=lambda item: (-item[1], item[2] - item[1], item[0].id)))
+
+    def fuzzy_search(self, search_term, limit=10):
+        results = self.gather(lambda shard: shard.fuzzy_search(search_term, limit))
+        if None in results:
+            return None
+        return list(islice(heapq.merge(*results, key=lambda item: -item[1]), limit))
+
+    def similar_ingredients(self, search_term, limit=10):
+        results = self.gather(lambda shard: shard.similar_ingredients(search_term, limit))
+        if None in results:
+            return None
+        names = {}
+        for name, score in heapq.merge(*results, key=lambda item: -item[1]):
+            names.setdefault(name, score)
+        return list(names.items())[:limit]
+
+    def recipes_by_cooking_time(self, max_minutes, min_minutes=0, limit=None):
+        return self._merged(lambda shard: shard.recipes_by_cooking_time(max_minutes, min_minutes, limit),
+                            key=lambda recipe: (recipe.cooking_time, recipe.name), limit=limit)
+
+    def shopping_list(self, recipe_ids):
+        """Список покупок: суммы шардов складываются по названию и базовой единице"""
+        per_shard = [[] for _ in self.shards]
+        for recipe_id in recipe_ids:
+            per_shard[recipe_id % len(self.shards)].append(recipe_id)
+        results = list(self.executor.map(lambda shard, ids: shard.shopping_list(ids), self.shards, per_shard))
+        if None in results:
+            return None
+        totals, names = {}, {}
+        for shard_totals, _ in results:
+            for name, base_unit, amount in shard_totals:
+                key = normalize_name(name), base_unit
+                names[key] = min(names.get(key, name), name)
+                totals[key] = totals.get(key, 0) + amount
+        unparsed = sorted((item for _, shard_unparsed in results for item in shard_unparsed),
+                          key=lambda item: normalize_name(item[0]))
+        return [(names[key], key[1], totals[key]) for key in sorted(totals)], unparsed
+
+    def faceted_search(self, filters=None, ingredients=None, limit=DEFAULT_PAGE_SIZE):
+        """Фасетный поиск: найденные и счетчики шардов складываются"""
+        results = self.gather(lambda shard: shard.faceted_search(filters, ingredients, limit))
+        if None in results:
+            return None
+        recipes = list(islice(heapq.merge(*(result[0] for result in results), key=_summary_key), limit))
+        return (recipes, sum(result[1] for result in results),
+                facets.merge_counts([result[2] for result in results]))
+
+    def similar_recipes(self, recipe_id, limit=10):
+        """Похожие рецепты всех шардов: признаки - из шарда рецепта, лучшие - по сходству"""
+        features = self.shard_for(recipe_id).recipe_features(recipe_id)
+        if features is None:
+            return None
+        results = self.gather(lambda shard: shard.similar_to(features, limit, (recipe_id,)))
+        return list(islice(heapq.merge(*results, key=lambda item: (-item[1], item[0].id)), limit))
+
+    def similarity_memory(self):
+        return sum(shard.similarity_memory() for shard in self.shards)
+
+    def categories(self):
+        return sorted(set().union(*self.gather(lambda shard: shard.categories())))
+
+    def categories_with_recipes(self, max_per_category=None):
+        """(категория, рецепты, всего рецептов в категории) по всем шардам"""
+        per_shard = self.gather(lambda shard: {
+            category: (recipes, total)
+            for category, recipes, total in shard.categories_with_recipes(max_per_category)
+        })
+        for category in sorted(set().union(*per_shard)):
+            parts = [groups[category] for groups in per_shard if category in groups]
+            recipes = list(islice(heapq.merge(*(part[0] for part in parts), key=_summary_key),
+                                  max_per_category))
+            yield category, recipes, sum(part[1] for part in parts)
+
+    def recipe_names(self):
+        return self._merged(lambda shard: shard.recipe_names(), key=lambda row: (row[1], row[0]))
+
+    def recipe_name(self, recipe_id):
+        return self.shard_for(recipe_id).recipe_name(recipe_id)
+
+    def instructions(self, recipe_id):
+        return self.shard_for(recipe_id).instructions(recipe_id)
+
+    def load_recipe(self, recipe_id):
+        return self.shard_for(recipe_id).load_recipe(recipe_id)
+
+    def get_recipe(self, recipe_id):
+        return self.shard_for(recipe_id).get_recipe(recipe_id)
+
+    def statistics(self):
+        """Сводка: суммы по шардам, категории без повторов, самый быстрый из всех"""
+        summaries = self.gather(lambda shard: shard.statistics())
+        fastest = [summary['fastest_recipe'] for summary in summaries if summary['fastest_recipe']]
+        return {
+            'total_recipes': sum(summary['total_recipes'] for summary in summaries),
+            'total_categories': len(self.categories()),
+            'fastest_recipe': min(fastest, key=lambda item: item[1]) if fastest else None,
+        }
+
+    def statistics_details(self):
+        """Подробная статистика: счетчики складываются, перцентили - по общей гистограмме"""
+        def read(shard):
+            if shard.statistics_details() is None:
+                return None
+            conn = shard.connection()
+            return stats.read_details(conn), stats.read_histogram(conn)
+
+        results = self.gather(read)
+        if None in results:
+            return None
+        categories, difficulties, histogram = Counter(), Counter(), Counter()
+        for details, shard_histogram in results:
+            categories.update(dict(details['categories']))
+            difficulties.update(dict(details['difficulties']))
+            histogram.update(dict(shard_histogram))
+        return {
+            'categories': sorted(categories.items(), key=lambda item: (-item[1], item[0])),
+            'difficulties': sorted(difficulties.items(), key=lambda item: (-item[1], item[0])),
+            'cooking_time_percentiles': stats.percentiles(sorted(histogram.items())),
+        }
+
+    # Запись (транзакция у каждого шарда своя: изменения разных шардов не атомарны)
+
+    def _placement(self, recipes):
+        """Номер шарда для каждого нового рецепта"""
+        if self.partition == 'category':
+            return [zlib.crc32((normalize_name(recipe.category) or '').encode('utf-8')) % len(self.shards)
+                    for recipe in recipes]
+        # По id: продолжаем общую нумерацию, рецепт с id n попадает в шард n % N
+        next_id = max(self.gather(lambda shard: bulk.next_recipe_id(shard.connection())))
+        return [(next_id + number) % len(self.shards) for number in range(len(recipes))]
+
+    def apply(self, batch):
+        """Применение RecipeBatch: изменения раскладываются по шардам и применяются параллельно"""
+        shard_batches = [RecipeBatch() for _ in self.shards]
+        placement = self._placement(batch.added)
+        for recipe, number in zip(batch.added, placement):
+            shard_batches[number].add(recipe)
+        for recipe in batch.updated:
+            shard_batches[recipe.id % len(self.shards)].update(recipe)
+        for recipe_id in batch.deleted:
+            shard_batches[recipe_id % len(self.shards)].delete(recipe_id)
+
+        pairs = [(shard, shard_batch) for shard, shard_batch in zip(self.shards, shard_batches) if shard_batch]
+        list(self.executor.map(lambda pair: pair[0].apply(pair[1]), pairs))
+
+        # id новых рецептов в порядке добавления
+        added_ids = [iter(shard_batch.added_ids) for shard_batch in shard_batches]
+        batch.added_ids = [next(added_ids[number]) for number in placement]
+        batch.updated_count = sum(shard_batch.updated_count for shard_batch in shard_batches)
+        batch.deleted_count = sum(shard_batch.deleted_count for shard_batch in shard_batches)
+        return batch
+
+    batch = RecipeRepository.batch
+    add_recipes = RecipeRepository.add_recipes
+    update_recipes = RecipeRepository.update_recipes
+    delete_recipes = RecipeRepository.delete_recipes
+    add_recipe = RecipeRepository.add_recipe
+    update_recipe = RecipeRepository.update_recipe
+    delete_recipe = RecipeRepository.delete_recipe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="База рецептов из нескольких файлов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = commands.add_parser('init', help="создать шарды (и перенести рецепты из другой базы)")
+    init_parser.add_argument('--db', default='recipes.db', help="имя базы; шарды - recipes.shardN.db")
+    init_parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    init_parser.add_argument('--partition', choices=PARTITIONS, default='id')
+    init_parser.add_argument('--source', help="обычная база, рецепты которой переносятся (с новыми id)")
+    init_parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE)
+
+    show_parser = commands.add_parser('show', help="сводка по шардам")
+    show_parser.add_argument('--db', default='recipes.db')
+    args = parser.parse_args(argv)
+
+    if args.command == 'init':
+        repository = create_layout(args.db, args.shards, args.partition)
+        if args.source:
+            source = RecipeRepository(args.source)
+            source.migrate()
+            records = bulk.iter_recipes(source.connection())
+            moved = 0
+            while True:
+                chunk = list(islice(records, args.batch_size))
+                if not chunk:
+                    break
+                repository.add_recipes(
+                    Recipe(None, *recipe[:5], created_date=recipe[5],
+                           ingredients=[Ingredient(*item) for item in items])
+                    for recipe, items in chunk
+                )
+                moved += len(chunk)
+            print(f"Перенесено рецептов: {moved}")
+        print(f"✅ Создано шардов: {args.shards} ({manifest_path(args.db)})")
+    else:
+        if not is_sharded(args.db):
+            print(f"❌ Нет описания шардов: {manifest_path(args.db)}")
+            sys.exit(1)
+        repository = ShardedRepository(args.db)
+        for number, shard in enumerate(repository.shards):
+            print(f"Шард {number} ({shard.db_name}): рецептов {shard.statistics()['total_recipes']}")
+        summary = repository.statistics()
+        print(f"Всего рецептов: {summary['total_recipes']}")
+        print(f"Всего категорий: {summary['total_categories']}")
+        print(f"Самый быстрый рецепт: {summary['fastest_recipe']}")
+    repository.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""Похожие рецепты: разреженные векторы рецепт x ингредиент в памяти
+
+Рецепт - множество признаков: нормализованные ингредиенты (из ingredient_postings)
+и категория; сходство - коэффициент Жаккара этих множеств. Кандидаты - рецепты
+хотя бы с одним общим ингредиентом: обратные списки ингредиент -> рецепты
+хранятся в array, число общих ингредиентов считается одним проходом по спискам
+(с NumPy - np.unique по их объединению и векторная оценка, без NumPy -
+Counter.update, цикл которого написан на C). Размеры рецептов и коды категорий
+лежат в плотных массивах по id рецепта.
+
+Индекс строится один раз, а после изменения базы обновляет только рецепты,
+упомянутые в журнале изменений (см. sync.py).
+
+Пример:
+    python similarity.py 42 --db recipes.db
+"""
+import argparse
+import heapq
+import json
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import sync
+
+DEFAULT_LIMIT = 10
+
+# При большем числе изменений журнала на рецепт индекса дешевле построить его заново
+REBUILD_CHANGES_PER_RECIPE = 1
+
+# Признаки рецептов: id, категория и нормализованные ингредиенты (NULL, если их нет)
+FEATURES_SQL = '''
+    SELECT r.id, r.category, n.name
+    FROM recipes r
+    LEFT JOIN ingredient_postings p ON p.recipe_id = r.id
+    LEFT JOIN ingredient_names n ON n.id = p.ingredient_id
+    {where}
+    ORDER BY r.id
+'''
+
+
+class SimilarityIndex:
+    """Обратные списки ингредиентов и признаки всех рецептов одной базы"""
+
+    def __init__(self):
+        # Номера признаков: название ингредиента -> код; категории - отдельно, 0 - без категории
+        self.vocabulary = {}
+        self.names = []
+        self.category_codes = {}
+        self.category_names = [None]
+        self.postings = {}
+        self.ingredients = {}
+        # По id рецепта: число ингредиентов и код категории
+        self.sizes = array('H')
+        self.categories = array('I')
+        # Номер последнего учтенного изменения журнала (None - журнала нет)
+        self.seq = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, conn):
+        """Индекс по всем рецептам базы"""
+        index = cls()
+        if sync.has_change_log(conn):
+            index.seq = sync.current_seq(conn)
+        index._load(conn.execute(FEATURES_SQL.format(where='')))
+        return index
+
+    def _load(self, rows):
+        for recipe_id, group in groupby(rows, itemgetter(0)):
+            group = list(group)
+            self.add(recipe_id, group[0][1], [name for _, _, name in group if name is not None])
+
+    def _grow(self, recipe_id):
+        missing = recipe_id + 1 - len(self.sizes)
+        if missing > 0:
+            self.sizes.extend(array('H', [0]) * missing)
+            self.categories.extend(array('I', [0]) * missing)
+
+    def _code(self, name):
+        code = self.vocabulary.get(name)
+        if code is None:
+            code = self.vocabulary[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def _category_code(self, category):
+        if category is None:
+            return 0
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def add(self, recipe_id, category, names):
+        """Добавление рецепта (ранее добавленный сначала удаляется)"""
+        self.remove((recipe_id,))
+        codes = array('I', sorted({self._code(name) for name in names}))
+        self.ingredients[recipe_id] = codes
+        for code in codes:
+            posting = self.postings.get(code)
+            if posting is None:
+                posting = self.postings[code] = array('q')
+            posting.append(recipe_id)
+        self._grow(recipe_id)
+        self.sizes[recipe_id] = len(codes)
+        self.categories[recipe_id] = self._category_code(category)
+
+    def remove(self, recipe_ids):
+        """Удаление рецептов; каждый затронутый обратный список перестраивается один раз
+
+        array.remove искал бы каждый рецепт проходом по списку, и обновление
+        многих рецептов с частым ингредиентом стало бы квадратичным.
+        """
+        removed = set()
+        touched = set()
+        for recipe_id in recipe_ids:
+            codes = self.ingredients.pop(recipe_id, None)
+            if codes is None:
+                continue
+            removed.add(recipe_id)
+            touched.update(codes)
+            self.sizes[recipe_id] = 0
+            self.categories[recipe_id] = 0
+        for code in touched:
+            posting = array('q', [recipe_id for recipe_id in self.postings[code] if recipe_id not in removed])
+            if posting:
+                self.postings[code] = posting
+            else:
+                del self.postings[code]
+
+    def refresh(self, conn):
+        """Учет изменений из журнала; False - журнала нет или изменений много, нужна перестройка"""
+        if self.seq is None or not sync.has_change_log(conn):
+            return False
+        latest = sync.current_seq(conn)
+        if latest == self.seq:
+            return True
+        if latest - self.seq > REBUILD_CHANGES_PER_RECIPE * len(self.ingredients):
+            return False
+        changed = sync.changes_since(conn, self.seq, latest)
+        if changed is None:
+            return False
+        # Приложение меняет ингредиенты только вместе со строкой рецепта; ингредиент,
+        # которого уже нет, не указывает на свой рецепт
+        recipe_ids = changed.get('recipes', set())
+        if changed.get('ingredients'):
+            recipe_ids |= {row[0] for row in conn.execute(
+                'SELECT recipe_id FROM ingredients WHERE id IN (SELECT value FROM json_each(?)) '
+                'AND recipe_id IS NOT NULL', (json.dumps(sorted(changed['ingredients'])),))}
+        # Данные читаются после номера журнала: более новые изменения учтутся еще раз
+        rows = conn.execute(FEATURES_SQL.format(where='WHERE r.id IN (SELECT value FROM json_each(?))'),
+                            (json.dumps(sorted(recipe_ids)),)).fetchall()
+        with self._lock:
+            self.remove(recipe_ids)
+            self._load(rows)
+            self.seq = latest
+        return True
+
+    def features(self, recipe_id):
+        """(категория, названия ингредиентов) рецепта или None"""
+        codes = self.ingredients.get(recipe_id)
+        if codes is None:
+            return None
+        return self.category_names[self.categories[recipe_id]], [self.names[code] for code in codes]
+
+    def similar(self, category, names, limit=DEFAULT_LIMIT, exclude=()):
+        """[(сходство, id рецепта)] по убыванию сходства с рецептом из category и names"""
+        with self._lock:
+            codes = [self.vocabulary[name] for name in set(names)
+                     if self.vocabulary.get(name) in self.postings]
+            if not codes:
+                return []
+            category_code = self.category_codes.get(category, 0) if category is not None else 0
+            size = len(set(names)) + (1 if category is not None else 0)
+            if numpy is not None:
+                return self._similar_numpy(codes, category_code, size, limit, exclude)
+            counts = Counter()
+            for code in codes:
+                counts.update(self.postings[code])
+            for recipe_id in exclude:
+                counts.pop(recipe_id, None)
+            sizes, categories = self.sizes, self.categories
+            scored = []
+            for recipe_id, shared in counts.items():
+                other = categories[recipe_id]
+                common = shared + (1 if category_code and other == category_code else 0)
+                scored.append((common / (size + sizes[recipe_id] + (1 if other else 0) - common), -recipe_id))
+            return [(score, -negative_id) for score, negative_id in heapq.nlargest(limit, scored)]
+
+    def _similar_numpy(self, codes, category_code, size, limit, exclude):
+        postings = [numpy.frombuffer(self.postings[code], dtype=self.postings[code].typecode) for code in codes]
+        recipe_ids, shared = numpy.unique(numpy.concatenate(postings), return_counts=True)
+        if exclude:
+            keep = ~numpy.isin(recipe_ids, numpy.fromiter(exclude, dtype=recipe_ids.dtype))
+            recipe_ids, shared = recipe_ids[keep], shared[keep]
+        sizes = numpy.frombuffer(self.sizes, dtype=self.sizes.typecode)[recipe_ids]
+        categories = numpy.frombuffer(self.categories, dtype=self.categories.typecode)[recipe_ids]
+        common = shared + ((categories == category_code) & (category_code != 0))
+        scores = common / (size + sizes + (categories != 0) - common)
+        order = numpy.lexsort((recipe_ids, -scores))[:limit]
+        return [(float(scores[i]), int(recipe_ids[i])) for i in order]
+
+    def memory_usage(self):
+        """Память, занятая индексом, байт (массивы, словари и названия ингредиентов)"""
+        total = sum(sys.getsizeof(item) for item in (
+            self.vocabulary, self.names, self.category_codes, self.category_names,
+            self.postings, self.ingredients, self.sizes, self.categories))
+        total += sum(sys.getsizeof(name) for name in self.names)
+        total += sum(sys.getsizeof(category) for category in self.category_codes)
+        total += sum(sys.getsizeof(posting) for posting in self.postings.values())
+        total += sum(sys.getsizeof(codes) for codes in self.ingredients.values())
+        return total
+
+    def describe(self):
+        """Сводка для вывода: рецептов, ингредиентов, связей, байт"""
+        return {
+            'recipes': len(self.ingredients),
+            'ingredients': len(self.postings),
+            'postings': sum(len(posting) for posting in self.postings.values()),
+            'memory_bytes': self.memory_usage(),
+            'backend': 'numpy' if numpy is not None else 'array',
+        }
+
+
+def main(argv=None):
+    from db import get_manager
+    from ingredient_index import has_ingredient_index
+
+    parser = argparse.ArgumentParser(description="Похожие рецепты по ингредиентам и категории")
+    parser.add_argument('recipe_id', type=int)
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args(argv)
+
+    conn = get_manager(args.db).connection()
+    if not has_ingredient_index(conn):
+        print("❌ Нет индекса ингредиентов: обновите схему базы", file=sys.stderr)
+        sys.exit(1)
+    started = time.perf_counter()
+    index = SimilarityIndex.build(conn)
+    built = time.perf_counter() - started
+    summary = index.describe()
+    print(f"Индекс: рецептов {summary['recipes']}, ингредиентов {summary['ingredients']}, "
+          f"связей {summary['postings']}, {summary['memory_bytes'] / 1024 / 1024:.1f} МБ, "
+          f"построен за {built * 1000:.0f} мс ({summary['backend']})")
+
+    features = index.features(args.recipe_id)
+    if features is None:
+        print("❌ Рецепт не найден", file=sys.stderr)
+        sys.exit(1)
+    started = time.perf_counter()
+    matches = index.similar(*features, args.limit, exclude=(args.recipe_id,))
+    print(f"Похожие рецепты ({(time.perf_counter() - started) * 1000:.1f} мс):")
+    for score, recipe_id in matches:
+        print(f"  {recipe_id}: {score:.0%}")
+
+
+if __name__ == '__main__':
+    main()
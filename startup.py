@@ -0,0 +1,107 @@
+"""Быстрый запуск просмотра рецептов (user.py --fast-start)
+
+Приветственный экран рисуется из сводки, которую сохранил предыдущий сеанс
+(recipes.summary.json рядом с базой), если с тех пор не изменился ни один файл
+базы. Слой данных импортируется, подключается к базе и читает статистику и
+категории в фоновом потоке, пока пользователь читает первый экран. Модуль
+импортирует только легкие модули стандартной библиотеки.
+"""
+import json
+import os
+import sys
+import threading
+
+# Очистка экрана и прокрутки ANSI-последовательностями вместо запуска clear/cls
+CLEAR_SCREEN = '\033[H\033[2J\033[3J'
+
+
+def clear_screen():
+    """Очистка экрана терминала без запуска внешней команды"""
+    if os.name == 'nt' and not getattr(clear_screen, 'enabled', False):
+        # Консоль Windows понимает ANSI-последовательности после первого вызова system
+        os.system('')
+        clear_screen.enabled = True
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
+
+
+def summary_path(db_name):
+    """Файл сводки: recipes.db -> recipes.summary.json"""
+    return os.path.splitext(db_name)[0] + '.summary.json'
+
+
+def files_signature(paths):
+    """{файл: [размер, время изменения]} для файлов базы и их WAL-журналов"""
+    signature = {}
+    for path in paths:
+        for name in (path, path + '-wal'):
+            try:
+                stat = os.stat(name)
+            except FileNotFoundError:
+                signature[name] = None
+            else:
+                signature[name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def read_summary(db_name):
+    """Сохраненная статистика, если файлы базы с тех пор не менялись; иначе None"""
+    try:
+        with open(summary_path(db_name), encoding='utf-8') as f:
+            data = json.load(f)
+        if data['files'] != files_signature(data['paths']):
+            return None
+        return data['statistics']
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+
+def write_summary(db_name, paths, signature, statistics):
+    """Сохранение статистики для следующего запуска; ошибки записи не мешают работе
+
+    signature - files_signature(paths), снятая до чтения статистики: если база
+    изменится во время чтения, сохраненная сводка просто не совпадет в следующий раз.
+    """
+    path = summary_path(db_name)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'paths': list(paths), 'files': signature, 'statistics': statistics}, f,
+                      ensure_ascii=False)
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+class Background:
+    """Результат функции, которая выполняется в фоновом потоке (или сразу, если in_thread=False)"""
+
+    def __init__(self, function, *args, in_thread=True):
+        self._value = None
+        self._error = None
+        self._thread = None
+        if in_thread:
+            self._thread = threading.Thread(target=self._run, args=(function,) + args, daemon=True)
+            self._thread.start()
+        else:
+            self._run(function, *args)
+
+    def _run(self, function, *args):
+        try:
+            self._value = function(*args)
+        except BaseException as e:
+            self._error = e
+
+    def done(self):
+        return self._thread is None or not self._thread.is_alive()
+
+    def result(self):
+        """Ожидание результата; исключение фонового потока поднимается здесь"""
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,280 @@
+"""Статистика по рецептам, поддерживаемая триггерами
+
+Примеры:
+    python stats.py show
+    python stats.py check
+    python stats.py rebuild --db recipes.db
+"""
+import argparse
+import sys
+
+STATS_TABLES = {
+    'recipe_stats': '''
+        CREATE TABLE IF NOT EXISTS recipe_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_recipes INTEGER NOT NULL DEFAULT 0,
+            total_categories INTEGER NOT NULL DEFAULT 0,
+            fastest_id INTEGER,
+            fastest_name TEXT,
+            fastest_time
+        )
+    ''',
+    'category_stats': '''
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            recipe_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''',
+    'difficulty_stats': '''
+        CREATE TABLE IF NOT EXISTS difficulty_stats (
+            difficulty TEXT PRIMARY KEY,
+            recipe_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''',
+    'cooking_time_stats': '''
+        CREATE TABLE IF NOT EXISTS cooking_time_stats (
+            cooking_time INTEGER PRIMARY KEY,
+            recipe_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+}
+
+
+def _add_recipe_sql(row):
+    """Учет рецепта row (new/old) во всех агрегатах"""
+    return f'''
+            UPDATE recipe_stats SET total_recipes = total_recipes + 1 WHERE id = 1;
+            INSERT OR IGNORE INTO category_stats (category) SELECT {row}.category WHERE {row}.category IS NOT NULL;
+            UPDATE category_stats SET recipe_count = recipe_count + 1 WHERE category = {row}.category;
+            INSERT OR IGNORE INTO difficulty_stats (difficulty) SELECT {row}.difficulty WHERE {row}.difficulty IS NOT NULL;
+            UPDATE difficulty_stats SET recipe_count = recipe_count + 1 WHERE difficulty = {row}.difficulty;
+            INSERT OR IGNORE INTO cooking_time_stats (cooking_time)
+                SELECT {row}.cooking_time WHERE typeof({row}.cooking_time) = 'integer';
+            UPDATE cooking_time_stats SET recipe_count = recipe_count + 1
+                WHERE cooking_time = {row}.cooking_time AND typeof({row}.cooking_time) = 'integer';
+            UPDATE recipe_stats
+                SET fastest_id = {row}.id, fastest_name = {row}.name, fastest_time = {row}.cooking_time
+                WHERE id = 1 AND {row}.cooking_time IS NOT NULL
+                  AND (fastest_time IS NULL OR {row}.cooking_time < fastest_time);
+    '''
+
+
+def _remove_recipe_sql(row):
+    """Исключение рецепта row (new/old) из всех агрегатов"""
+    return f'''
+            UPDATE recipe_stats SET total_recipes = total_recipes - 1 WHERE id = 1;
+            UPDATE category_stats SET recipe_count = recipe_count - 1 WHERE category = {row}.category;
+            DELETE FROM category_stats WHERE category = {row}.category AND recipe_count <= 0;
+            UPDATE difficulty_stats SET recipe_count = recipe_count - 1 WHERE difficulty = {row}.difficulty;
+            DELETE FROM difficulty_stats WHERE difficulty = {row}.difficulty AND recipe_count <= 0;
+            UPDATE cooking_time_stats SET recipe_count = recipe_count - 1
+                WHERE cooking_time = {row}.cooking_time AND typeof({row}.cooking_time) = 'integer';
+            DELETE FROM cooking_time_stats WHERE cooking_time = {row}.cooking_time AND recipe_count <= 0;
+            UPDATE recipe_stats
+                SET (fastest_id, fastest_name, fastest_time) = (
+                    SELECT id, name, cooking_time FROM recipes
+                    WHERE cooking_time IS NOT NULL ORDER BY cooking_time LIMIT 1
+                )
+                WHERE id = 1 AND fastest_id = {row}.id;
+    '''
+
+
+STATS_TRIGGERS = {
+    'recipe_stats_ai': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_stats_ai AFTER INSERT ON recipes BEGIN
+            {_add_recipe_sql('new')}
+        END
+    ''',
+    'recipe_stats_ad': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_stats_ad AFTER DELETE ON recipes BEGIN
+            {_remove_recipe_sql('old')}
+        END
+    ''',
+    'recipe_stats_au': f'''
+        CREATE TRIGGER IF NOT EXISTS recipe_stats_au
+        AFTER UPDATE OF name, category, difficulty, cooking_time ON recipes BEGIN
+            {_remove_recipe_sql('old')}
+            {_add_recipe_sql('new')}
+        END
+    ''',
+    'category_stats_ai': '''
+        CREATE TRIGGER IF NOT EXISTS category_stats_ai AFTER INSERT ON category_stats BEGIN
+            UPDATE recipe_stats SET total_categories = total_categories + 1 WHERE id = 1;
+        END
+    ''',
+    'category_stats_ad': '''
+        CREATE TRIGGER IF NOT EXISTS category_stats_ad AFTER DELETE ON category_stats BEGIN
+            UPDATE recipe_stats SET total_categories = total_categories - 1 WHERE id = 1;
+        END
+    ''',
+}
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def has_statistics(conn):
+    """Проверка наличия таблиц статистики"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'recipe_stats'")
+    return cursor.fetchone()[0] == 1
+
+
+def ensure_statistics(conn):
+    """Создание таблиц и триггеров статистики и первичное заполнение"""
+    for ddl in STATS_TABLES.values():
+        conn.execute(ddl)
+    for ddl in STATS_TRIGGERS.values():
+        conn.execute(ddl)
+    rebuild_statistics(conn)
+
+
+def rebuild_statistics(conn):
+    """Полный пересчет статистики по таблице recipes (восстановление после расхождений)"""
+    for table in STATS_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute('''
+        INSERT INTO category_stats (category, recipe_count)
+        SELECT category, COUNT(*) FROM recipes WHERE category IS NOT NULL GROUP BY category
+    ''')
+    conn.execute('''
+        INSERT INTO difficulty_stats (difficulty, recipe_count)
+        SELECT difficulty, COUNT(*) FROM recipes WHERE difficulty IS NOT NULL GROUP BY difficulty
+    ''')
+    conn.execute('''
+        INSERT INTO cooking_time_stats (cooking_time, recipe_count)
+        SELECT cooking_time, COUNT(*) FROM recipes
+        WHERE typeof(cooking_time) = 'integer' GROUP BY cooking_time
+    ''')
+    # Строка сводки вставляется последней: триггер category_stats_ai ее еще не видел
+    conn.execute('''
+        INSERT INTO recipe_stats (id, total_recipes, total_categories, fastest_id, fastest_name, fastest_time)
+        SELECT 1,
+               (SELECT COUNT(*) FROM recipes),
+               (SELECT COUNT(*) FROM category_stats),
+               fastest.id, fastest.name, fastest.cooking_time
+        FROM (SELECT NULL) LEFT JOIN (
+            SELECT id, name, cooking_time FROM recipes
+            WHERE cooking_time IS NOT NULL ORDER BY cooking_time LIMIT 1
+        ) fastest
+    ''')
+
+
+def compute_summary(conn):
+    """Сводка прямыми запросами к recipes (без предрассчитанных таблиц)"""
+    total_recipes = conn.execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
+    total_categories = conn.execute(
+        'SELECT COUNT(DISTINCT category) FROM recipes WHERE category IS NOT NULL').fetchone()[0]
+    fastest_recipe = conn.execute(
+        'SELECT name, cooking_time FROM recipes WHERE cooking_time IS NOT NULL ORDER BY cooking_time LIMIT 1'
+    ).fetchone()
+    return {
+        'total_recipes': total_recipes,
+        'total_categories': total_categories,
+        'fastest_recipe': fastest_recipe,
+    }
+
+
+def read_summary(conn):
+    """Сводка из одной предрассчитанной строки"""
+    row = conn.execute('''
+        SELECT total_recipes, total_categories, fastest_name, fastest_time
+        FROM recipe_stats WHERE id = 1
+    ''').fetchone()
+    if row is None:
+        return compute_summary(conn)
+    total_recipes, total_categories, fastest_name, fastest_time = row
+    return {
+        'total_recipes': total_recipes,
+        'total_categories': total_categories,
+        'fastest_recipe': (fastest_name, fastest_time) if fastest_time is not None else None,
+    }
+
+
+def percentiles(histogram, points=PERCENTILES):
+    """Перцентили (ближайший ранг) по гистограмме [(значение, количество)] в порядке значений"""
+    histogram = list(histogram)
+    total = sum(count for _, count in histogram)
+    result = {}
+    if not total:
+        return result
+    targets = sorted(points)
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        while targets and seen * 100 >= targets[0] * total:
+            result[targets.pop(0)] = value
+        if not targets:
+            break
+    return result
+
+
+def read_details(conn):
+    """Подробная статистика: категории, сложность, перцентили времени приготовления"""
+    categories = conn.execute(
+        'SELECT category, recipe_count FROM category_stats ORDER BY recipe_count DESC, category'
+    ).fetchall()
+    difficulties = conn.execute(
+        'SELECT difficulty, recipe_count FROM difficulty_stats ORDER BY recipe_count DESC, difficulty'
+    ).fetchall()
+    return {
+        'categories': categories,
+        'difficulties': difficulties,
+        'cooking_time_percentiles': percentiles(read_histogram(conn)),
+    }
+
+
+def read_histogram(conn):
+    """[(время приготовления, число рецептов)] по возрастанию времени"""
+    return conn.execute(
+        'SELECT cooking_time, recipe_count FROM cooking_time_stats ORDER BY cooking_time').fetchall()
+
+
+def check_statistics(conn):
+    """Расхождения между предрассчитанной и фактической сводкой"""
+    stored = read_summary(conn)
+    actual = compute_summary(conn)
+    drift = {}
+    for key in ('total_recipes', 'total_categories'):
+        if stored[key] != actual[key]:
+            drift[key] = (stored[key], actual[key])
+    stored_time = stored['fastest_recipe'] and stored['fastest_recipe'][1]
+    actual_time = actual['fastest_recipe'] and actual['fastest_recipe'][1]
+    if stored_time != actual_time:
+        drift['fastest_recipe'] = (stored['fastest_recipe'], actual['fastest_recipe'])
+    return drift
+
+
+def main(argv=None):
+    from db import get_manager, run_write
+    import schema
+
+    parser = argparse.ArgumentParser(description="Статистика по рецептам")
+    parser.add_argument('command', choices=('show', 'check', 'rebuild'))
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    args = parser.parse_args(argv)
+
+    conn = get_manager(args.db).connection()
+    schema.migrate(conn)
+
+    if args.command == 'rebuild':
+        run_write(conn, rebuild_statistics)
+        print("✅ Статистика пересчитана")
+    elif args.command == 'check':
+        drift = check_statistics(conn)
+        for key, (stored, actual) in drift.items():
+            print(f"❌ {key}: сохранено {stored}, фактически {actual}")
+        if drift:
+            sys.exit(1)
+        print("✅ Статистика актуальна")
+    else:
+        summary = read_summary(conn)
+        details = read_details(conn)
+        print(f"Всего рецептов: {summary['total_recipes']}")
+        print(f"Всего категорий: {summary['total_categories']}")
+        print(f"Самый быстрый рецепт: {summary['fastest_recipe']}")
+        print(f"Сложность: {dict(details['difficulties'])}")
+        print(f"Перцентили времени: {details['cooking_time_percentiles']}")
+
+
+if __name__ == '__main__':
+    main()
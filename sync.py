@@ -0,0 +1,428 @@
+"""Журнал изменений и инкрементальная синхронизация реплик базы рецептов
+
+Триггеры на recipes, recipe_texts и ingredients записывают в change_log каждое
+изменение строки: монотонно растущий номер seq, таблицу, id строки и операцию.
+Реплика хранит в sync_state номер последнего примененного изменения источника.
+Синхронизация читает журнал источника после этого номера и переносит текущее
+состояние затронутых строк пачками, каждая пачка - одна транзакция реплики.
+Так стоимость обновления зависит от числа изменений, а не от размера каталога.
+
+Реплика создается командой init (резервная копия источника через backup API,
+номер изменений которой известен точно). Изменения, примененные к реплике,
+попадают и в ее собственный журнал, поэтому реплика может служить источником
+для следующей.
+
+Журнал сам не сокращается: команда trim удаляет изменения, которые уже
+применили все перечисленные реплики (и с --keep - кроме последних keep).
+Номера журнала идут без пропусков (AUTOINCREMENT, откат транзакции откатывает
+и счетчик), поэтому граница удаленного - MIN(seq) - 1. Реплика, отставшая
+от этой границы, получить пропущенные изменения уже не может: pull отказывает,
+и реплику нужно создать заново командой init (удалив прежний файл). Индексы
+в памяти, которые обновляются по журналу, в таком случае строятся заново.
+
+Примеры:
+    python sync.py init replica.db --source recipes.db
+    python sync.py status replica.db --source recipes.db
+    python sync.py pull replica.db --source recipes.db --batch-size 1000
+    python sync.py trim replica.db other.db --source recipes.db --keep 10000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from db import get_manager, READ_ONLY, run_write
+import schema
+
+CHANGE_TABLES = {
+    'change_log': '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL
+        )
+    ''',
+    'sync_state': '''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            source TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+}
+
+# Синхронизируемые таблицы и их столбцы; родительская таблица recipes - первой
+SYNC_COLUMNS = {
+    'recipes': ('id', 'name', 'category', 'cooking_time', 'difficulty', 'created_date'),
+    'recipe_texts': ('id', 'recipe_id', 'field', 'codec', 'data'),
+    'ingredients': ('id', 'recipe_id', 'name', 'quantity', 'unit', 'amount', 'base_amount', 'base_unit'),
+}
+
+PARENT = 'recipes'
+CHILDREN = ('recipe_texts', 'ingredients')
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _log_trigger(table, operation, row):
+    """Триггер, записывающий операцию над строкой таблицы в журнал"""
+    name = f'{table}_log_a{operation[0]}'
+    return name, f'''
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {operation.upper()} ON {table} BEGIN
+            INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table}', {row}.id, '{operation}');
+        END
+    '''
+
+
+# Триггеры журнала не входят в schema.DEFERRABLE: изменения массовой загрузки
+# тоже должны дойти до реплик
+CHANGE_TRIGGERS = dict(
+    _log_trigger(table, operation, row)
+    for table in SYNC_COLUMNS
+    for operation, row in ((INSERT, 'new'), (UPDATE, 'new'), (DELETE, 'old'))
+)
+
+
+def _insert_sql(table):
+    columns = SYNC_COLUMNS[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def _update_sql(table):
+    columns = SYNC_COLUMNS[table]
+    return f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns[1:])} WHERE id = ?"
+
+
+# Не UPSERT: его ON CONFLICT заменил бы INSERT OR IGNORE в триггерах статистики
+INSERT_ROW = {table: _insert_sql(table) for table in SYNC_COLUMNS}
+UPDATE_ROW = {table: _update_sql(table) for table in SYNC_COLUMNS}
+
+
+def has_change_log(conn):
+    """Есть ли в базе журнал изменений (миграция 10)"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'change_log'")
+    return cursor.fetchone()[0] == 1
+
+
+def ensure_change_log(conn):
+    """Создание журнала изменений, состояния синхронизации и триггеров журнала"""
+    for ddl in CHANGE_TABLES.values():
+        conn.execute(ddl)
+    for ddl in CHANGE_TRIGGERS.values():
+        conn.execute(ddl)
+
+
+def current_seq(conn):
+    """Номер последнего изменения в журнале базы (и после сокращения журнала)"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def trimmed_seq(conn):
+    """Номер последнего удаленного из журнала изменения; 0, если журнал не сокращали"""
+    first = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+    return first - 1 if first is not None else current_seq(conn)
+
+
+def check_horizon(source, last_seq):
+    """Ошибка, если часть изменений после last_seq уже удалена из журнала источника"""
+    horizon = trimmed_seq(source)
+    if last_seq < horizon:
+        raise ValueError(f"журнал источника сокращен до изменения {horizon}, а реплика применила только "
+                         f"{last_seq}: создайте реплику заново командой init")
+
+
+def changes_since(conn, seq, latest):
+    """{таблица: id измененных строк} для изменений журнала после seq до latest включительно
+
+    None, если часть этих изменений уже удалена командой trim: тогда индекс,
+    который обновляется по журналу (similarity.py, facets.py), строится заново.
+    """
+    if seq < trimmed_seq(conn):
+        return None
+    changed = {}
+    for table, row_id in conn.execute(
+            'SELECT table_name, row_id FROM change_log WHERE seq > ? AND seq <= ?', (seq, latest)):
+        changed.setdefault(table, set()).add(row_id)
+    return changed
+
+
+def trim_horizon(source, replica_states, keep=None):
+    """До какого номера можно удалить журнал: не дальше примененного всеми репликами и последних keep"""
+    bounds = list(replica_states)
+    if keep is not None:
+        if keep < 0:
+            raise ValueError("--keep не может быть отрицательным")
+        bounds.append(current_seq(source) - keep)
+    if not bounds:
+        raise ValueError("укажите реплики или --keep: без них неизвестно, какие изменения еще нужны")
+    return max(min(bounds), trimmed_seq(source))
+
+
+def trim_log(conn, horizon):
+    """Удаление из журнала изменений с номерами не больше horizon; возвращает число удаленных"""
+    return conn.execute('DELETE FROM change_log WHERE seq <= ?', (horizon,)).rowcount
+
+
+def source_name(path):
+    """Имя источника в sync_state реплики"""
+    return os.path.abspath(path)
+
+
+def read_state(conn, source):
+    """Последний примененный номер изменений источника или None, если реплика его не знает"""
+    row = conn.execute('SELECT last_seq FROM sync_state WHERE source = ?', (source,)).fetchone()
+    return row[0] if row else None
+
+
+def write_state(conn, source, seq):
+    conn.execute('''
+        INSERT INTO sync_state (source, last_seq) VALUES (?, ?)
+        ON CONFLICT (source) DO UPDATE SET last_seq = excluded.last_seq, synced_at = CURRENT_TIMESTAMP
+    ''', (source, seq))
+
+
+def read_changes(conn, after, limit):
+    """Изменения [(seq, таблица, id строки)] с номерами больше after"""
+    cursor = conn.execute('''
+        SELECT seq, table_name, row_id FROM change_log
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (after, limit))
+    return cursor.fetchall()
+
+
+def fetch_rows(conn, table, row_ids):
+    """{id: строка} для существующих строк таблицы"""
+    if not row_ids:
+        return {}
+    cursor = conn.execute(f'''
+        SELECT {', '.join(SYNC_COLUMNS[table])} FROM {table}
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(sorted(row_ids)),))
+    return {row[0]: row for row in cursor}
+
+
+def collect(source, replica, changes):
+    """({таблица: id измененных строк}, {таблица: {id: текущая строка источника}})
+
+    Изменения пачки сводятся к текущему состоянию каждой строки: строка, которой
+    нет в источнике, удаляется из реплики. Текст или ингредиент мог перейти
+    к рецепту, созданному уже после пачки: недостающие в реплике рецепты
+    копируются вместе с ними, иначе нарушился бы внешний ключ.
+    """
+    changed = {table: set() for table in SYNC_COLUMNS}
+    for _, table, row_id in changes:
+        if table in changed:
+            changed[table].add(row_id)
+    rows = {table: fetch_rows(source, table, row_ids) for table, row_ids in changed.items()}
+    parents = {row[1] for table in CHILDREN for row in rows[table].values() if row[1] is not None}
+    parents -= set(rows[PARENT])
+    if parents:
+        present = {row[0] for row in replica.execute(
+            'SELECT id FROM recipes WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(sorted(parents)),))}
+        rows[PARENT].update(fetch_rows(source, PARENT, parents - present))
+    return changed, rows
+
+
+def write_rows(replica, table, rows):
+    """Вставка новых и обновление существующих в реплике строк таблицы"""
+    if not rows:
+        return
+    existing = {row[0] for row in replica.execute(
+        f'SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(sorted(rows)),))}
+    replica.executemany(UPDATE_ROW[table], [row[1:] + row[:1] for row_id, row in rows.items() if row_id in existing])
+    replica.executemany(INSERT_ROW[table], [row for row_id, row in rows.items() if row_id not in existing])
+
+
+def affected_recipes(replica, changed, rows):
+    """id рецептов, строки которых меняет пачка: до и после изменения"""
+    recipe_ids = set(changed[PARENT]) | set(rows[PARENT])
+    for table in CHILDREN:
+        recipe_ids.update(row[1] for row in rows[table].values())
+        recipe_ids.update(row[0] for row in replica.execute(
+            f'SELECT recipe_id FROM {table} WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(sorted(changed[table])),)))
+    recipe_ids.discard(None)
+    return sorted(recipe_ids)
+
+
+def apply_changes(replica, changed, rows):
+    """Перенос состояния строк в реплику внутри начатой транзакции; возвращает (записано, удалено)
+
+    Индексы, которые обновляет приложение (schema.index_recipes), обновляются
+    для затронутых рецептов здесь же: триггеры реплики их не поддерживают.
+    """
+    deleted = {table: sorted(changed[table] - set(rows[table])) for table in SYNC_COLUMNS}
+    recipe_ids = affected_recipes(replica, changed, rows)
+    schema.unindex_recipes(replica, recipe_ids)
+    write_rows(replica, PARENT, rows[PARENT])
+    # Дочерние строки удаляются до вставки: новая строка текста может занять
+    # (recipe_id, field) удаленной
+    for table in CHILDREN:
+        replica.executemany(f'DELETE FROM {table} WHERE id = ?', [(row_id,) for row_id in deleted[table]])
+    for table in CHILDREN:
+        write_rows(replica, table, rows[table])
+    replica.executemany('DELETE FROM recipes WHERE id = ?', [(row_id,) for row_id in deleted[PARENT]])
+    schema.index_recipes(replica, recipe_ids)
+    return (sum(len(table_rows) for table_rows in rows.values()),
+            sum(len(row_ids) for row_ids in deleted.values()))
+
+
+def apply_batch(source, replica, source_id, changes):
+    """Пачка изменений и новый номер в sync_state внутри транзакции реплики; (записано, удалено)"""
+    result = apply_changes(replica, *collect(source, replica, changes))
+    write_state(replica, source_id, changes[-1][0])
+    return result
+
+
+def check_compatible(source, replica):
+    """Ошибка, если источник и реплику нельзя синхронизировать"""
+    if not has_change_log(source):
+        raise ValueError("в источнике нет журнала изменений: обновите схему источника")
+    source_version, replica_version = schema.get_version(source), schema.get_version(replica)
+    if source_version != replica_version:
+        raise ValueError(f"версии схемы источника ({source_version}) и реплики ({replica_version}) различаются")
+
+
+def pull(source, replica, source_id, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Применение к реплике всех новых изменений источника; возвращает (изменений, пачек, секунд)"""
+    started = time.perf_counter()
+    check_compatible(source, replica)
+    last_seq = read_state(replica, source_id)
+    if last_seq is None:
+        raise ValueError(f"реплика не связана с источником {source_id}: создайте ее командой init")
+    total = batches = 0
+    while True:
+        # Журнал и строки читаются из одного снимка источника
+        source.execute('BEGIN')
+        try:
+            check_horizon(source, last_seq)
+            changes = read_changes(source, last_seq, batch_size)
+            if not changes:
+                break
+            written, deleted = run_write(replica, lambda replica: apply_batch(source, replica, source_id, changes))
+            last_seq = changes[-1][0]
+        finally:
+            source.rollback()
+        total += len(changes)
+        batches += 1
+        if progress:
+            progress(last_seq, len(changes), written, deleted)
+    return total, batches, time.perf_counter() - started
+
+
+def init_replica(source, replica_path, source_id):
+    """Реплика - копия источника с номером последнего скопированного изменения"""
+    if not has_change_log(source):
+        raise ValueError("в источнике нет журнала изменений: обновите схему источника")
+    if os.path.exists(replica_path):
+        raise FileExistsError(f"файл реплики уже существует: {replica_path}")
+    replica = sqlite3.connect(replica_path)
+    try:
+        source.backup(replica)
+        # Копия - согласованный снимок: ее журнал заканчивается ровно на скопированном изменении
+        seq = current_seq(replica)
+        write_state(replica, source_id, seq)
+        replica.commit()
+    finally:
+        replica.close()
+    return seq
+
+
+def command_init(args):
+    source = get_manager(args.source).connection()
+    schema.migrate(source)
+    seq = init_replica(source, args.replica, source_name(args.source))
+    print(f"✅ Реплика {args.replica} создана, последнее изменение источника: {seq}", file=sys.stderr)
+
+
+def command_status(args):
+    source = get_manager(args.source, READ_ONLY).connection()
+    replica = get_manager(args.replica, READ_ONLY).connection()
+    check_compatible(source, replica)
+    last_seq = read_state(replica, source_name(args.source))
+    print(f"Последнее изменение источника: {current_seq(source)}")
+    if last_seq is None:
+        print("Реплика не связана с источником")
+        return
+    pending = source.execute('SELECT COUNT(*) FROM change_log WHERE seq > ?', (last_seq,)).fetchone()[0]
+    print(f"Применено в реплике: {last_seq}")
+    print(f"Ожидают применения: {pending}")
+    horizon = trimmed_seq(source)
+    if last_seq < horizon:
+        print(f"⚠️ Журнал источника сокращен до изменения {horizon}: реплику нужно создать заново (init)")
+
+
+def command_pull(args):
+    source = get_manager(args.source, READ_ONLY).connection()
+    replica = get_manager(args.replica).connection()
+    schema.migrate(replica)
+
+    def progress(seq, changes, written, deleted):
+        print(f"  до изменения {seq}: {changes} изменений, записано строк {written}, удалено {deleted}",
+              file=sys.stderr)
+
+    changes, batches, seconds = pull(source, replica, source_name(args.source), args.batch_size,
+                                     progress if args.verbose else None)
+    print(f"✅ Применено изменений: {changes} ({batches} пачек) за {seconds:.2f} с", file=sys.stderr)
+
+
+def command_trim(args):
+    source = get_manager(args.source).connection()
+    schema.migrate(source)
+    source_id = source_name(args.source)
+    states = []
+    for path in args.replicas:
+        replica = get_manager(path, READ_ONLY).connection()
+        last_seq = read_state(replica, source_id)
+        if last_seq is None:
+            raise ValueError(f"реплика {path} не связана с источником {source_id}")
+        states.append(last_seq)
+    horizon = trim_horizon(source, states, args.keep)
+    deleted = run_write(source, lambda conn: trim_log(conn, horizon))
+    print(f"✅ Удалено изменений из журнала: {deleted}, журнал начинается после {horizon}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синхронизация реплик базы рецептов по журналу изменений")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, handler, help_text in (
+        ('init', command_init, "создать реплику из копии источника"),
+        ('status', command_status, "сколько изменений источника еще не применено"),
+        ('pull', command_pull, "применить к реплике новые изменения источника"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('replica', help="файл реплики")
+        command.add_argument('--source', default='recipes.db', help="файл базы-источника")
+        command.set_defaults(handler=handler)
+        if name == 'pull':
+            command.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                                 help="изменений журнала в одной транзакции реплики")
+            command.add_argument('--verbose', action='store_true', help="печатать каждую пачку")
+
+    command = commands.add_parser('trim', help="удалить из журнала источника изменения, которые больше не нужны")
+    command.add_argument('replicas', nargs='*', help="файлы реплик: их изменения сохраняются")
+    command.add_argument('--source', default='recipes.db', help="файл базы-источника")
+    command.add_argument('--keep', type=int, help="сколько последних изменений сохранить в любом случае")
+    command.set_defaults(handler=command_trim)
+
+    args = parser.parse_args(argv)
+    try:
+        args.handler(args)
+    except (ValueError, FileExistsError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
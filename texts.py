@@ -0,0 +1,87 @@
+"""Большие тексты рецептов (инструкция и т.п.) в отдельной таблице со сжатием
+
+Строки recipes остаются короткими: списки и поиск по названию и категории
+читают меньше страниц, а текст загружается только для экрана рецепта.
+"""
+import zlib
+
+INSTRUCTIONS = 'instructions'
+
+TEXT_TABLES = {
+    'recipe_texts': '''
+        CREATE TABLE IF NOT EXISTS recipe_texts (
+            id INTEGER PRIMARY KEY,
+            recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+            field TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            data BLOB,
+            UNIQUE (recipe_id, field)
+        )
+    ''',
+}
+
+PLAIN = 'plain'
+ZLIB = 'zlib'
+
+# Короткие тексты не сжимаются: выигрыш меньше заголовка zlib
+COMPRESS_MIN_BYTES = 256
+COMPRESS_LEVEL = 6
+
+# Вставка или замена текста; замена запускает триггеры UPDATE
+UPSERT_TEXT = '''
+    INSERT INTO recipe_texts (recipe_id, field, codec, data) VALUES (?, ?, ?, ?)
+    ON CONFLICT (recipe_id, field) DO UPDATE SET codec = excluded.codec, data = excluded.data
+'''
+
+DELETE_TEXT = 'DELETE FROM recipe_texts WHERE recipe_id = ? AND field = ?'
+
+
+def pack_text(text):
+    """(кодек, данные) для хранения; длинный текст сжимается, если это дает выигрыш"""
+    encoded = text.encode('utf-8')
+    if len(encoded) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(encoded, COMPRESS_LEVEL)
+        if len(compressed) < len(encoded):
+            return ZLIB, compressed
+    return PLAIN, text
+
+
+def unpack_text(codec, data):
+    """Текст из хранимых данных"""
+    if data is None:
+        return None
+    if codec == ZLIB:
+        return zlib.decompress(data).decode('utf-8')
+    return data
+
+
+def text_row(recipe_id, text, field=INSTRUCTIONS):
+    """Параметры UPSERT_TEXT или None для пустого текста"""
+    if not text:
+        return None
+    return (recipe_id, field) + pack_text(text)
+
+
+def write_texts(conn, items, field=INSTRUCTIONS):
+    """Сохранение текстов [(id рецепта, текст)]: пустой текст удаляет строку"""
+    items = list(items)
+    rows = [text_row(recipe_id, text, field) for recipe_id, text in items]
+    conn.executemany(UPSERT_TEXT, [row for row in rows if row])
+    conn.executemany(DELETE_TEXT, [(recipe_id, field) for recipe_id, text in items if not text])
+
+
+def has_text_table(conn):
+    """Хранятся ли тексты отдельно (миграция 9)"""
+    cursor = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", tuple(TEXT_TABLES))
+    return cursor.fetchone()[0] == len(TEXT_TABLES)
+
+
+def read_text(conn, recipe_id, field=INSTRUCTIONS):
+    """Текст рецепта или None; для баз до миграции 9 - из таблицы recipes"""
+    if not has_text_table(conn):
+        row = conn.execute(f'SELECT {field} FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+        return row[0] if row else None
+    row = conn.execute('SELECT codec, data FROM recipe_texts WHERE recipe_id = ? AND field = ?',
+                       (recipe_id, field)).fetchone()
+    return unpack_text(*row) if row else None
@@ -0,0 +1,125 @@
+"""Разбор количеств ингредиентов и времени приготовления
+
+Количество приводится к числу и одной из базовых единиц: граммы (g),
+миллилитры (ml) или штуки (pcs). Это позволяет складывать ингредиенты
+разных рецептов в список покупок одним запросом GROUP BY.
+"""
+import re
+
+GRAMS = 'g'
+MILLILITERS = 'ml'
+PIECES = 'pcs'
+
+# Единица -> (базовая единица, множитель); ключи - после normalize_unit
+UNITS = {
+    'г': (GRAMS, 1), 'гр': (GRAMS, 1), 'грамм': (GRAMS, 1), 'грамма': (GRAMS, 1), 'граммов': (GRAMS, 1),
+    'g': (GRAMS, 1),
+    'кг': (GRAMS, 1000), 'килограмм': (GRAMS, 1000), 'kg': (GRAMS, 1000),
+    'мг': (GRAMS, 0.001),
+    'мл': (MILLILITERS, 1), 'ml': (MILLILITERS, 1),
+    'л': (MILLILITERS, 1000), 'литр': (MILLILITERS, 1000), 'литра': (MILLILITERS, 1000), 'l': (MILLILITERS, 1000),
+    'стл': (MILLILITERS, 15), 'столоваяложка': (MILLILITERS, 15), 'ложка': (MILLILITERS, 15),
+    'чл': (MILLILITERS, 5), 'чайнаяложка': (MILLILITERS, 5),
+    'стакан': (MILLILITERS, 250), 'стакана': (MILLILITERS, 250), 'стаканов': (MILLILITERS, 250),
+    'шт': (PIECES, 1), 'штука': (PIECES, 1), 'штуки': (PIECES, 1), 'штук': (PIECES, 1), 'pcs': (PIECES, 1),
+    'зубчик': (PIECES, 1), 'зубчика': (PIECES, 1), 'зубчиков': (PIECES, 1),
+}
+
+# Подписи базовых единиц и более крупные единицы для вывода
+UNIT_LABELS = {GRAMS: ('г', 'кг'), MILLILITERS: ('мл', 'л'), PIECES: ('шт', None)}
+
+NUMBER = r'\d+(?:[.,]\d+)?'
+# "2", "1,5", "1/2", "1 1/2", "2-3" и число с единицей: "200 г", "1.5кг"
+QUANTITY_PATTERN = re.compile(
+    rf'^\s*(?:(?P<whole>\d+)\s+)?(?P<first>{NUMBER})(?:\s*/\s*(?P<denominator>\d+))?'
+    rf'(?:\s*[-–]\s*(?P<upper>{NUMBER}))?\s*(?P<unit>\D*?)\s*$'
+)
+
+# Часть записи времени: "40 мин", "1,5 ч", "30-40 мин"; минус перед частью - знак числа
+# в начале записи или разделитель диапазона после первой части ("30 мин - 1 ч")
+MINUTES_PATTERN = re.compile(
+    rf'([-–])?\s*({NUMBER})(?:\s*[-–]\s*({NUMBER}))?\s*(ч|час|мин|м)?', re.IGNORECASE)
+
+
+def _number(text):
+    return float(text.replace(',', '.'))
+
+
+def normalize_unit(unit):
+    """Единица без регистра, точек и пробелов: 'ст. л.' -> 'стл'"""
+    return re.sub(r'[\s.]', '', (unit or '').casefold())
+
+
+def parse_amount(quantity):
+    """(число, единица из текста количества) или (None, None); для диапазона - верхняя граница"""
+    if quantity is None:
+        return None, None
+    match = QUANTITY_PATTERN.match(str(quantity))
+    if not match:
+        return None, None
+    amount = _number(match['first'])
+    if match['denominator']:
+        denominator = int(match['denominator'])
+        if not denominator:
+            return None, None
+        amount /= denominator
+    if match['whole']:
+        amount += int(match['whole'])
+    if match['upper']:
+        amount = max(amount, _number(match['upper']))
+    return amount, match['unit'] or None
+
+
+def parse_quantity(quantity, unit=None):
+    """(количество, количество в базовой единице, базовая единица) для строки ингредиента"""
+    amount, inline_unit = parse_amount(quantity)
+    if amount is None:
+        return None, None, None
+    # Число без единицы ("яйца - 3") считается в штуках
+    base = UNITS.get(normalize_unit(unit or inline_unit) or PIECES)
+    if base is None:
+        return amount, None, None
+    base_unit, factor = base
+    return amount, amount * factor, base_unit
+
+
+def parse_minutes(value):
+    """Время приготовления в минутах: 45, '45', '45 мин', '1 час', '1,5 ч'; None, если не разобрать
+
+    Для диапазона ('30-40 мин', '30 мин - 1 ч') - верхняя граница, как в parse_amount;
+    отрицательное время не принимается.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value)) if value >= 0 else None
+    bounds = [0.0]
+    found = False
+    for sign, number, upper, unit in MINUTES_PATTERN.findall(str(value)):
+        if sign:
+            if not found:
+                return None
+            bounds.append(0.0)
+        found = True
+        amount = max(_number(number), _number(upper)) if upper else _number(number)
+        bounds[-1] += amount * (60 if unit and unit.lower().startswith('ч') else 1)
+    return int(round(max(bounds))) if found else None
+
+
+def stored_minutes(value):
+    """Значение cooking_time для записи: минуты, а если их не разобрать - исходный текст
+
+    Текст вроде 'пока не загустеет' сохраняется как есть: замена на NULL потеряла бы его.
+    """
+    minutes = parse_minutes(value)
+    if minutes is not None or not isinstance(value, str) or not value.strip():
+        return minutes
+    return value
+
+
+def format_amount(amount, base_unit):
+    """Количество в базовой единице для вывода: 1500 g -> '1.5 кг'"""
+    small, large = UNIT_LABELS.get(base_unit, (base_unit, None))
+    if large and amount >= 1000:
+        amount, small = amount / 1000, large
+    return f'{amount:.3f}'.rstrip('0').rstrip('.') + f' {small}'
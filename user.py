@@ -1,22 +1,70 @@
-import sqlite3
+import argparse
 import os
 from datetime import datetime
 
+import facets
+from listing import DEFAULT_PAGE_SIZE
+import startup
+from units import format_amount
+
+# Слой данных (db, shards и все, что они импортируют) загружается в фоне, см. startup.py;
+# режимы соединений совпадают с db.READ_ONLY, db.SNAPSHOT и db.MEMORY
+READ_ONLY = 'ro'
+SNAPSHOT = 'snapshot'
+MEMORY = 'memory'
+
+# Сколько самых крупных категорий показывать на экране статистики
+STATISTICS_TOP_CATEGORIES = 10
+
 class RecipeViewerApp:
-    def __init__(self, db_name='recipes.db'):
+    def __init__(self, db_name='recipes.db', max_per_category=None, page_size=DEFAULT_PAGE_SIZE,
+                 mode=READ_ONLY, fast_start=False):
         self.db_name = db_name
+        self.max_per_category = max_per_category
+        self.page_size = page_size
+        self.fast_start = fast_start
         self.check_database()
+        # Просмотр ничего не записывает: соединения только для чтения или снимок.
+        # При быстром запуске база открывается в фоне, пока виден приветственный экран
+        self._loading = startup.Background(self._load, db_name, mode, in_thread=fast_start)
+    
+    def _load(self, db_name, mode):
+        """Открытие базы и предзагрузка статистики и категорий: (репозиторий, {имя: значение})"""
+        from shards import open_repository
+        
+        repository = open_repository(db_name, mode)
+        paths = repository.files()
+        signature = startup.files_signature(paths)
+        preloaded = {'statistics': repository.statistics(), 'categories': repository.categories()}
+        if self.fast_start and startup.read_summary(db_name) is None:
+            startup.write_summary(db_name, paths, signature, preloaded['statistics'])
+        return repository, preloaded
+    
+    @property
+    def repository(self):
+        return self._loading.result()[0]
+    
+    def _preloaded(self, name, loader):
+        """Значение, загруженное при запуске (только в первый раз), дальше - свежее из базы"""
+        preloaded = self._loading.result()[1]
+        if name in preloaded:
+            return preloaded.pop(name)
+        return loader()
     
     def check_database(self):
         """Проверка существования базы данных"""
-        if not os.path.exists(self.db_name):
+        if os.path.exists(self.db_name):
+            return
+        from shards import is_sharded
+        
+        if not is_sharded(self.db_name):
             print("❌ База данных рецептов не найдена!")
             print("Пожалуйста, сначала создайте базу данных с рецептами.")
             exit()
     
     def clear_screen(self):
         """Очистка экрана терминала"""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        startup.clear_screen()
     
     def display_menu(self):
         """Отображение главного меню"""
@@ -29,45 +77,53 @@ class RecipeViewerApp:
         print("3. Поиск рецептов по категории")
         print("4. Поиск рецептов по ингредиенту")
         print("5. Показать все категории")
-        print("6. Выйти из приложения")
+        print("6. Статистика")
+        print("7. Поиск по нескольким ингредиентам")
+        print("8. Рецепты по времени приготовления")
+        print("9. Список покупок")
+        print("10. Поиск с фильтрами (категория, сложность, время, ингредиенты)")
+        print("11. Выйти из приложения")
         print("=" * 50)
     
     def view_all_recipes(self):
-        """Просмотр всех рецептов"""
-        self.clear_screen()
-        print("ВСЕ РЕЦЕПТЫ")
-        print("-" * 50)
-        
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            ORDER BY name
-        ''')
+        """Просмотр всех рецептов постранично"""
+        pager = self.repository.pager(self.page_size)
+        recipes = pager.first()
         
-        recipes = cursor.fetchall()
-        
-        if not recipes:
-            print("Рецепты не найдены.")
-        else:
-            print(f"Найдено рецептов: {len(recipes)}\n")
+        while True:
+            self.clear_screen()
+            print("ВСЕ РЕЦЕПТЫ")
+            print("-" * 50)
+            
+            if not recipes:
+                print("Рецепты не найдены.")
+                input("\nНажмите Enter для продолжения...")
+                return
+            
+            print(f"Страница {pager.page_number}\n")
             for recipe in recipes:
-                id, name, category, cooking_time, difficulty = recipe
-                print(f"{id}. {name}")
-                print(f"   Категория: {category} | Время: {cooking_time} мин | Сложность: {difficulty}")
+                print(f"{recipe.id}. {recipe.name}")
+                print(f"   Категория: {recipe.category} | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
                 print()
-        
-        conn.close()
-        
-        # Опция просмотра деталей рецепта
-        if recipes:
-            choice = input("Введите ID рецепта для подробного просмотра (или Enter для возврата): ")
-            if choice.isdigit():
+            
+            options = []
+            if pager.has_previous:
+                options.append("'п' - предыдущая страница")
+            if pager.has_next:
+                options.append("'с' - следующая страница")
+            if options:
+                print(", ".join(options))
+            
+            # Навигация по страницам или просмотр деталей рецепта
+            choice = input("Введите ID рецепта для подробного просмотра (или Enter для возврата): ").strip().lower()
+            if choice == 'с':
+                recipes = pager.next()
+            elif choice == 'п':
+                recipes = pager.previous()
+            elif choice.isdigit():
                 self.view_recipe_details(int(choice))
-        else:
-            input("\nНажмите Enter для продолжения...")
+            else:
+                return
     
     def search_by_name(self):
         """Поиск по названию"""
@@ -82,18 +138,15 @@ class RecipeViewerApp:
             input("\nНажмите Enter для продолжения...")
             return
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            WHERE name LIKE ? 
-            ORDER BY name
-        ''', (f'%{search_term}%',))
+        recipes = self.repository.search_by_name(search_term)
         
-        recipes = cursor.fetchall()
-        conn.close()
+        # Ничего не нашлось - возможно, в названии опечатка
+        if not recipes:
+            similar = self.repository.fuzzy_search(search_term)
+            if similar:
+                recipes = [recipe for recipe, _ in similar]
+                self.display_search_results(recipes, f"похожие на '{search_term}'")
+                return
         
         self.display_search_results(recipes, f"результаты поиска по '{search_term}'")
     
@@ -117,18 +170,7 @@ class RecipeViewerApp:
             input("\nНажмите Enter для продолжения...")
             return
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, category, cooking_time, difficulty 
-            FROM recipes 
-            WHERE category LIKE ? 
-            ORDER BY name
-        ''', (f'%{search_term}%',))
-        
-        recipes = cursor.fetchall()
-        conn.close()
+        recipes = self.repository.search_by_category(search_term)
         
         self.display_search_results(recipes, f"рецепты в категории '{search_term}'")
     
@@ -145,70 +187,196 @@ class RecipeViewerApp:
             input("\nНажмите Enter для продолжения...")
             return
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT DISTINCT r.id, r.name, r.category, r.cooking_time, r.difficulty
-            FROM recipes r
-            JOIN ingredients i ON r.id = i.recipe_id
-            WHERE i.name LIKE ?
-            ORDER BY r.name
-        ''', (f'%{search_term}%',))
+        recipes = self.repository.search_by_ingredient(search_term)
         
-        recipes = cursor.fetchall()
-        conn.close()
+        # Ничего не нашлось - ищем по самому похожему названию ингредиента
+        if not recipes:
+            similar = self.repository.similar_ingredients(search_term, limit=1)
+            if similar:
+                search_term = similar[0][0]
+                recipes = self.repository.search_by_ingredient(search_term)
         
         self.display_search_results(recipes, f"рецепты с ингредиентом '{search_term}'")
     
-    def get_categories(self):
-        """Получение списка всех категорий"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+    def search_by_ingredients(self):
+        """Поиск по нескольким ингредиентам или по имеющимся продуктам"""
+        self.clear_screen()
+        print("ПОИСК ПО НЕСКОЛЬКИМ ИНГРЕДИЕНТАМ")
+        print("-" * 38)
+        print("1. Рецепты с заданными ингредиентами")
+        print("   (через запятую; 'а|б' - любой из вариантов, '-в' - без ингредиента)")
+        print("2. Что приготовить из моих продуктов")
         
-        cursor.execute('SELECT DISTINCT category FROM recipes WHERE category IS NOT NULL ORDER BY category')
-        categories = [row[0] for row in cursor.fetchall()]
+        mode = input("\nВыберите вариант поиска: ").strip()
+        if mode not in ('1', '2'):
+            return
         
-        conn.close()
-        return categories
+        search_term = input("Введите ингредиенты через запятую: ")
+        if not search_term.strip():
+            print("❌ Пожалуйста, введите ингредиенты для поиска.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        if mode == '1':
+            recipes = self.repository.search_by_ingredients(search_term)
+            if recipes is None:
+                print("❌ Поиск недоступен: база данных не обновлена.")
+                input("\nНажмите Enter для продолжения...")
+                return
+            self.display_search_results(recipes, f"рецепты с ингредиентами '{search_term}'")
+            return
+        
+        items = [item for item in search_term.split(',') if item.strip()]
+        min_matches = input(f"Сколько продуктов должно совпасть (1-{len(items)}, Enter - все): ").strip()
+        min_matches = int(min_matches) if min_matches.isdigit() else len(items)
+        matches = self.repository.search_by_pantry(items, max(1, min(min_matches, len(items))))
+        if matches is None:
+            print("❌ Поиск недоступен: база данных не обновлена.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        self.clear_screen()
+        print("ЧТО ПРИГОТОВИТЬ ИЗ МОИХ ПРОДУКТОВ")
+        print("-" * 50)
+        if not matches:
+            print("Рецепты не найдены.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        print(f"Найдено рецептов: {len(matches)}\n")
+        for recipe, matched, total in matches:
+            print(f"{recipe.id}. {recipe.name}")
+            print(f"   Есть {matched} из {total} ингредиентов | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
+            print()
+        
+        choice = input("Введите ID рецепта для подробного просмотра (или Enter для возврата): ")
+        if choice.isdigit():
+            self.view_recipe_details(int(choice))
     
-    def show_all_categories(self):
-        """Показать все категории и рецепты в них"""
+    def search_by_cooking_time(self):
+        """Рецепты, которые готовятся не дольше заданного времени"""
         self.clear_screen()
-        print("ВСЕ КАТЕГОРИИ РЕЦЕПТОВ")
-        print("-" * 35)
+        print("РЕЦЕПТЫ ПО ВРЕМЕНИ ПРИГОТОВЛЕНИЯ")
+        print("-" * 40)
+        max_minutes = input("Не дольше (минут): ").strip()
+        if not max_minutes.isdigit():
+            print("❌ Введите число минут.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        min_minutes = input("Не меньше (минут, Enter - 0): ").strip()
+        min_minutes = int(min_minutes) if min_minutes.isdigit() else 0
         
-        categories = self.get_categories()
+        recipes = self.repository.recipes_by_cooking_time(int(max_minutes), min_minutes)
+        self.display_search_results(recipes, f"от {min_minutes} до {max_minutes} минут")
+    
+    def show_shopping_list(self):
+        """Суммарный список покупок для нескольких рецептов"""
+        self.clear_screen()
+        print("СПИСОК ПОКУПОК")
+        print("-" * 40)
+        print("Введите ID рецептов через запятую (например: 2, 3)")
+        recipe_ids = [int(item) for item in input("ID рецептов: ").replace(' ', '').split(',') if item.isdigit()]
+        if not recipe_ids:
+            return
         
-        if not categories:
-            print("Категории не найдены.")
+        shopping_list = self.repository.shopping_list(recipe_ids)
+        if shopping_list is None:
+            print("❌ Список недоступен: база данных не обновлена.")
             input("\nНажмите Enter для продолжения...")
             return
+        totals, unparsed = shopping_list
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        self.clear_screen()
+        print("🛒 СПИСОК ПОКУПОК")
+        print("-" * 40)
+        if not totals and not unparsed:
+            print("Ингредиенты не найдены.")
+        for i, (name, base_unit, amount) in enumerate(totals, 1):
+            print(f"  {i}. {name} - {format_amount(amount, base_unit)}")
+        if unparsed:
+            print("\nБез точного количества:")
+            for name, quantity, unit in unparsed:
+                print(f"  - {name}" + (f" - {quantity} {unit or ''}".rstrip() if quantity else ""))
+        input("\nНажмите Enter для продолжения...")
+    
+    def faceted_search(self):
+        """Поиск с фильтрами по нескольким фасетам и счетчиками для каждого значения"""
+        filters = {facet: set() for facet in facets.FACETS}
+        ingredients = ''
+        # Буква команды для переключения значения фасета
+        commands = {'к': facets.CATEGORY, 'с': facets.DIFFICULTY, 'в': facets.TIME}
         
-        for i, category in enumerate(categories, 1):
+        while True:
+            result = self.repository.faceted_search(filters, ingredients or None, self.page_size)
+            if result is None:
+                print("❌ Поиск недоступен: база данных не обновлена.")
+                input("\nНажмите Enter для продолжения...")
+                return
+            recipes, total, counts = result
+            
+            self.clear_screen()
+            print("ПОИСК С ФИЛЬТРАМИ")
+            print("-" * 50)
+            for letter, facet in commands.items():
+                print(f"{facets.FACET_TITLES[facet]} ({letter}<номер>):")
+                for number, (value, count) in enumerate(counts[facet], 1):
+                    mark = 'x' if value in filters[facet] else ' '
+                    label = facets.TIME_LABELS.get(value, value) if facet == facets.TIME else value
+                    print(f"   {number}. [{mark}] {label} ({count})")
+            print(f"Ингредиенты (и): {ingredients or 'любые'}")
+            print("-" * 50)
+            print(f"Найдено рецептов: {total}\n")
+            for recipe in recipes:
+                print(f"{recipe.id}. {recipe.name}")
+                print(f"   Категория: {recipe.category} | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
+            if total > len(recipes):
+                print(f"... и еще {total - len(recipes)}")
+            
+            print("\nк/с/в<номер> - переключить значение, и - ингредиенты, о - сбросить фильтры")
+            choice = input("ID рецепта для просмотра (или Enter для возврата): ").strip().lower()
+            if not choice:
+                return
+            if choice.isdigit():
+                self.view_recipe_details(int(choice))
+            elif choice == 'о':
+                filters = {facet: set() for facet in facets.FACETS}
+                ingredients = ''
+            elif choice == 'и':
+                ingredients = input("Ингредиенты (через запятую, '|' - или, '-' - без): ").strip()
+            elif choice[0] in commands and choice[1:].isdigit():
+                facet = commands[choice[0]]
+                number = int(choice[1:])
+                if 1 <= number <= len(counts[facet]):
+                    value = counts[facet][number - 1][0]
+                    filters[facet] ^= {value}
+    
+    def get_categories(self):
+        """Получение списка всех категорий"""
+        return self._preloaded('categories', lambda: self.repository.categories())
+    
+    def show_all_categories(self):
+        """Показать все категории и рецепты в них"""
+        self.clear_screen()
+        print("ВСЕ КАТЕГОРИИ РЕЦЕПТОВ")
+        print("-" * 35)
+        
+        found = False
+        for i, (category, recipes, total) in enumerate(
+                self.repository.categories_with_recipes(self.max_per_category), 1):
+            found = True
             print(f"\n{i}. КАТЕГОРИЯ: {category}")
             print("-" * 30)
             
-            cursor.execute('''
-                SELECT id, name, cooking_time, difficulty 
-                FROM recipes 
-                WHERE category = ? 
-                ORDER BY name
-            ''', (category,))
-            
-            recipes = cursor.fetchall()
+            for recipe in recipes:
+                print(f"   {recipe.id}. {recipe.name} ({recipe.cooking_time} мин, {recipe.difficulty})")
             
-            if recipes:
-                for recipe in recipes:
-                    id, name, cooking_time, difficulty = recipe
-                    print(f"   {id}. {name} ({cooking_time} мин, {difficulty})")
-            else:
-                print("   Рецепты не найдены")
+            if total > len(recipes):
+                print(f"   ... и еще {total - len(recipes)}")
         
-        conn.close()
+        if not found:
+            print("Категории не найдены.")
+            input("\nНажмите Enter для продолжения...")
+            return
         
         # Опция просмотра деталей рецепта
         choice = input("\nВведите ID рецепта для подробного просмотра (или Enter для возврата): ")
@@ -226,9 +394,8 @@ class RecipeViewerApp:
         else:
             print(f"Найдено рецептов: {len(recipes)}\n")
             for recipe in recipes:
-                id, name, category, cooking_time, difficulty = recipe
-                print(f"{id}. {name}")
-                print(f"   Категория: {category} | Время: {cooking_time} мин | Сложность: {difficulty}")
+                print(f"{recipe.id}. {recipe.name}")
+                print(f"   Категория: {recipe.category} | Время: {recipe.cooking_time} мин | Сложность: {recipe.difficulty}")
                 print()
         
         # Опция просмотра деталей рецепта
@@ -243,52 +410,39 @@ class RecipeViewerApp:
         """Просмотр детальной информации о рецепте"""
         self.clear_screen()
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Получаем информацию о рецепте
-        cursor.execute('SELECT * FROM recipes WHERE id = ?', (recipe_id,))
-        recipe = cursor.fetchone()
+        # Рецепт вместе с ингредиентами (из кэша, если он уже открывался)
+        recipe = self.repository.get_recipe(recipe_id)
         
         if not recipe:
             print("❌ Рецепт не найден.")
-            conn.close()
             input("\nНажмите Enter для продолжения...")
             return
         
-        # Получаем ингредиенты
-        cursor.execute('SELECT name, quantity, unit FROM ingredients WHERE recipe_id = ? ORDER BY id', (recipe_id,))
-        ingredients = cursor.fetchall()
-        
-        conn.close()
-        
         # Отображаем информацию
-        id, name, category, cooking_time, difficulty, instructions, created_date = recipe
-        
-        print(f"🍳 РЕЦЕПТ: {name}")
+        print(f"🍳 РЕЦЕПТ: {recipe.name}")
         print("=" * 60)
-        print(f"📁 Категория: {category}")
-        print(f"⏱️  Время приготовления: {cooking_time} минут")
-        print(f"🎯 Сложность: {difficulty}")
-        print(f"📅 Добавлен: {created_date}")
+        print(f"📁 Категория: {recipe.category}")
+        print(f"⏱️  Время приготовления: {recipe.cooking_time} минут")
+        print(f"🎯 Сложность: {recipe.difficulty}")
+        print(f"📅 Добавлен: {recipe.created_date}")
         
         print("\n🛒 ИНГРЕДИЕНТЫ:")
         print("-" * 30)
-        if ingredients:
-            for i, (ing_name, quantity, unit) in enumerate(ingredients, 1):
-                if quantity and unit:
-                    print(f"  {i}. {ing_name} - {quantity} {unit}")
-                elif quantity:
-                    print(f"  {i}. {ing_name} - {quantity}")
+        if recipe.ingredients:
+            for i, ingredient in enumerate(recipe.ingredients, 1):
+                if ingredient.quantity and ingredient.unit:
+                    print(f"  {i}. {ingredient.name} - {ingredient.quantity} {ingredient.unit}")
+                elif ingredient.quantity:
+                    print(f"  {i}. {ingredient.name} - {ingredient.quantity}")
                 else:
-                    print(f"  {i}. {ing_name}")
+                    print(f"  {i}. {ingredient.name}")
         else:
             print("  Ингредиенты не указаны")
         
         print("\n👨‍🍳 ИНСТРУКЦИЯ ПРИГОТОВЛЕНИЯ:")
         print("-" * 40)
-        if instructions:
-            print(instructions)
+        if recipe.instructions:
+            print(recipe.instructions)
         else:
             print("Инструкция не указана")
         
@@ -298,40 +452,71 @@ class RecipeViewerApp:
         print("\nДополнительные опции:")
         print("1. Вернуться к списку рецептов")
         print("2. Поиск другого рецепта")
-        print("3. Выйти в главное меню")
+        print("3. Похожие рецепты")
+        print("4. Выйти в главное меню")
         
-        choice = input("\nВыберите действие (1-3): ")
+        choice = input("\nВыберите действие (1-4): ")
         
         if choice == '1':
             # Возврат к предыдущему списку не реализован для простоты
             pass
         elif choice == '2':
             self.search_by_name()
+        elif choice == '3':
+            self.show_similar_recipes(recipe)
+    
+    def show_similar_recipes(self, recipe):
+        """Рецепты с общими ингредиентами и той же категорией"""
+        matches = self.repository.similar_recipes(recipe.id)
+        self.clear_screen()
+        print(f"ПОХОЖИЕ РЕЦЕПТЫ: {recipe.name.upper()}")
+        print("-" * 50)
+        if matches is None:
+            print("❌ Поиск похожих недоступен: база данных не обновлена.")
+            input("\nНажмите Enter для продолжения...")
+            return
+        if not matches:
+            print("Похожие рецепты не найдены.")
+        for similar, score in matches:
+            print(f"{similar.id}. {similar.name} (сходство {score:.0%})")
+            print(f"   Категория: {similar.category} | Время: {similar.cooking_time} мин | Сложность: {similar.difficulty}")
+        print(f"\nИндекс сходства в памяти: {self.repository.similarity_memory() / 1024 / 1024:.1f} МБ")
+        choice = input("\nВведите ID рецепта для подробного просмотра (или Enter для возврата): ")
+        if choice.isdigit():
+            self.view_recipe_details(int(choice))
     
     def get_statistics(self):
         """Получение статистики по рецептам"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        return self._preloaded('statistics', lambda: self.repository.statistics())
+    
+    def show_statistics(self):
+        """Подробная статистика: категории, сложность, время приготовления"""
+        self.clear_screen()
+        print("СТАТИСТИКА РЕЦЕПТОВ")
+        print("-" * 35)
         
-        # Общее количество рецептов
-        cursor.execute('SELECT COUNT(*) FROM recipes')
-        total_recipes = cursor.fetchone()[0]
+        details = self.repository.statistics_details()
+        if details is None:
+            print("❌ Статистика недоступна: база данных не обновлена.")
+            input("\nНажмите Enter для продолжения...")
+            return
         
-        # Количество категорий
-        cursor.execute('SELECT COUNT(DISTINCT category) FROM recipes WHERE category IS NOT NULL')
-        total_categories = cursor.fetchone()[0]
+        print("\n📁 Рецептов по категориям:")
+        for category, count in details['categories'][:STATISTICS_TOP_CATEGORIES]:
+            print(f"   {category}: {count}")
+        hidden = len(details['categories']) - STATISTICS_TOP_CATEGORIES
+        if hidden > 0:
+            print(f"   ... и еще {hidden} категорий")
         
-        # Самый быстрый рецепт
-        cursor.execute('SELECT name, cooking_time FROM recipes WHERE cooking_time IS NOT NULL ORDER BY cooking_time LIMIT 1')
-        fastest_recipe = cursor.fetchone()
+        print("\n🎯 Сложность:")
+        for difficulty, count in details['difficulties']:
+            print(f"   {difficulty}: {count}")
         
-        conn.close()
+        print("\n⏱️  Время приготовления:")
+        for point, value in details['cooking_time_percentiles'].items():
+            print(f"   {point}% рецептов готовятся не дольше {value} минут")
         
-        return {
-            'total_recipes': total_recipes,
-            'total_categories': total_categories,
-            'fastest_recipe': fastest_recipe
-        }
+        input("\nНажмите Enter для продолжения...")
     
     def show_welcome_screen(self):
         """Показать приветственный экран со статистикой"""
@@ -340,7 +525,10 @@ class RecipeViewerApp:
         print("             ДОБРО ПОЖАЛОВАТЬ В КОЛЛЕКЦИЮ РЕЦЕПТОВ!")
         print("=" * 60)
         
-        stats = self.get_statistics()
+        # Быстрый запуск: сводка прошлого сеанса, если база с тех пор не менялась
+        stats = startup.read_summary(self.db_name) if self.fast_start else None
+        if stats is None:
+            stats = self.get_statistics()
         
         print(f"\n📊 Статистика:")
         print(f"   Всего рецептов: {stats['total_recipes']}")
@@ -359,7 +547,7 @@ class RecipeViewerApp:
         
         while True:
             self.display_menu()
-            choice = input("Выберите действие (1-6): ")
+            choice = input("Выберите действие (1-11): ")
             
             if choice == '1':
                 self.view_all_recipes()
@@ -372,14 +560,35 @@ class RecipeViewerApp:
             elif choice == '5':
                 self.show_all_categories()
             elif choice == '6':
+                self.show_statistics()
+            elif choice == '7':
+                self.search_by_ingredients()
+            elif choice == '8':
+                self.search_by_cooking_time()
+            elif choice == '9':
+                self.show_shopping_list()
+            elif choice == '10':
+                self.faceted_search()
+            elif choice == '11':
                 print("\nДо свидания! Приятного аппетита! 🍽️")
+                self.repository.close()
                 break
             else:
-                print("\n❌ Неверный выбор. Пожалуйста, выберите от 1 до 6.")
+                print("\n❌ Неверный выбор. Пожалуйста, выберите от 1 до 11.")
                 input("Нажмите Enter для продолжения...")
 
 # Запуск приложения
 if __name__ == "__main__":
-    app = RecipeViewerApp()
+    parser = argparse.ArgumentParser(description="Просмотр рецептов")
+    parser.add_argument('--db', default='recipes.db', help="файл базы данных")
+    parser.add_argument('--snapshot', dest='mode', action='store_const', const=SNAPSHOT,
+                        default=READ_ONLY, help="неизменяемый снимок базы с отображением в память")
+    parser.add_argument('--memory', dest='mode', action='store_const', const=MEMORY,
+                        help="загрузить копию базы в память")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="показать первый экран сразу, открывая базу в фоне")
+    args = parser.parse_args()
+    
+    app = RecipeViewerApp(args.db, mode=args.mode, fast_start=args.fast_start)
     app.run()
     
\ No newline at end of file